@@ -19,7 +19,7 @@ from proof_generation.pattern import (
     Symbol,
     bot,
 )
-from proof_generation.proved import Proved
+from proof_generation.proved import Proved, VerificationError
 
 if TYPE_CHECKING:
     from collections.abc import Mapping
@@ -28,10 +28,11 @@ if TYPE_CHECKING:
 
 
 class BasicInterpreter(Interpreter):
-    """A stateless proof interpreter. It only checks conclusions."""
+    """A stateless proof interpreter. It only checks conclusions, unless trusted."""
 
-    def __init__(self, phase: ExecutionPhase):
+    def __init__(self, phase: ExecutionPhase, trusted: bool = False):
         super().__init__(phase)
+        self.trusted = trusted
 
     def mark_generation_unsafe(self, warning: str) -> None:
         self._interpreting_warnings.add(warning)
@@ -54,7 +55,10 @@ class BasicInterpreter(Interpreter):
         negative: tuple[SVar, ...] = (),
         application_context: tuple[EVar, ...] = (),
     ) -> Pattern:
-        return MetaVar(id, e_fresh, s_fresh, positive, negative, application_context)
+        ret = MetaVar(id, e_fresh, s_fresh, positive, negative, application_context)
+        if not self.trusted and not ret.is_well_formed():
+            raise VerificationError(f'Application context hole of {str(ret)} is required to be fresh')
+        return ret
 
     def implies(self, left: Pattern, right: Pattern) -> Pattern:
         return Implies(left, right)
@@ -66,12 +70,24 @@ class BasicInterpreter(Interpreter):
         return Exists(var, subpattern)
 
     def esubst(self, evar_id: int, pattern: MetaVar | ESubst | SSubst, plug: Pattern) -> Pattern:
+        if not self.trusted:
+            if not isinstance(pattern, MetaVar | ESubst | SSubst):
+                raise VerificationError(f'Cannot substitute into {str(pattern)}')
+            if plug == EVar(evar_id) or pattern.evar_is_free(evar_id):
+                raise VerificationError('Redundant element substitution')
         return ESubst(pattern, EVar(evar_id), plug)
 
     def ssubst(self, svar_id: int, pattern: MetaVar | ESubst | SSubst, plug: Pattern) -> Pattern:
+        if not self.trusted:
+            if not isinstance(pattern, MetaVar | ESubst | SSubst):
+                raise VerificationError(f'Cannot substitute into {str(pattern)}')
+            if plug == SVar(svar_id) or pattern.svar_is_free(svar_id):
+                raise VerificationError('Redundant set substitution')
         return SSubst(pattern, SVar(svar_id), plug)
 
     def mu(self, var: int, subpattern: Pattern) -> Pattern:
+        if not self.trusted and not subpattern.svar_is_positive(var):
+            raise VerificationError(f'{str(SVar(var))} is not positive in {str(subpattern)}')
         return Mu(var, subpattern)
 
     def prop1(self) -> Proved:
@@ -95,9 +111,9 @@ class BasicInterpreter(Interpreter):
         return Proved(Implies(Implies(Implies(phi0, bot()), bot()), phi0))
 
     def modus_ponens(self, left: Proved, right: Proved) -> Proved:
-        left_conclusion = left.conclusion
-        l, r = Implies.extract(left_conclusion)
-        assert l == right.conclusion, str(l) + ' != ' + str(right.conclusion)
+        l, r = self._implication(left)
+        if not self.trusted and l != right.conclusion:
+            raise VerificationError(str(l) + ' != ' + str(right.conclusion))
         return Proved(r)
 
     def exists_quantifier(self) -> Proved:
@@ -107,17 +123,30 @@ class BasicInterpreter(Interpreter):
         return Proved(Implies(ESubst(phi, x, y), Exists(x.name, phi)))
 
     def exists_generalization(self, proved: Proved, var: EVar) -> Proved:
-        l, r = Implies.extract(proved.conclusion)
-        assert r.evar_is_free(var.name), f'{str(var)} in FV({str(r)})'
+        l, r = self._implication(proved)
+        if not self.trusted and not r.evar_is_free(var.name):
+            raise VerificationError(f'{str(var)} in FV({str(r)})')
         return Proved(Implies(Exists(var.name, l), r))
 
+    @staticmethod
+    def _implication(proved: Proved) -> tuple[Pattern, Pattern]:
+        ret = Implies.unwrap(proved.conclusion)
+        if ret is None:
+            raise VerificationError(f'Expected an implication, got: {str(proved.conclusion)}')
+        l, r = ret
+        return l, r
+
     def instantiate(self, proved: Proved, delta: dict[int, Pattern]) -> Proved:
         if not delta:
             return proved
         return Proved(proved.conclusion.instantiate(delta))
 
     def instantiate_pattern(self, pattern: Pattern, delta: Mapping[int, Pattern]) -> Pattern:
-        return Instantiate(pattern, frozendict(delta))
+        ret = Instantiate(pattern, frozendict(delta))
+        if not self.trusted:
+            # Expanding checks the constraints of the metavariables, and the expansion is cached
+            ret.simplify()
+        return ret
 
     def pop(self, term: Pattern | Proved) -> None:
         ...
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import tarfile
+import time
+import tracemalloc
+from argparse import SUPPRESS, ArgumentParser
+from contextlib import contextmanager
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import TYPE_CHECKING, Any
+
+from proof_generation.pattern import App, EVar, Interned, MetaVar, Pattern, Symbol
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+# Leaves of the synthetic configuration, and substitutions into it
+SYNTHETIC_LEAVES = 2**14
+SYNTHETIC_STEPS = 16
+
+
+@dataclass(frozen=True)
+class Workload:
+    """A proof generated from K, as checked by the `test-proof-kgen` target."""
+
+    name: str
+    hints: Path
+    kompiled_dir: Path
+
+    @staticmethod
+    def discover(proofs_dir: Path, build_dir: Path) -> list[Workload]:
+        workloads = []
+        for proof in sorted(proofs_dir.glob('*/*.ml-proof')):
+            module = proof.parent.name
+            workloads.append(
+                Workload(
+                    name=proof.stem,
+                    hints=build_dir / 'proof-hints' / module / f'{proof.stem}.hints',
+                    kompiled_dir=build_dir / 'kompiled-definitions' / f'{module}-kompiled',
+                )
+            )
+        return workloads
+
+
+@dataclass
+class AllocationStats:
+    constructor_calls: int = 0
+    allocated_patterns: int = 0
+    peak_memory: int = 0
+    seconds: float = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f'{self.constructor_calls:>14} {self.allocated_patterns:>12} '
+            f'{self.peak_memory / 2**20:>12.2f} {self.seconds:>10.3f}'
+        )
+
+
+@contextmanager
+def measure() -> Iterator[AllocationStats]:
+    """Count pattern constructor calls, and how many of them allocated a new pattern
+    instead of being served by the unique table.
+    """
+    stats = AllocationStats()
+    original_call = Interned.__call__
+    original_post_init = Pattern.__post_init__
+
+    def counting_call(cls: Interned, *args: Any, **kwargs: Any) -> Any:
+        stats.constructor_calls += 1
+        return original_call(cls, *args, **kwargs)
+
+    def counting_post_init(self: Pattern) -> None:
+        stats.allocated_patterns += 1
+        original_post_init(self)
+
+    Interned.__call__ = counting_call  # type: ignore
+    Pattern.__post_init__ = counting_post_init  # type: ignore
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats.seconds = time.perf_counter() - start
+        stats.peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        Interned.__call__ = original_call  # type: ignore
+        Pattern.__post_init__ = original_post_init  # type: ignore
+
+
+def synthetic_configuration(leaves: int) -> Pattern:
+    """A balanced tree of applications shaped like a K configuration, with one
+    element variable and one metavariable among its leaves.
+    """
+    level: list[Pattern] = [Symbol(f'cell{i}') for i in range(leaves - 2)] + [EVar(0), MetaVar(0)]
+    while len(level) > 1:
+        level = [App(*level[i : i + 2]) if i + 1 < len(level) else level[i] for i in range(0, len(level), 2)]
+    return level[0]
+
+
+def run_synthetic() -> AllocationStats:
+    """Substitute into single leaves of a large configuration, which only rebuilds their path to the root."""
+    configuration = synthetic_configuration(SYNTHETIC_LEAVES)
+    with measure() as stats:
+        for step in range(SYNTHETIC_STEPS):
+            configuration.apply_esubst(0, Symbol(f'value{step}'))
+            configuration.instantiate({0: Symbol(f'value{step}')})
+    return stats
+
+
+def run_baseline(revision: str) -> str:
+    """Run the synthetic workload on the sources of an older revision, to compare with the current ones.
+    This file is run as a script against these sources, so it only relies on their `pattern` module.
+    """
+    here = Path(__file__).parent
+    top = subprocess.run(['git', 'rev-parse', '--show-toplevel'], check=True, capture_output=True, text=True, cwd=here)
+    archive = subprocess.run(
+        ['git', 'archive', '--format=tar', f'{revision}:generation/src'],
+        check=True,
+        capture_output=True,
+        cwd=top.stdout.strip(),
+    ).stdout
+    with TemporaryDirectory() as sources:
+        with tarfile.open(fileobj=BytesIO(archive)) as tar:
+            tar.extractall(sources, filter='data')
+        env = {**os.environ, 'PYTHONPATH': sources}
+        return subprocess.run(
+            [sys.executable, __file__, '--synthetic-only'], check=True, capture_output=True, text=True, env=env
+        ).stdout.strip()
+
+
+def run(workload: Workload, optimize: bool) -> tuple[AllocationStats, AllocationStats]:
+    # K is imported here, so that the synthetic workload also runs where it is not installed, or on older sources
+    from proof_generation.k.execution_proof_generation import ExecutionProofExp
+    from proof_generation.k.kore_convertion.language_semantics import LanguageSemantics
+    from proof_generation.k.kore_convertion.rewrite_steps import get_proof_hints
+    from proof_generation.k.proof_gen import get_kompiled_definition, stream_proof_hint
+    from proof_generation.proof import OutputFormat
+
+    definition = get_kompiled_definition(workload.kompiled_dir)
+    with measure() as semantics_stats:
+        language_semantics = LanguageSemantics.from_kore_definition(definition)
+
+    with measure() as proof_stats, TemporaryDirectory() as output_dir:
+        hints = get_proof_hints(stream_proof_hint(str(workload.hints), skip_payloads=True), language_semantics)
+        proof_exp = ExecutionProofExp.from_proof_hints(hints, language_semantics)
+        proof_exp.serialize(Path(output_dir) / workload.name, OutputFormat.Binary, optimize)
+
+    return semantics_stats, proof_stats
+
+
+def main() -> None:
+    argparser = ArgumentParser(description='Measure pattern allocations while generating proofs from K')
+    argparser.add_argument('workloads', nargs='*', help='Names of the workloads to run, all of them by default')
+    argparser.add_argument('--proofs-dir', type=Path, default=Path('proofs/generated-from-k'))
+    argparser.add_argument('--build-dir', type=Path, default=Path('.build'))
+    argparser.add_argument('--optimize', action='store_true', default=False, help='Serialize the optimized proofs')
+    argparser.add_argument(
+        '--baseline',
+        metavar='REVISION',
+        help='Also run the synthetic workload on the sources of this git revision, to compare with the current ones',
+    )
+    argparser.add_argument('--synthetic-only', action='store_true', default=False, help=SUPPRESS)
+    args = argparser.parse_args()
+
+    synthetic = f'{"synthetic":<30} {"substitute":<10} {run_synthetic()}'
+    if args.synthetic_only:
+        print(synthetic)
+        return
+
+    workloads = Workload.discover(args.proofs_dir, args.build_dir)
+    if args.workloads:
+        workloads = [workload for workload in workloads if workload.name in args.workloads]
+
+    print(f'{"workload":<30} {"phase":<10} {"constructors":>14} {"allocated":>12} {"peak (MiB)":>12} {"time (s)":>10}')
+    if args.baseline:
+        print(f'baseline {args.baseline}')
+        print(run_baseline(args.baseline))
+        print('current')
+    print(synthetic)
+    for workload in workloads:
+        semantics_stats, proof_stats = run(workload, args.optimize)
+        print(f'{workload.name:<30} {"semantics":<10} {semantics_stats}')
+        print(f'{workload.name:<30} {"proof":<10} {proof_stats}')
+
+
+if __name__ == '__main__':
+    main()
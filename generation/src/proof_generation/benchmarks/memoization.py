@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from proof_generation.benchmarks.serializer_throughput import WORKLOADS, metamath_workload
+from proof_generation.claim import Claim
+from proof_generation.counting_interpreter import CountingInterpreter
+from proof_generation.instruction import Encoding
+from proof_generation.interpreter import ExecutionPhase
+
+if TYPE_CHECKING:
+    from proof_generation.proof import ProofExp
+
+
+def plan(proof_exp: ProofExp, encoding: Encoding) -> tuple[CountingInterpreter, float, float]:
+    counting = CountingInterpreter(
+        ExecutionPhase.Gamma, [Claim(claim) for claim in proof_exp._claims], encoding.max_memory_slots
+    )
+    start = time.perf_counter()
+    proof_exp.execute_full(counting)
+    counted = time.perf_counter()
+    counting.finalize()
+    return counting, counted - start, time.perf_counter() - counted
+
+
+def peak_memory(proof_exp: ProofExp, encoding: Encoding) -> int:
+    """Peak memory allocated while planning, traced separately as tracing slows down the timed runs."""
+    tracemalloc.start()
+    try:
+        plan(proof_exp, encoding)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main() -> None:
+    argparser = ArgumentParser(description='Measure the memoization planner of optimized serialization')
+    argparser.add_argument(
+        'workloads', nargs='*', help=f'Proofs to plan, out of {", ".join(WORKLOADS)}. All of them by default'
+    )
+    argparser.add_argument(
+        '--metamath',
+        nargs=2,
+        action='append',
+        default=[],
+        metavar=('DATABASE', 'TARGET'),
+        help='Also plan the translation of a Metamath proof',
+    )
+    args = argparser.parse_args()
+
+    workloads = {name: WORKLOADS[name] for name in args.workloads or WORKLOADS}
+    for database, target in args.metamath:
+        workloads[Path(database).stem] = metamath_workload(database, target)
+
+    print(
+        f'{"workload":<32} {"encoding":<8} {"patterns":>10} {"suggested":>10} {"counting (s)":>12} {"planning (s)":>12} '
+        f'{"peak (MiB)":>10}'
+    )
+    for name, workload in workloads.items():
+        for encoding in Encoding:
+            counting, counting_seconds, planning_seconds = plan(workload(), encoding)
+            peak = peak_memory(workload(), encoding) / 2**20
+            print(
+                f'{name:<32} {encoding.value:<8} {counting.pattern_count:>10} '
+                f'{len(counting.suggested_for_memoization):>10} {counting_seconds:>12.3f} {planning_seconds:>12.3f} '
+                f'{peak:>10.2f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import time
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from io import BytesIO
+from typing import TYPE_CHECKING
+
+from proof_generation.claim import Claim
+from proof_generation.interpreter import ExecutionPhase
+from proof_generation.metamath.parser import load_database
+from proof_generation.metamath.translate import get_proof_skeleton
+from proof_generation.proofs.kore import KoreLemmas
+from proof_generation.proofs.propositional import Propositional
+from proof_generation.proofs.small_theory import SmallTheory
+from proof_generation.proofs.substitution import Substitution
+from proof_generation.serializing_interpreter import CHUNK_SIZE, SerializingInterpreter
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from proof_generation.proof import ProofExp
+
+WORKLOADS: dict[str, Callable[[], ProofExp]] = {
+    'propositional': Propositional,
+    'small_theory': SmallTheory,
+    'substitution': Substitution,
+    'kore': KoreLemmas,
+}
+
+
+@dataclass(frozen=True)
+class SerializerMode:
+    name: str
+    check_stack: bool
+    chunk_size: int
+
+
+MODES = [
+    SerializerMode('unbuffered', check_stack=True, chunk_size=0),
+    SerializerMode('buffered', check_stack=True, chunk_size=CHUNK_SIZE),
+    SerializerMode('buffered-unchecked', check_stack=False, chunk_size=CHUNK_SIZE),
+]
+
+
+class Output(BytesIO):
+    def close(self) -> None:
+        # The serializer closes each output when moving to the next phase, but we still read it afterwards
+        ...
+
+
+class InstructionCounter(SerializingInterpreter):
+    def __init__(self, claims: list[Claim]) -> None:
+        super().__init__(ExecutionPhase.Gamma, BytesIO(), claims, BytesIO(), BytesIO())
+        self.instructions = 0
+
+    def _write(self, *instruction: int) -> None:
+        self.instructions += 1
+        super()._write(*instruction)
+
+
+def count_instructions(proof_exp: ProofExp) -> int:
+    counter = InstructionCounter([Claim(claim) for claim in proof_exp._claims])
+    proof_exp.execute_full(counter)
+    return counter.instructions
+
+
+def serialize(proof_exp: ProofExp, mode: SerializerMode) -> bytes:
+    outputs = [Output(), Output(), Output()]
+    serializer = SerializingInterpreter(
+        ExecutionPhase.Gamma,
+        outputs[0],
+        [Claim(claim) for claim in proof_exp._claims],
+        outputs[1],
+        outputs[2],
+        check_stack=mode.check_stack,
+        chunk_size=mode.chunk_size,
+    )
+    proof_exp.execute_full(serializer)
+    serializer.flush()
+    return b''.join(output.getvalue() for output in outputs)
+
+
+def metamath_workload(database: str, target: str) -> Callable[[], ProofExp]:
+    return lambda: get_proof_skeleton(load_database(database, include_proof=True), target)
+
+
+def main() -> None:
+    argparser = ArgumentParser(description='Measure the throughput of the binary serializer in instructions/sec')
+    argparser.add_argument(
+        'workloads', nargs='*', help=f'Proofs to serialize, out of {", ".join(WORKLOADS)}. All of them by default'
+    )
+    argparser.add_argument(
+        '--metamath',
+        nargs=2,
+        action='append',
+        default=[],
+        metavar=('DATABASE', 'TARGET'),
+        help='Also serialize the translation of a Metamath proof',
+    )
+    argparser.add_argument('--repeat', type=int, default=5, help='Number of times each proof is serialized')
+    args = argparser.parse_args()
+
+    workloads = {name: WORKLOADS[name] for name in args.workloads or WORKLOADS}
+    for database, target in args.metamath:
+        workloads[target] = metamath_workload(database, target)
+
+    print(f'{"workload":<16} {"mode":<20} {"instructions":>12} {"bytes":>10} {"instr/s":>12}')
+    for name, workload in workloads.items():
+        proof_exp = workload()
+        instructions = count_instructions(proof_exp)
+        expected = serialize(proof_exp, MODES[0])
+        for mode in MODES:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                output = serialize(proof_exp, mode)
+            seconds = (time.perf_counter() - start) / args.repeat
+            assert output == expected, f'{mode.name} serialization differs'
+            print(f'{name:<16} {mode.name:<20} {instructions:>12} {len(output):>10} {instructions / seconds:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+from proof_generation.benchmarks.allocations import Workload
+from proof_generation.k.execution_proof_generation import ExecutionProofExp
+from proof_generation.k.kore_convertion.rewrite_steps import get_proof_hints
+from proof_generation.k.proof_gen import get_language_semantics, stream_proof_hint
+
+
+def main() -> None:
+    argparser = ArgumentParser(
+        description='Measure how the construction of execution proofs from K scales with the length of the trace'
+    )
+    argparser.add_argument('workloads', nargs='*', help='Names of the workloads to run, all of them by default')
+    argparser.add_argument('--proofs-dir', type=Path, default=Path('proofs/generated-from-k'))
+    argparser.add_argument('--build-dir', type=Path, default=Path('.build'))
+    argparser.add_argument('--points', type=int, default=4, help='Number of prefixes of each trace to measure')
+    args = argparser.parse_args()
+
+    workloads = Workload.discover(args.proofs_dir, args.build_dir)
+    if args.workloads:
+        workloads = [workload for workload in workloads if workload.name in args.workloads]
+
+    print(f'{"workload":<30} {"steps":>8} {"time (s)":>10} {"us/step":>10}')
+    for workload in workloads:
+        language_semantics = get_language_semantics(workload.kompiled_dir)
+        hints = list(get_proof_hints(stream_proof_hint(str(workload.hints), skip_payloads=True), language_semantics))
+        # The time per step stays flat as the prefixes grow when the construction is linear
+        for point in range(1, args.points + 1):
+            steps = len(hints) * point // args.points
+            if steps == 0:
+                continue
+            start = time.perf_counter()
+            ExecutionProofExp.from_proof_hints(iter(hints[:steps]), language_semantics)
+            seconds = time.perf_counter() - start
+            print(f'{workload.name:<30} {steps:>8} {seconds:>10.3f} {seconds / steps * 1e6:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
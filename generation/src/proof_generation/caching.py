@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from functools import update_wrapper
+from typing import TYPE_CHECKING, Any, Generic, NamedTuple, TypeVar
+
+from proof_generation.pattern import Pattern
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Hashable
+
+R = TypeVar('R')
+K = TypeVar('K')
+V = TypeVar('V')
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+def _key(arg: Any) -> Hashable:
+    # Patterns are interned, so identical patterns are the same object
+    return id(arg) if isinstance(arg, Pattern) else arg
+
+
+class BoundedCache(Generic[R]):
+    """Size-bounded LRU cache of a function, keyed by the identity of its pattern arguments.
+    Unlike `functools.cache`, looking up a pattern never walks it, and the least recently
+    used entries are dropped once `maxsize` is reached. Each entry keeps its arguments
+    alive, so that their ids cannot be reused by other patterns while it is cached.
+    """
+
+    registry: dict[str, BoundedCache[Any]] = {}
+
+    def __init__(self, function: Callable[..., R], maxsize: int) -> None:
+        self.function = function
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[Hashable, ...], tuple[tuple[Any, ...], R]] = OrderedDict()
+        update_wrapper(self, function)
+        BoundedCache.registry[f'{function.__module__}.{function.__qualname__}'] = self
+
+    def __call__(self, *args: Any) -> R:
+        key = tuple(map(_key, args))
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+        self.misses += 1
+        ret = self.function(*args)
+        self._entries[key] = (args, ret)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return ret
+
+    def resize(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        while len(self._entries) > maxsize:
+            self._entries.popitem(last=False)
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+    def cache_clear(self) -> None:
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+def bounded_cache(maxsize: int) -> Callable[[Callable[..., R]], BoundedCache[R]]:
+    def decorator(function: Callable[..., R]) -> BoundedCache[R]:
+        return BoundedCache(function, maxsize)
+
+    return decorator
+
+
+class WindowCache(Generic[K, V]):
+    """Cache of the entries used in the last `window` rounds, such as the conversions of consecutive
+    configurations. Unlike a size-bounded LRU, a round larger than the cache never evicts its own
+    entries, and the cache shrinks again once large rounds are over.
+    """
+
+    def __init__(self, window: int) -> None:
+        self.window = window
+        self.round = 0
+        # Ordered by last use, so the entries of old rounds are at the front
+        self._entries: OrderedDict[K, tuple[V, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries
+
+    def get(self, key: K) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] != self.round:
+            self._entries[key] = (entry[0], self.round)
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: K, value: V) -> None:
+        self._entries[key] = (value, self.round)
+        self._entries.move_to_end(key)
+
+    def next_round(self) -> None:
+        """Start a new round, and drop the entries unused for the last `window` rounds."""
+        self.round += 1
+        oldest = self.round - self.window
+        while self._entries and next(iter(self._entries.values()))[1] < oldest:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def cache_stats() -> dict[str, CacheInfo]:
+    """Hit and miss counters of all bounded caches, by qualified function name."""
+    return {name: cache.cache_info() for name, cache in BoundedCache.registry.items()}
@@ -1,34 +1,54 @@
 from __future__ import annotations
 
-from collections import namedtuple
+import heapq
 from typing import TYPE_CHECKING
 
-from proof_generation.pattern import App, Exists, Implies, Mu
+from proof_generation.instruction import Encoding
+from proof_generation.pattern import App, ESubst, Exists, Implies, Instantiate, Mu, SSubst
 from proof_generation.proved import Proved
 from proof_generation.stateful_interpreter import StatefulInterpreter
 
 if TYPE_CHECKING:
-    from collections.abc import Mapping
+    from collections.abc import Iterable, Mapping, Sequence
 
     from proof_generation.claim import Claim
     from proof_generation.interpreter import ExecutionPhase
-    from proof_generation.pattern import ESubst, EVar, MetaVar, Pattern, SSubst, SVar
+    from proof_generation.pattern import EVar, MetaVar, Pattern, SVar
 
 
 class CountingInterpreter(StatefulInterpreter):
-    Stats = namedtuple('Stats', ['uses', 'complexity_score', 'complexity', 'used_patterns'])
+    """Collects usage statistics of patterns, and suggests the ones worth memoizing.
+    Distinct patterns are numbered in the order they are first used, and their
+    statistics are kept in lists indexed by these ids, along with the edges to
+    their direct children and parents. These hash-consed patterns form a DAG
+    shared by the gamma, claim and proof phases. How often a pattern occurs
+    within another one is derived from its edges when needed.
+    """
 
     def __init__(
         self,
         phase: ExecutionPhase,
         claims: list[Claim] | None = None,
+        max_memory_slots: int = Encoding.Byte.max_memory_slots,
+        trusted: bool = False,
     ) -> None:
-        super().__init__(phase=phase, claims=claims)
-        self._max_allowed_slots = 256
+        super().__init__(phase=phase, claims=claims, trusted=trusted)
+        self._max_allowed_slots = max_memory_slots
         self._finalized = False
-        self._pattern_usage: dict[Pattern, CountingInterpreter.Stats] = {}
+        self._ids: dict[Pattern, int] = {}
+        self._patterns: list[Pattern] = []
+        self._uses: list[int] = []
+        self._complexity: list[int] = []
+        self._scores: list[int] = []
+        self._children: list[tuple[int, ...]] = []
+        self._parents: list[list[int]] = []
+        self._memoized = bytearray()
         self._saved_by_implementation: set[Pattern] = set()
         self._suggested_for_memoization: set[Pattern] = set()
+        self._excluded: set[int] = set()
+        self._collected: tuple[list[int], list[int]] = ([], [])
+        # Depth of the `pattern` calls being executed
+        self._building = 0
 
     @property
     def max_memory_slots(self) -> int:
@@ -43,81 +63,132 @@ class CountingInterpreter(StatefulInterpreter):
         assert self.finalized, 'Suggestions cannot be accessed until the interpreter is finalized'
         return set(self._suggested_for_memoization)
 
+    @property
+    def pattern_count(self) -> int:
+        return len(self._patterns)
+
     def finalize(self) -> set[Pattern]:
         assert not self._finalized
         self._max_allowed_slots -= len(self.memory)
+        # Planning updates the statistics, so the collected ones are kept to plan again
+        self._collected = (list(self._uses), list(self._complexity))
+        self._plan()
+        self._finalized = True
+        return self.suggested_for_memoization
+
+    def exclude(self, patterns: Iterable[Pattern]) -> set[Pattern]:
+        """Plan again without suggesting the given patterns, so that their memory slots go to other patterns."""
+        assert self.finalized, 'Patterns can only be excluded from the suggestions of a finalized interpreter'
+        self._excluded.update(id for pattern in patterns if (id := self._ids.get(pattern)) is not None)
+        self._uses, self._complexity = (list(stats) for stats in self._collected)
+        self._plan()
+        return self.suggested_for_memoization
+
+    def _plan(self) -> None:
         memoized = [p.conclusion if isinstance(p, Proved) else p for p in self.memory]
 
-        def get_suitable() -> list[Pattern]:
-            already_selected = [
-                p for p in memoized if p not in self._suggested_for_memoization and p in self._pattern_usage
-            ]
-            if already_selected:
-                return already_selected
-            else:
-                suitable = [
-                    pattern
-                    for pattern in self._pattern_usage
-                    if self._pattern_usage[pattern].uses > 1 and pattern not in self._suggested_for_memoization
-                ]
-                suitable.sort(key=lambda pattern: self._pattern_usage[pattern].complexity_score, reverse=True)
-                return suitable
+        # Update the complexity score for each pattern
+        self._scores = [
+            _saving(uses, complexity) for uses, complexity in zip(self._uses, self._complexity, strict=True)
+        ]
+        self._memoized = bytearray(len(self._patterns))
 
         # Now we can compute iteratively suggested patterns
         counter = self._max_allowed_slots
 
-        # Update the complexity score for each pattern
-        for pattern in self._pattern_usage:
-            self._compute_complexity_score(pattern)
-
-        todo = get_suitable()
-        while counter > 0 and len(todo) > 0:
-            # Sorting patterns according to multiplication of the number of uses and number of atomic elements in the pattern
-            # This should give us the the size of thw whole stack which is occupied by the pattern construction operations
-            pattern = todo.pop(0)
-            pattern_stats = self._pattern_usage[pattern]
-            self._suggested_for_memoization.add(pattern)
-            counter -= 1
+        # Patterns saved by the implementation are suggested first
+        for pattern in memoized:
+            if counter <= 0:
+                break
+            id = self._ids.get(pattern)
+            if id is not None and not self._memoized[id] and id not in self._excluded:
+                self._memoize(id)
+                counter -= 1
+
+        # Then the patterns with the highest score, which is the number of instructions saved by memoizing them.
+        # Ties are broken by the order in which patterns were first used.
+        # Scores are only pushed when they change, and outdated entries are skipped once they reach the top.
+        heap = [
+            (-score, id)
+            for id, score in enumerate(self._scores)
+            if score > 0 and not self._memoized[id] and id not in self._excluded
+        ]
+        heapq.heapify(heap)
+        while counter > 0 and heap:
+            score, id = heapq.heappop(heap)
+            if self._memoized[id] or self._scores[id] != -score:
+                continue
 
-            # Update related stats
-            dependencies = {p for p, stats in self._pattern_usage.items() if pattern in stats.used_patterns}
-            requires_updating = set()
-            # Now, when we memoized the pattern, patterns that contains this one become less complex,
-            # so we need to update their complexity and later update the score
-            for dependency in dependencies:
-                old_stats = self._pattern_usage[dependency]
-                requires_updating.add(dependency)
-                self._pattern_usage[dependency] = self._pattern_usage[dependency]._replace(
-                    complexity=old_stats.complexity - pattern_stats.complexity * old_stats.used_patterns[pattern] + 1
-                )
-
-                # We also start using less patterns that are used by the memoized one
-                for child in pattern_stats.used_patterns:
-                    self._pattern_usage[dependency].used_patterns[child] -= (
-                        pattern_stats.used_patterns[child] * old_stats.used_patterns[pattern]
-                    )
-
-            # As we memoized the pattern, patterns that are used by this one become less frequently used,
-            # so we need to update their usage and later update the score metric
-            for used in pattern_stats.used_patterns:
-                requires_updating.add(used)
-                old_stats = self._pattern_usage[used]
-                self._pattern_usage[used] = self._pattern_usage[used]._replace(
-                    uses=old_stats.uses - pattern_stats.used_patterns[used] * pattern_stats.uses
-                )
-
-            # Memoized pattern becomes atomic
-            self._pattern_usage[pattern] = self._pattern_usage[pattern]._replace(complexity=1)
-
-            # Recalculate scores for all patterns
-            for pattern in requires_updating:
-                self._compute_complexity_score(pattern)
-
-            # Recalculate options
-            todo = get_suitable()
-
-        self._finalized = True
-        return self.suggested_for_memoization
+            counter -= 1
+            for updated in self._memoize(id):
+                if self._scores[updated] > 0 and not self._memoized[updated] and updated not in self._excluded:
+                    heapq.heappush(heap, (-self._scores[updated], updated))
+
+        self._suggested_for_memoization = {self._patterns[id] for id, memoized in enumerate(self._memoized) if memoized}
+
+    def _memoize(self, id: int) -> list[int]:
+        """Suggest the pattern for memoization and update the stats of related patterns, which are returned."""
+        # Occurrences of the pattern within the patterns that contain it, and of the patterns it contains within it.
+        # Occurrences through already memoized patterns do not count, as those are loaded as a whole.
+        dependencies = self._occurrences(id, self._parents)
+        used_patterns = self._occurrences(id, self._children)
+
+        # Now, when we memoized the pattern, patterns that contains this one become less complex,
+        # so we need to update their complexity and later update the score
+        complexity = self._complexity[id]
+        for dependency, occurrences in dependencies.items():
+            if not self._memoized[dependency]:
+                self._complexity[dependency] -= occurrences * (complexity - 1)
+
+        # As we memoized the pattern, it is only built once and the patterns it contains are built less often,
+        # so we need to update their usage and later update the score metric
+        uses = self._uses[id]
+        for used, occurrences in used_patterns.items():
+            self._uses[used] -= occurrences * (uses - 1)
+
+        # Memoized pattern becomes atomic
+        self._complexity[id] = 1
+        self._memoized[id] = True
+
+        # Recalculate scores for all patterns
+        requires_updating = [*dependencies, *used_patterns]
+        for updated in requires_updating:
+            self._scores[updated] = _saving(self._uses[updated], self._complexity[updated])
+        return requires_updating
+
+    def _occurrences(self, id: int, edges: Sequence[Sequence[int]]) -> dict[int, int]:
+        """Count the paths from the pattern to every pattern reachable along the edges, except itself.
+        Paths do not continue through memoized patterns, but all reachable patterns are returned.
+        """
+        # Depth-first search, visiting patterns in topological order once reversed
+        order = []
+        visited = {id}
+        stack = [(id, iter(edges[id]))]
+        while stack:
+            current, successors = stack[-1]
+            for successor in successors:
+                if successor not in visited:
+                    visited.add(successor)
+                    stack.append((successor, iter(edges[successor])))
+                    break
+            else:
+                stack.pop()
+                order.append(current)
+
+        paths = dict.fromkeys(order, 0)
+        paths[id] = 1
+        for current in reversed(order):
+            if current == id or not self._memoized[current]:
+                for successor in edges[current]:
+                    paths[successor] += paths[current]
+        del paths[id]
+        return paths
+
+    def pattern(self, p: Pattern) -> Pattern:
+        self._building += 1
+        ret = super().pattern(p)
+        self._building -= 1
+        return ret
 
     def evar(self, id: int) -> Pattern:
         ret = super().evar(id)
@@ -177,78 +248,54 @@ class CountingInterpreter(StatefulInterpreter):
         self._collect_patterns(ret)
         return ret
 
-    def prop1(self) -> Proved:
-        ret = super().prop1()
-        self._collect_patterns(ret.conclusion)
-        return ret
-
-    def prop2(self) -> Proved:
-        ret = super().prop2()
-        self._collect_patterns(ret.conclusion)
-        return ret
-
-    def prop3(self) -> Proved:
-        ret = super().prop3()
-        self._collect_patterns(ret.conclusion)
-        return ret
-
-    def modus_ponens(self, left: Proved, right: Proved) -> Proved:
-        ret = super().modus_ponens(left, right)
-        self._collect_patterns(ret.conclusion)
-        return ret
-
-    def instantiate(self, proved: Proved, delta: dict[int, Pattern]) -> Proved:
-        ret = super().instantiate(proved, delta)
-        self._collect_patterns(ret.conclusion)
-        return ret
-
     def instantiate_pattern(self, pattern: Pattern, delta: Mapping[int, Pattern]) -> Pattern:
         ret = super().instantiate_pattern(pattern, delta)
         self._collect_patterns(ret)
         return ret
 
-    def _collect_patterns(self, p: Pattern) -> None:
-        children: list[Pattern] = []
-        if isinstance(p, Implies):
-            children.append(p.left)
-            children.append(p.right)
-        elif isinstance(p, App):
-            children.append(p.left)
-            children.append(p.right)
-        elif isinstance(p, Exists):
-            children.append(p.subpattern)
-        elif isinstance(p, Mu):
-            children.append(p.subpattern)
-
-        if p not in self._pattern_usage:
-            self._pattern_usage[p] = CountingInterpreter.Stats(
-                uses=1, complexity_score=0, complexity=1, used_patterns={}
-            )
-
-            # Go deeper recusively
-            for child in children:
-                self._collect_patterns(child)
-
-            # Increase the complexity score for each child plus one
-            self._pattern_usage[p] = self._pattern_usage[p]._replace(
-                complexity=self._pattern_usage[p].complexity
-                + sum(self._pattern_usage[child].complexity for child in children)
-            )
-
-            # Add usages of children to the pattern
-            stats = self._pattern_usage[p]
-            for child in children:
-                child_stats = self._pattern_usage[child]
-                stats.used_patterns.setdefault(child, 0)
-                stats.used_patterns[child] += 1
-                for child_uses, number in child_stats.used_patterns.items():
-                    stats.used_patterns.setdefault(child_uses, 0)
-                    stats.used_patterns[child_uses] += number
-        else:
-            self._pattern_usage[p] = self._pattern_usage[p]._replace(uses=self._pattern_usage[p].uses + 1)
-
-    def _compute_complexity_score(self, p: Pattern) -> None:
-        entries = self._pattern_usage[p].uses
-        complexity = self._pattern_usage[p].complexity
-
-        self._pattern_usage[p] = self._pattern_usage[p]._replace(complexity_score=entries * complexity)
+    def _collect_patterns(self, p: Pattern) -> int:
+        """Count an instruction building the pattern. Only the patterns built through `pattern`
+        are counted, as the memoizing interpreter cannot load the others instead.
+        Conclusions of proofs are not built by instructions, and neither are the parts
+        of patterns when they are first seen, as they have been built and counted already.
+        """
+        id = self._node(p)
+        if self._building:
+            self._uses[id] += 1
+        return id
+
+    def _node(self, p: Pattern) -> int:
+        id = self._ids.get(p)
+        if id is not None:
+            return id
+
+        id = len(self._patterns)
+        self._ids[p] = id
+        self._patterns.append(p)
+        self._uses.append(0)
+        self._complexity.append(1)
+        self._children.append(())
+        self._parents.append([])
+
+        # Go deeper recursively
+        children: tuple[int, ...] = ()
+        if isinstance(p, Implies | App):
+            children = (self._node(p.left), self._node(p.right))
+        elif isinstance(p, Exists | Mu):
+            children = (self._node(p.subpattern),)
+        elif isinstance(p, ESubst | SSubst):
+            children = (self._node(p.pattern), self._node(p.plug))
+        elif isinstance(p, Instantiate):
+            # Notation is built from the plugs and the pattern they are plugged into
+            children = (self._node(p.pattern), *(self._node(plug) for plug in p.inst.values()))
+        self._children[id] = children
+        for child in children:
+            self._parents[child].append(id)
+            # The complexity is the number of instructions building the pattern
+            self._complexity[id] += self._complexity[child]
+        return id
+
+
+def _saving(uses: int, complexity: int) -> int:
+    """Instructions saved by building a pattern once and saving it, then loading it instead of building it again."""
+    return (uses - 1) * (complexity - 1) - 1
@@ -1,169 +1,343 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Any
-
-from proof_generation.instruction import Instruction
+import mmap
+import sys
+import time
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from proof_generation.basic_interpreter import BasicInterpreter
+from proof_generation.instruction import FORMAT_MARKER, VARINT_VERSION, Encoding, Instruction
 from proof_generation.interpreter import ExecutionPhase
-from proof_generation.pattern import Pattern
+from proof_generation.pattern import ESubst, EVar, MetaVar, Pattern, SSubst, SVar
 from proof_generation.proved import Proved
 
 if TYPE_CHECKING:
-    from proof_generation.pretty_printing_interpreter import PrettyPrintingInterpreter
+    from collections.abc import Callable, Iterator
 
+    from proof_generation.interpreter import Interpreter
 
-class DeserializingException(Exception):
-    pass
+    Buffer = bytes | bytearray | memoryview | mmap.mmap
 
 
-def deserialize_instructions(data: Any, interpreter: PrettyPrintingInterpreter) -> None:
-    index = 0
+class DeserializingException(Exception):
+    pass
 
-    def maybe_next_byte() -> int | None:
-        nonlocal index
-        if index == len(data):
-            return None
-        ret = data[index]
-        index += 1
-        return ret
 
-    def next_byte(err_msg: str) -> int:
-        match maybe_next_byte():
-            case None:
-                raise DeserializingException(err_msg)
-            case ret:
-                assert ret is not None
+class Deserializer:
+    """Decode the binary proof format and replay it on an interpreter.
+
+    The stack, memory and claims are tracked here from the terms returned by the
+    interpreter, following the semantics of the Rust checker, so any `Interpreter`
+    can be fed: an untrusted `BasicInterpreter` checks the side conditions of every
+    rule like the Rust checker does, a `SerializingInterpreter` reproduces the input,
+    a `PrettyPrintingInterpreter` renders it.
+    """
+
+    def __init__(self, interpreter: Interpreter) -> None:
+        self.interpreter = interpreter
+        self.stack: list[Pattern | Proved] = []
+        self.memory: list[Pattern | Proved] = []
+        self.claims: list[Pattern] = []
+        # Whether the claims were deserialized, so that each proof must prove one
+        self.claims_known = False
+        self.instructions = 0
+        self.encoding = Encoding.Byte
+        self._data = memoryview(b'')
+        self._index = 0
+
+    def into_claim_phase(self) -> None:
+        self.interpreter.into_claim_phase()
+        self.stack = []
+
+    def into_proof_phase(self) -> None:
+        self.interpreter.into_proof_phase()
+        self.stack = []
+
+    def deserialize(self, data: Buffer) -> None:
+        """Decode all instructions of `data` in the current phase of the interpreter."""
+        if self.interpreter.phase == ExecutionPhase.Claim:
+            self.claims_known = True
+        self._data = view = memoryview(data).cast('B')
+        self._index = 0
+        self.encoding = Encoding.Byte
+        if len(view) and view[0] == FORMAT_MARKER:
+            self._index = 1
+            if (version := self._operand('format version')) != VARINT_VERSION:
+                raise DeserializingException(f'Unsupported format version: {version}')
+            self.encoding = Encoding.Varint
+        end = len(view)
+        handlers = _HANDLERS
+        try:
+            while self._index < end:
+                opcode = view[self._index]
+                self._index += 1
+                handler = handlers[opcode]
+                if handler is None:
+                    raise DeserializingException(f'Unknown instruction: {opcode}')
+                handler(self)
+                self.instructions += 1
+        finally:
+            self._data = memoryview(b'')
+            view.release()
+
+    # Operands
+
+    def _operand(self, what: str) -> int:
+        try:
+            ret = self._data[self._index]
+            self._index += 1
+            if ret < 0x80 or self.encoding is Encoding.Byte:
                 return ret
 
-    def read_list() -> tuple[int, ...]:
-        length = next_byte('Expected list length')
-        assert length is not None
-
-        res = []
-        for i in range(length):
-            elem = next_byte(f'Expected {i}-th element of list')
-            assert elem is not None
-            res.append(elem)
-
-        return tuple(res)
-
-    while byte := maybe_next_byte():
-        instruction = Instruction(byte)
-
-        if instruction == Instruction.EVar:
-            id = next_byte('Expected EVar id.')
-            _ = interpreter.evar(id)
-
-        elif instruction == Instruction.SVar:
-            id = next_byte('Expected SVar id.')
-            _ = interpreter.svar(id)
-
-        elif instruction == Instruction.Symbol:
-            id = next_byte('Expected Symbol id.')
-            _ = interpreter.symbol(str(id))
-
-        elif instruction == Instruction.Implies:
-            right = interpreter.stack[-1]
-            left = interpreter.stack[-2]
-            _ = interpreter.implies(left, right)
-
-        elif instruction == Instruction.App:
-            right = interpreter.stack[-1]
-            left = interpreter.stack[-2]
-            _ = interpreter.app(left, right)
-
-        elif instruction == Instruction.Exists:
-            id = next_byte('Expected Exists binder id.')
-            subpattern = interpreter.stack[-1]
-            _ = interpreter.exists(id, subpattern)
-
-        elif instruction == Instruction.Mu:
-            id = next_byte('Expected Mu binder id.')
-            subpattern = interpreter.stack[-1]
-            _ = interpreter.mu(id, subpattern)
-
-        elif instruction == Instruction.ESubst:
-            evar_id = next_byte('Expected evar_id.')
-            pattern = interpreter.stack[-1]
-            plug = interpreter.stack[-1]
-            interpreter.esubst(evar_id, pattern, plug)
-
-        elif instruction == Instruction.SSubst:
-            svar_id = next_byte('Expected svar_id.')
-            pattern = interpreter.stack[-1]
-            plug = interpreter.stack[-1]
-            interpreter.ssubst(svar_id, pattern, plug)
-
-        elif instruction == Instruction.MetaVar:
-            id = next_byte('Expected MetaVar id.')
-            e_fresh, s_fresh, positive, negative, app_ctxt_holes = (read_list() for _ in range(5))
-            _ = interpreter.metavar(id, e_fresh, s_fresh, positive, negative, app_ctxt_holes)
-
-        elif instruction == Instruction.CleanMetaVar:
-            id = next_byte('Expected MetaVar id.')
-            _ = interpreter.metavar(id, (), (), (), (), ())
-
-        elif instruction == Instruction.Prop1:
-            _ = interpreter.prop1()
-
-        elif instruction == Instruction.Prop2:
-            _ = interpreter.prop2()
-
-        elif instruction == Instruction.Prop3:
-            _ = interpreter.prop3()
-
-        elif instruction == Instruction.ModusPonens:
-            right = interpreter.stack[-1]
-            left = interpreter.stack[-2]
-            _ = interpreter.modus_ponens(left, right)
-
-        elif instruction == Instruction.Instantiate:
-            n = next_byte('Expected number of instantiations.')
-            assert n is not None
-
-            def assert_is_pattern(p: Proved | Pattern) -> Pattern:
-                assert isinstance(p, Pattern)
-                return p
-
-            keys = [next_byte('Insufficient instantiation indices') for _ in range(n)]
-            target = interpreter.stack[-1]
-            values = map(assert_is_pattern, reversed(interpreter.stack[-(n + 1) : -1]))
-
-            delta = dict(reversed(list(zip(keys, values, strict=True))))
-
-            if isinstance(target, Proved):
-                interpreter.instantiate(target, delta)
-            elif isinstance(target, Pattern):
-                interpreter.instantiate_pattern(target, delta)
-            else:
-                raise DeserializingException(f'Cannot instantiate term {target}.')
-
-        elif instruction == Instruction.Pop:
-            interpreter.pop(interpreter.stack[-1])
-
-        elif instruction == Instruction.Save:
-            term = interpreter.stack[-1]
-            interpreter.save(str(len(interpreter.memory)), term)
-
-        elif instruction == Instruction.Load:
-            id = next_byte('Expected index for Load instruction')
-            assert id is not None
-            if id >= len(interpreter.memory):
-                raise DeserializingException(f'Invalid index {id} for Load instruction.')
-            interpreter.load(str(id), interpreter.memory[id])
-
-        elif instruction == Instruction.Publish:
-            if interpreter.phase == ExecutionPhase.Claim:
-                pattern = interpreter.stack[-1]
-                assert isinstance(pattern, Pattern)
-                interpreter.publish_claim(pattern)
-            elif interpreter.phase == ExecutionPhase.Proof:
-                claim = interpreter.claims.pop()
-                theorem = interpreter.stack[-1]
-                assert isinstance(theorem, Proved)
-                interpreter.publish_claim(claim.pattern)
-                if claim.pattern != theorem.conclusion:
+            # Unsigned LEB128, the first byte has been read already
+            ret &= 0x7F
+            shift = 7
+            while (byte := self._data[self._index]) & 0x80:
+                ret |= (byte & 0x7F) << shift
+                shift += 7
+                self._index += 1
+            self._index += 1
+            return ret | byte << shift
+        except IndexError:
+            raise DeserializingException(f'Expected {what}.') from None
+
+    def _operands(self, what: str) -> list[int]:
+        length = self._operand(f'length of {what}')
+        if self.encoding is Encoding.Varint:
+            return [self._operand(what) for _ in range(length)]
+        start = self._index
+        self._index += length
+        if self._index > len(self._data):
+            raise DeserializingException(f'Expected {length} elements of {what}.')
+        return self._data[start : self._index].tolist()
+
+    # Stack
+
+    def _pop(self) -> Pattern | Proved:
+        try:
+            return self.stack.pop()
+        except IndexError:
+            raise DeserializingException('Insufficient stack items.') from None
+
+    def _pop_pattern(self) -> Pattern:
+        term = self._pop()
+        if not isinstance(term, Pattern):
+            raise DeserializingException(f'Expected a pattern on the stack, got: {term}')
+        return term
+
+    def _pop_proved(self) -> Proved:
+        term = self._pop()
+        if not isinstance(term, Proved):
+            raise DeserializingException(f'Expected a proof on the stack, got: {term}')
+        return term
+
+    def _pop_metavar(self) -> MetaVar | ESubst | SSubst:
+        term = self._pop_pattern()
+        if not isinstance(term, MetaVar | ESubst | SSubst):
+            raise DeserializingException(f'Expected a metavariable or substitution on the stack, got: {term}')
+        return term
+
+    # Instructions
+
+    def _evar(self) -> None:
+        self.stack.append(self.interpreter.evar(self._operand('EVar id')))
+
+    def _svar(self) -> None:
+        self.stack.append(self.interpreter.svar(self._operand('SVar id')))
+
+    def _symbol(self) -> None:
+        self.stack.append(self.interpreter.symbol(str(self._operand('Symbol id'))))
+
+    def _implies(self) -> None:
+        right = self._pop_pattern()
+        left = self._pop_pattern()
+        self.stack.append(self.interpreter.implies(left, right))
+
+    def _app(self) -> None:
+        right = self._pop_pattern()
+        left = self._pop_pattern()
+        self.stack.append(self.interpreter.app(left, right))
+
+    def _mu(self) -> None:
+        var = self._operand('Mu binder id')
+        self.stack.append(self.interpreter.mu(var, self._pop_pattern()))
+
+    def _exists(self) -> None:
+        var = self._operand('Exists binder id')
+        self.stack.append(self.interpreter.exists(var, self._pop_pattern()))
+
+    def _metavar(self) -> None:
+        id = self._operand('MetaVar id')
+        e_fresh = tuple(EVar(var) for var in self._operands('e_fresh'))
+        s_fresh = tuple(SVar(var) for var in self._operands('s_fresh'))
+        positive = tuple(SVar(var) for var in self._operands('positive'))
+        negative = tuple(SVar(var) for var in self._operands('negative'))
+        app_ctxt_holes = tuple(EVar(var) for var in self._operands('app_ctxt_holes'))
+        self.stack.append(self.interpreter.metavar(id, e_fresh, s_fresh, positive, negative, app_ctxt_holes))
+
+    def _clean_metavar(self) -> None:
+        self.stack.append(self.interpreter.metavar(self._operand('MetaVar id')))
+
+    def _esubst(self) -> None:
+        evar_id = self._operand('ESubst evar id')
+        pattern = self._pop_metavar()
+        plug = self._pop_pattern()
+        self.stack.append(self.interpreter.esubst(evar_id, pattern, plug))
+
+    def _ssubst(self) -> None:
+        svar_id = self._operand('SSubst svar id')
+        pattern = self._pop_metavar()
+        plug = self._pop_pattern()
+        self.stack.append(self.interpreter.ssubst(svar_id, pattern, plug))
+
+    def _prop1(self) -> None:
+        self.stack.append(self.interpreter.prop1())
+
+    def _prop2(self) -> None:
+        self.stack.append(self.interpreter.prop2())
+
+    def _prop3(self) -> None:
+        self.stack.append(self.interpreter.prop3())
+
+    def _quantifier(self) -> None:
+        self.stack.append(self.interpreter.exists_quantifier())
+
+    def _modus_ponens(self) -> None:
+        right = self._pop_proved()
+        left = self._pop_proved()
+        self.stack.append(self.interpreter.modus_ponens(left, right))
+
+    def _generalization(self) -> None:
+        var = EVar(self._operand('Generalization evar id'))
+        self.stack.append(self.interpreter.exists_generalization(self._pop_proved(), var))
+
+    def _instantiate(self) -> None:
+        keys = self._operands('instantiation indices')
+        target = self._pop()
+        values = [self._pop_pattern() for _ in keys]
+        # The serializer writes the keys in reverse, and the plugs are pushed in order
+        delta = dict(zip(reversed(keys), reversed(values), strict=True))
+        if isinstance(target, Proved):
+            self.stack.append(self.interpreter.instantiate(target, delta))
+        else:
+            self.stack.append(self.interpreter.instantiate_pattern(target, delta))
+
+    def _pop_instruction(self) -> None:
+        self.interpreter.pop(self._pop())
+
+    def _save(self) -> None:
+        if not self.stack:
+            raise DeserializingException('Save needs an entry on the stack.')
+        term = self.stack[-1]
+        self.interpreter.save(str(len(self.memory)), term)
+        self.memory.append(term)
+
+    def _load(self) -> None:
+        id = self._operand('index for Load instruction')
+        if id >= len(self.memory):
+            raise DeserializingException(f'Invalid index {id} for Load instruction.')
+        term = self.memory[id]
+        self.interpreter.load(str(id), term)
+        self.stack.append(term)
+
+    def _publish(self) -> None:
+        match self.interpreter.phase:
+            case ExecutionPhase.Gamma:
+                axiom = self._pop_pattern()
+                self.interpreter.publish_axiom(axiom)
+                self.memory.append(Proved(axiom))
+            case ExecutionPhase.Claim:
+                claim = self._pop_pattern()
+                self.interpreter.publish_claim(claim)
+                self.claims.append(claim)
+            case ExecutionPhase.Proof:
+                theorem = self._pop_proved()
+                # Claims are only known here when the claim phase was deserialized as well
+                if self.claims_known and not self.claims:
+                    raise DeserializingException(f'Insufficient claims for theorem: {theorem}')
+                if self.claims_known and (claim := self.claims.pop()) != theorem.conclusion:
                     raise DeserializingException(
                         f'This proof does not prove the requested claim: {claim}, theorem: {theorem}'
                     )
-        else:
-            raise NotImplementedError(f'Unknown instruction: {instruction}')
+                self.interpreter.publish_proof(theorem)
+
+
+_HANDLERS: list[Callable[[Deserializer], None] | None] = [None] * 256
+for _instruction, _handler in {
+    Instruction.EVar: Deserializer._evar,
+    Instruction.SVar: Deserializer._svar,
+    Instruction.Symbol: Deserializer._symbol,
+    Instruction.Implies: Deserializer._implies,
+    Instruction.App: Deserializer._app,
+    Instruction.Mu: Deserializer._mu,
+    Instruction.Exists: Deserializer._exists,
+    Instruction.MetaVar: Deserializer._metavar,
+    Instruction.CleanMetaVar: Deserializer._clean_metavar,
+    Instruction.ESubst: Deserializer._esubst,
+    Instruction.SSubst: Deserializer._ssubst,
+    Instruction.Prop1: Deserializer._prop1,
+    Instruction.Prop2: Deserializer._prop2,
+    Instruction.Prop3: Deserializer._prop3,
+    Instruction.Quantifier: Deserializer._quantifier,
+    Instruction.ModusPonens: Deserializer._modus_ponens,
+    Instruction.Generalization: Deserializer._generalization,
+    Instruction.Instantiate: Deserializer._instantiate,
+    Instruction.Pop: Deserializer._pop_instruction,
+    Instruction.Save: Deserializer._save,
+    Instruction.Load: Deserializer._load,
+    Instruction.Publish: Deserializer._publish,
+}.items():
+    _HANDLERS[_instruction] = _handler
+
+
+def deserialize_instructions(data: Buffer, interpreter: Interpreter) -> None:
+    Deserializer(interpreter).deserialize(data)
+
+
+@contextmanager
+def mapped(path: Path) -> Iterator[bytes | mmap.mmap]:
+    """Map a proof file into memory without copying it."""
+    with open(path, 'rb') as f:
+        # Empty files cannot be mapped
+        if Path(path).stat().st_size == 0:
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+
+def deserialize_files(gamma: Path, claims: Path, proof: Path, interpreter: Interpreter) -> Deserializer:
+    """Replay the three phases of a proof, as stored in the .ml-gamma, .ml-claim and .ml-proof files."""
+    assert interpreter.phase == ExecutionPhase.Gamma
+    deserializer = Deserializer(interpreter)
+    with mapped(gamma) as data:
+        deserializer.deserialize(data)
+    deserializer.into_claim_phase()
+    with mapped(claims) as data:
+        deserializer.deserialize(data)
+    deserializer.into_proof_phase()
+    with mapped(proof) as data:
+        deserializer.deserialize(data)
+    if deserializer.claims:
+        raise DeserializingException(f'{len(deserializer.claims)} claims were not proved.')
+    return deserializer
+
+
+def main(argv: list[str]) -> None:
+    argparser = ArgumentParser(description='Check a binary proof by replaying it on the Python interpreter')
+    argparser.add_argument('gamma', type=Path, help='The .ml-gamma file')
+    argparser.add_argument('claims', type=Path, help='The .ml-claim file')
+    argparser.add_argument('proof', type=Path, help='The .ml-proof file')
+    args = argparser.parse_args(argv)
+
+    start = time.perf_counter()
+    deserializer = deserialize_files(args.gamma, args.claims, args.proof, BasicInterpreter(ExecutionPhase.Gamma))
+    seconds = time.perf_counter() - start
+    print(f'Checked {deserializer.instructions} instructions in {seconds:.3f}s')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from enum import IntEnum
+from enum import Enum, IntEnum
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
@@ -48,11 +48,48 @@ class Instruction(IntEnum):
     CleanMetaVar = 0x89
 
 
-def pack(input: Iterator[int]) -> bytes:
-    """Render into a binary representation.
-    For now, we restrict ourselves to 256 distinct symbols, element
-    variables, set variables, and metavariables, considered separately,
-    and 256 memory locations.
+# Versioned files start with this byte, which is not an instruction, followed by the format version
+FORMAT_MARKER = 0x00
+VARINT_VERSION = 0x01
+
+
+class Encoding(str, Enum):
+    """Encoding of instruction operands.
+    Operands are single bytes in unversioned files, which restricts us to 256
+    distinct symbols, element variables, set variables, and metavariables,
+    considered separately, and 256 memory locations.
+    The varint encoding writes them as unsigned LEB128 instead.
     """
 
+    Byte = 'byte'
+    Varint = 'varint'
+
+    @property
+    def header(self) -> bytes:
+        match self:
+            case Encoding.Byte:
+                return b''
+            case Encoding.Varint:
+                return bytes([FORMAT_MARKER, VARINT_VERSION])
+
+    @property
+    def max_memory_slots(self) -> int:
+        match self:
+            case Encoding.Byte:
+                return 256
+            case Encoding.Varint:
+                # Indices of up to two bytes
+                return 1 << 14
+
+
+def write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def pack(input: Iterator[int]) -> bytes:
+    """Render into a binary representation using the byte encoding."""
+
     return bytes(input)
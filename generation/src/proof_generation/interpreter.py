@@ -5,12 +5,12 @@ from enum import Enum
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
-    from collections.abc import Mapping
+    from collections.abc import Callable, Mapping
 
-    from .proved import Proved
     from proof_generation.pattern import Pattern
 
 from proof_generation.pattern import App, ESubst, EVar, Exists, Implies, Instantiate, MetaVar, Mu, SSubst, SVar, Symbol
+from proof_generation.proved import Proved
 
 
 class ExecutionPhase(Enum):
@@ -20,6 +20,9 @@ class ExecutionPhase(Enum):
 
 
 class Interpreter(ABC):
+    # Trusted interpreters skip the checks that an offline verification of their output repeats
+    trusted: bool = False
+
     # concrete methods
     def __init__(self, phase: ExecutionPhase):
         self.phase = phase
@@ -78,6 +81,23 @@ class Interpreter(ABC):
 
         raise NotImplementedError(f'{type(p)}')
 
+    def proof(self, conclusion: Pattern, expr: Callable[[Interpreter], Proved]) -> Proved:
+        """Execute the steps of a proof of the conclusion, unless the interpreter loads it instead."""
+        if self.begin_proof(conclusion):
+            return Proved(conclusion)
+        proved = expr(self)
+        self.end_proof(proved)
+        return proved
+
+    def begin_proof(self, conclusion: Pattern) -> bool:
+        """Called before the steps proving the conclusion, which are skipped if this returns True.
+        The interpreter then provides the proof itself, for example by loading it from memory.
+        """
+        return False
+
+    def end_proof(self, proved: Proved) -> None:  # noqa: B027
+        """Called after the steps proving a conclusion that were not skipped."""
+
     # abstract methods
     @abstractmethod
     def evar(self, id: int) -> Pattern:
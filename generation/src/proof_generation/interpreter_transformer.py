@@ -21,6 +21,7 @@ class InterpreterTransformer(Interpreter):
     def __init__(self, sub_interpreter: Interpreter):
         super().__init__(sub_interpreter.phase)
         self.sub_interpreter = sub_interpreter
+        self.trusted = sub_interpreter.trusted
 
     def into_claim_phase(self) -> None:
         super().into_claim_phase()
@@ -30,6 +31,12 @@ class InterpreterTransformer(Interpreter):
         super().into_proof_phase()
         self.sub_interpreter.into_proof_phase()
 
+    def begin_proof(self, conclusion: Pattern) -> bool:
+        return self.sub_interpreter.begin_proof(conclusion)
+
+    def end_proof(self, proved: Proved) -> None:
+        self.sub_interpreter.end_proof(proved)
+
     def evar(self, id: int) -> Pattern:
         ret = self.sub_interpreter.evar(id)
         return ret
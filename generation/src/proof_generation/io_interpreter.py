@@ -17,23 +17,32 @@ class IOInterpreter(StatefulInterpreter):
         claims: list[Claim] | None = None,
         claim_out: IO[Any] | None = None,
         proof_out: IO[Any] | None = None,
+        check_stack: bool = True,
+        trusted: bool = False,
     ) -> None:
-        super().__init__(phase, claims)
+        super().__init__(phase, claims, check_stack, trusted)
         self.out = out
         self.claim_out = claim_out
         self.proof_out = proof_out
 
+    def flush(self) -> None:
+        self.out.flush()
+
     def into_claim_phase(self) -> None:
         assert self.claim_out
         super().into_claim_phase()
+        self.flush()
         self.out.close()
         self.out = self.claim_out
 
     def into_proof_phase(self) -> None:
         assert self.proof_out
         super().into_proof_phase()
+        self.flush()
         self.out.close()
         self.out = self.proof_out
 
     def __del__(self) -> None:
+        if not self.out.closed:
+            self.flush()
         self.out.close()
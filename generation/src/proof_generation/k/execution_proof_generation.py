@@ -18,13 +18,18 @@ if TYPE_CHECKING:
 
 
 class ExecutionProofExp(proof.ProofExp):
-    def __init__(self, language_semantics: LanguageSemantics, init_config: Pattern):
+    def __init__(self, language_semantics: LanguageSemantics, init_config: Pattern, shared_gamma: bool = False):
         self._init_config = init_config
         self._curr_config = init_config
         self.language_semantics = language_semantics
+        self.shared_gamma = shared_gamma
         super().__init__(notations=list(language_semantics.notations))
         self.subst_proofexp = self.import_module(Substitution())
         self.kore_lemmas = self.import_module(kl.KoreLemmas())
+        if shared_gamma:
+            # The gamma phase then only depends on the semantics, so it is the same for all executions,
+            # and each rule is published in the same memory slot, which the proofs load it from
+            self.add_axioms([rule.pattern for rule in language_semantics.rewrite_rules])
 
     @property
     def initial_configuration(self) -> Pattern:
@@ -49,6 +54,9 @@ class ExecutionProofExp(proof.ProofExp):
 
     def add_assumptions_for_rewrite_step(self, rule: KRewritingRule, substitutions: dict[int, Pattern]) -> None:
         """Add axioms to the definition."""
+        if self.shared_gamma:
+            # All rules are published already, and the functional axioms are not loaded by the proofs yet
+            return
         # TODO: We don't use them until the substitutions are implemented
         func_axioms = ExecutionProofExp.collect_functional_axioms(self.language_semantics, substitutions)
         self.add_assumptions([axiom.pattern for axiom in func_axioms])
@@ -91,13 +99,13 @@ class ExecutionProofExp(proof.ProofExp):
 
     @staticmethod
     def from_proof_hints(
-        hints: Iterator[RewriteStepExpression], language_semantics: LanguageSemantics
+        hints: Iterator[RewriteStepExpression], language_semantics: LanguageSemantics, shared_gamma: bool = False
     ) -> proof.ProofExp:
         """Constructs a proof expression from a list of rewrite hints."""
         proof_expr: ExecutionProofExp | None = None
         for hint in hints:
             if proof_expr is None:
-                proof_expr = ExecutionProofExp(language_semantics, hint.configuration_before)
+                proof_expr = ExecutionProofExp(language_semantics, hint.configuration_before, shared_gamma)
 
             if isinstance(hint.axiom, KRewritingRule):
                 proof_expr.rewrite_event(hint.axiom, hint.substitutions)
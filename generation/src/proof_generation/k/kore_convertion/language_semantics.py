@@ -1,17 +1,22 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
+import os
+import pickle
+from dataclasses import dataclass, field, fields
 from enum import Enum
 from itertools import count
-from typing import TYPE_CHECKING, NamedTuple, ParamSpec, TypeVar
+from typing import TYPE_CHECKING, Any, NamedTuple, ParamSpec, TypeVar
 
 import pyk.kore.syntax as kore
+from frozendict import frozendict
 
 import proof_generation.proofs.kore as kl
+from proof_generation.caching import WindowCache
 from proof_generation.pattern import App, EVar, Instantiate, MetaVar, Pattern, Symbol
 
 if TYPE_CHECKING:
     from collections.abc import Callable
+    from pathlib import Path
     from types import TracebackType
 
     from proof_generation.pattern import Notation, SVar
@@ -19,6 +24,9 @@ if TYPE_CHECKING:
 T = TypeVar('T')
 P = ParamSpec('P')
 
+# Number of recent configurations whose interned subterms and conversions are kept
+CONVERSION_WINDOW = 4
+
 
 class AxiomType(Enum):
     Unclassified = 0
@@ -135,6 +143,10 @@ class BuilderScope:
         """It is not allows to change the semantics except while parsing."""
         self._parsing = False
 
+    def _changed(self) -> None:
+        """Called after each change of the semantics."""
+        ...
+
 
 def builder_method(func: Callable[P, T]) -> Callable[P, T]:
     """Helps to forbid calling methods that c   hange the semantics outside of parsing."""
@@ -144,7 +156,9 @@ def builder_method(func: Callable[P, T]) -> Callable[P, T]:
         first_arg = args[0]
         assert isinstance(first_arg, BuilderScope)
         if first_arg._parsing:
-            return func(*args, **kwargs)
+            ret = func(*args, **kwargs)
+            first_arg._changed()
+            return ret
         else:
             raise ValueError('Cannot call parsing method on immutable theory')
 
@@ -153,6 +167,7 @@ def builder_method(func: Callable[P, T]) -> Callable[P, T]:
 
 class KModule(BuilderScope):
     def __init__(self, name: str, counter: count) -> None:
+        super().__init__()
         self._name = name
         self.counter = counter
 
@@ -161,6 +176,8 @@ class KModule(BuilderScope):
         self._sorts: dict[str, KSort] = {}
         self._symbols: dict[str, KSymbol] = {}
         self._axioms: dict[int, KRewritingRule | KEquationalRule] = {}
+        # The semantics the module has been created in, which indexes its content
+        self._semantics: LanguageSemantics | None = None
 
     def __enter__(self) -> KModule:
         """It is not allows to change the semantics except while parsing."""
@@ -168,6 +185,10 @@ class KModule(BuilderScope):
         assert isinstance(obj, KModule)
         return obj
 
+    def _changed(self) -> None:
+        if self._semantics is not None:
+            self._semantics._changed()
+
     @property
     def name(self) -> str:
         return self._name
@@ -271,23 +292,18 @@ class KModule(BuilderScope):
         if name in self._sorts:
             return self._sorts[name]
 
+        # The imported modules are transitively closed already, so they are not searched recursively
         for module in self.modules:
-            try:
-                sort = module.get_sort(name)
-                return sort
-            except ValueError:
-                continue
+            if name in module._sorts:
+                return module._sorts[name]
         raise ValueError(f'Sort {name} not found in the module {self.name}')
 
     def get_symbol(self, name: str) -> KSymbol:
         if name in self._symbols:
             return self._symbols[name]
         for module in self.modules:
-            try:
-                symbol = module.get_symbol(name)
-                return symbol
-            except ValueError:
-                continue
+            if name in module._symbols:
+                return module._symbols[name]
         raise ValueError(f'Symbol {name} not found in the module {self.name}')
 
     def get_axiom(self, ordinal: int) -> KRewritingRule | KEquationalRule:
@@ -295,14 +311,34 @@ class KModule(BuilderScope):
             return self._axioms[ordinal]
 
         for module in self.modules:
-            try:
-                axiom = module.get_axiom(ordinal)
-                return axiom
-            except ValueError:
-                continue
+            if ordinal in module._axioms:
+                return module._axioms[ordinal]
         raise ValueError(f'Axiom with ordinal {ordinal} not found in the module {self.name}')
 
 
+@dataclass(frozen=True)
+class SemanticsIndex:
+    """Flattened lookup tables of all modules of the semantics, built once it can no longer change."""
+
+    sorts: frozendict[str, KSort]
+    symbols: frozendict[str, KSymbol]
+    axioms: frozendict[int, KRewritingRule | KEquationalRule]
+
+    @staticmethod
+    def build(modules: tuple[KModule, ...], main_modules: tuple[KModule, ...]) -> SemanticsIndex:
+        sorts: dict[str, KSort] = {}
+        symbols: dict[str, KSymbol] = {}
+        # Later modules take precedence, as the search used to start from the main module
+        for module in modules:
+            sorts.update(module._sorts)
+            symbols.update(module._symbols)
+        # Axioms are only looked up through the main module
+        axioms: dict[int, KRewritingRule | KEquationalRule] = {}
+        for module in main_modules:
+            axioms.update(module._axioms)
+        return SemanticsIndex(frozendict(sorts), frozendict(symbols), frozendict(axioms))
+
+
 class ConvertionScope:
     # TODO: This is temporary, we need to get rid of metavars used as EVars
     SORT_PARAM_METAVAR = 100
@@ -343,11 +379,32 @@ class ConvertionScope:
         raise KeyError(f'Variable name {name} not found in sort param meta vars dict!')
 
 
+def _kore_head(pattern: kore.Pattern) -> tuple[Any, ...]:
+    """The fields of a KORE term besides its subterms, such as its symbol, sorts or value."""
+    subterms = {id(subterm) for subterm in pattern.patterns}
+    ret = []
+    for f in fields(pattern):
+        value = getattr(pattern, f.name)
+        if id(value) in subterms or (isinstance(value, tuple) and value and all(id(v) in subterms for v in value)):
+            continue
+        ret.append(value)
+    return tuple(ret)
+
+
 class LanguageSemantics(BuilderScope):
     def __init__(self) -> None:
+        super().__init__()
         self._imported_modules: tuple[KModule, ...] = ()
         self._cached_axiom_scopes: dict[int, ConvertionScope] = {}
         self._inferred_notations: set[Notation] = set()
+        # Representatives of the KORE subterms of recent configurations, by head and interned subterms
+        self._interned_terms: WindowCache[tuple[Any, ...], kore.Pattern] = WindowCache(CONVERSION_WINDOW)
+        # Conversions of subterms without variables, which do not depend on the scope, by identity.
+        # Entries keep their subterm alive, so that its id is not reused while it is cached
+        self._cached_conversions: WindowCache[int, tuple[kore.Pattern, Pattern]] = WindowCache(CONVERSION_WINDOW)
+        self._scoped_conversions = 0
+        # Built lazily outside of parsing, and dropped whenever a module changes
+        self._index: SemanticsIndex | None = None
 
     @property
     def modules(self) -> tuple[KModule, ...]:
@@ -390,12 +447,59 @@ class LanguageSemantics(BuilderScope):
 
         return (*dict.fromkeys(notations), *self._inferred_notations)
 
+    @property
+    def rewrite_rules(self) -> tuple[KRewritingRule, ...]:
+        """All rewrite rules of the main module and its imports, ordered by their ordinals."""
+        axioms: dict[int, KRewritingRule | KEquationalRule] = {}
+        for module in (self.main_module, *self.main_module.modules):
+            axioms.update(module._axioms)
+        rules = [axiom for axiom in axioms.values() if isinstance(axiom, KRewritingRule)]
+        return tuple(sorted(rules, key=lambda rule: rule.ordinal))
+
     def __enter__(self) -> LanguageSemantics:
         """It is not allows to change the semantics except while parsing."""
         obj = super().__enter__()
         assert isinstance(obj, LanguageSemantics)
         return obj
 
+    def _changed(self) -> None:
+        self._index = None
+
+    @property
+    def index(self) -> SemanticsIndex | None:
+        """The flattened lookup tables of all modules, unless the semantics is being parsed."""
+        if self._parsing:
+            return None
+        if self._index is None:
+            main_modules = (self.main_module, *self.main_module.modules) if self._imported_modules else ()
+            self._index = SemanticsIndex.build(self.modules, main_modules)
+        return self._index
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = dict(self.__dict__)
+        # Conversions are keyed by KORE terms, and are only worth keeping while converting a trace
+        state['_interned_terms'] = WindowCache(CONVERSION_WINDOW)
+        state['_cached_conversions'] = WindowCache(CONVERSION_WINDOW)
+        state['_index'] = None
+        return state
+
+    def dump(self, path: Path) -> None:
+        """Store the converted semantics, so that it can be loaded instead of converting the definition again."""
+        # Concurrent runs never see a partially written file, as it is renamed once complete
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path: Path) -> LanguageSemantics:
+        """Load a semantics stored by `dump`, patterns are interned again while loading."""
+        with open(path, 'rb') as f:
+            semantics = pickle.load(f)
+        if not isinstance(semantics, LanguageSemantics):
+            raise ValueError(f'{path} does not contain a language semantics')
+        return semantics
+
     @staticmethod
     def is_rewrite_rule(pattern: kore.Pattern) -> bool:
         return (
@@ -494,6 +598,7 @@ class LanguageSemantics(BuilderScope):
         axiom_counter = count() if len(self._imported_modules) == 0 else self.main_module.counter
 
         module = KModule(name, axiom_counter)
+        module._semantics = self
         self._imported_modules += (module,)
         return module
 
@@ -504,9 +609,17 @@ class LanguageSemantics(BuilderScope):
         raise ValueError(f'Module {name} not found')
 
     def get_axiom(self, ordinal: int) -> KRewritingRule | KEquationalRule:
+        if (index := self.index) is not None:
+            if (axiom := index.axioms.get(ordinal)) is None:
+                raise ValueError(f'Axiom with ordinal {ordinal} not found in the module {self.main_module.name}')
+            return axiom
         return self.main_module.get_axiom(ordinal)
 
     def get_sort(self, name: str) -> KSort:
+        if (index := self.index) is not None:
+            if (sort := index.sorts.get(name)) is None:
+                raise ValueError(f'Sort {name} not found')
+            return sort
         # Reversing is done for optimization purposes, as we start the search with the main module
         for module in reversed(self.modules):
             assert isinstance(module, KModule)  # Oh, typechecker...
@@ -518,6 +631,10 @@ class LanguageSemantics(BuilderScope):
         raise ValueError(f'Sort {name} not found')
 
     def get_symbol(self, name: str) -> KSymbol:
+        if (index := self.index) is not None:
+            if (symbol := index.symbols.get(name)) is None:
+                raise ValueError(f'Symbol {name} not found')
+            return symbol
         for module in reversed(self.modules):
             assert isinstance(module, KModule)  # Oh, typechecker...
             try:
@@ -525,21 +642,27 @@ class LanguageSemantics(BuilderScope):
                 return symbol
             except ValueError:
                 continue
-        raise ValueError(f'Sort {name} not found')
+        raise ValueError(f'Symbol {name} not found')
 
     def resolve_to_ksymbol(self, symbol: Symbol) -> KSymbol | None:
         kore_name = KSymbol.unwrap_kore_name(symbol)
         if kore_name is None:
             return None
+        if (index := self.index) is not None:
+            return index.symbols.get(kore_name)
         try:
             return self.get_symbol(kore_name)
         except ValueError:
             return None
 
     def convert_pattern(self, pattern: kore.Pattern) -> Pattern:
-        """Convert the given pattern to the pattern in the new format."""
+        """Convert the given pattern to the pattern in the new format.
+        Each call starts a new configuration, and the caches only keep the subterms of the recent ones.
+        """
+        self._interned_terms.next_round()
+        self._cached_conversions.next_round()
         scope = ConvertionScope()
-        return self._convert_pattern(scope, pattern)
+        return self._convert_pattern(scope, self.intern(pattern))
 
     def convert_substitutions(self, subst: dict[str, kore.Pattern], axiom_ordinal: int) -> dict[int, Pattern]:
         substitutions = {}
@@ -547,9 +670,26 @@ class LanguageSemantics(BuilderScope):
         for var_name, kore_pattern in subst.items():
             # TODO: Replace it with the EVar later
             name = scope.lookup_metavar(var_name).name
-            substitutions[name] = self._convert_pattern(scope, kore_pattern)
+            substitutions[name] = self._convert_pattern(scope, self.intern(kore_pattern))
         return substitutions
 
+    def intern(self, pattern: kore.Pattern) -> kore.Pattern:
+        """Return the representative of the KORE terms equal to the given one.
+        Terms are looked up by their head and the identity of their interned subterms, so each lookup
+        only hashes a symbol, sorts or a value, never a whole subterm. Equal subterms of different
+        configurations become the same object, and their conversions are found by identity.
+        """
+        subterms = pattern.patterns
+        interned = tuple(self.intern(subterm) for subterm in subterms)
+        key = (type(pattern), *_kore_head(pattern), *map(id, interned))
+        ret = self._interned_terms.get(key)
+        if ret is None:
+            unchanged = all(new is old for new, old in zip(interned, subterms, strict=True))
+            ret = pattern if unchanged else pattern.let_patterns(patterns=interned)
+            # The representative keeps its subterms alive, so the ids in its key are not reused
+            self._interned_terms.put(key, ret)
+        return ret
+
     def count_simplifications(self, pattern: Pattern) -> int:
         """Count the number of function symbols in the given pattern (functional, not ctr, not cell)."""
         functional_symbols = 0
@@ -583,12 +723,29 @@ class LanguageSemantics(BuilderScope):
 
     def _convert_sort(self, scope: ConvertionScope, sort: kore.Sort | kore.SortVar) -> Pattern:
         if isinstance(sort, kore.SortVar):
+            self._scoped_conversions += 1
             return scope.resolve_sort_param_metavar(sort.name)
         else:
             return self.get_sort(sort.name).aml_symbol
 
     def _convert_pattern(self, scope: ConvertionScope, pattern: kore.Pattern) -> Pattern:
-        """Convert the given pattern to the pattern in the new format."""
+        """Convert the given pattern to the pattern in the new format.
+        Consecutive configurations share most of their subterms, so the conversions of the ones
+        that do not resolve any variable in the scope are cached and reused. Configurations are
+        interned first, so an unchanged subterm is found in constant time by its identity, and
+        is not walked again. A step only converts the subterms that changed.
+        """
+        cached = self._cached_conversions.get(id(pattern))
+        if cached is not None:
+            return cached[1]
+
+        scoped_conversions = self._scoped_conversions
+        ret = self._convert_subterms(scope, pattern)
+        if scoped_conversions == self._scoped_conversions:
+            self._cached_conversions.put(id(pattern), (pattern, ret))
+        return ret
+
+    def _convert_subterms(self, scope: ConvertionScope, pattern: kore.Pattern) -> Pattern:
         match pattern:
             case kore.Rewrites(sort, left, right):
                 rewrite_sort_pattern: Pattern = self._convert_sort(scope, sort)
@@ -669,6 +826,7 @@ class LanguageSemantics(BuilderScope):
             case kore.EVar(name, _):
                 # TODO: Revisit when we have sorting implemented!
                 # return scope.resolve_evar(pattern)
+                self._scoped_conversions += 1
                 return scope.resolve_metavar(name)
             case kore.SVar(name, sort):
                 raise NotImplementedError()
@@ -6,13 +6,13 @@ from typing import TYPE_CHECKING
 
 import pyk.kore.syntax as kore
 
-from proof_generation.llvm_proof_hint import LLVMRuleEvent
+from proof_generation.llvm_proof_hint import KoreTerm, LLVMRewriteTrace, LLVMRuleEvent, decode
 
 if TYPE_CHECKING:
-    from collections.abc import Iterator
+    from collections.abc import Iterable, Iterator
 
     from proof_generation.k.kore_convertion.language_semantics import KEquationalRule, KRewritingRule, LanguageSemantics
-    from proof_generation.llvm_proof_hint import LLVMRewriteTrace
+    from proof_generation.llvm_proof_hint import Argument, RawArgument
     from proof_generation.pattern import Pattern
 
 
@@ -67,28 +67,38 @@ class RewriteStepExpression:
 
 
 def get_proof_hints(
-    llvm_proof_hint: LLVMRewriteTrace,
+    llvm_proof_hint: LLVMRewriteTrace | Iterable[Argument | RawArgument],
     language_semantics: LanguageSemantics,
 ) -> Iterator[RewriteStepExpression]:
     """
-    Emits proof hints corresponding to the given LLVM rewrite trace.
+    Emits proof hints corresponding to the given LLVM rewrite trace, or to its events as they are streamed.
+    Only the previous event is kept while reading the events, so the trace need not be fully in memory,
+    and streamed configurations are only deserialized if they follow a rule event.
     Note that no hints will be generated if the trace is empty.
     """
+    events = iter(llvm_proof_hint.events() if isinstance(llvm_proof_hint, LLVMRewriteTrace) else llvm_proof_hint)
 
-    # TODO: process function/hook/rule events in llvm_proof_hint.pre_trace
-    pre_config = language_semantics.convert_pattern(llvm_proof_hint.initial_config)
+    # TODO: process function/hook/rule events in the pre-trace
+    for event in events:
+        if isinstance(event, kore.Pattern | KoreTerm):
+            initial_config = event
+            break
+    else:
+        return
+    pre_config = language_semantics.convert_pattern(decode(initial_config))
 
     post_config = pre_config
-    if len(llvm_proof_hint.trace) > 0:
-        for e1, e2 in zip(llvm_proof_hint.trace, llvm_proof_hint.trace[1:], strict=False):
-            # TODO: process function/hook events in llvm_proof_hint.strace
-            if isinstance(e1, LLVMRuleEvent) and isinstance(e2, kore.Pattern):
-                # generate the hint using the new format
-                pre_config = post_config
-                post_config = language_semantics.convert_pattern(e2)
-
-                axiom = language_semantics.get_axiom(e1.rule_ordinal)
-                substitutions = language_semantics.convert_substitutions(dict(e1.substitution), e1.rule_ordinal)
-
-                hint = RewriteStepExpression(pre_config, post_config, axiom, substitutions)
-                yield hint
+    e1: Argument | RawArgument = initial_config
+    for e2 in events:
+        # TODO: process function/hook events in the trace
+        if isinstance(e1, LLVMRuleEvent) and isinstance(e2, kore.Pattern | KoreTerm):
+            # generate the hint using the new format
+            pre_config = post_config
+            post_config = language_semantics.convert_pattern(decode(e2))
+
+            axiom = language_semantics.get_axiom(e1.rule_ordinal)
+            substitutions = language_semantics.convert_substitutions(dict(e1.substitution), e1.rule_ordinal)
+
+            hint = RewriteStepExpression(pre_config, post_config, axiom, substitutions)
+            yield hint
+        e1 = e2
@@ -1,5 +1,11 @@
 from __future__ import annotations
 
+import gc
+import glob
+import hashlib
+import multiprocessing
+import os
+import pickle
 from argparse import ArgumentParser
 from pathlib import Path
 from typing import TYPE_CHECKING
@@ -9,14 +15,27 @@ import pyk.kore.syntax as kore
 from pyk.kore.parser import KoreParser
 from pyk.utils import check_file_path
 
+from proof_generation.instruction import Encoding
 from proof_generation.k.execution_proof_generation import ExecutionProofExp
 from proof_generation.k.kore_convertion.language_semantics import LanguageSemantics
 from proof_generation.k.kore_convertion.rewrite_steps import get_proof_hints
 from proof_generation.llvm_proof_hint import LLVMRewriteTrace
 
 if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from proof_generation.llvm_proof_hint import RawArgument
     from proof_generation.proof import ProofExp
 
+# Bumped whenever the converted semantics changes, so that stale caches are not loaded
+SEMANTICS_CACHE_VERSION = 1
+SEMANTICS_CACHE_DIR = 'proof-generation-cache'
+# Gamma files shared by the executions of the same definition, named after the hash of their content
+SHARED_GAMMA_DIR = 'gamma'
+
+# The semantics shared by the workers of a batch, which inherit it when they are forked
+_batch_semantics: LanguageSemantics | None = None
+
 
 def get_kompiled_definition(output_dir: Path) -> kore.Definition:
     print(f'Parsing the definition in the Kore format in {output_dir}')
@@ -26,6 +45,32 @@ def get_kompiled_definition(output_dir: Path) -> kore.Definition:
     return KoreParser(kore_text).definition()
 
 
+def get_language_semantics(kompiled_dir: Path, use_cache: bool = True) -> LanguageSemantics:
+    """Convert the K definition, or load its conversion cached by a previous run.
+    The cache is keyed by the hash of definition.kore, so it is never used for another definition.
+    """
+    if not use_cache:
+        return LanguageSemantics.from_kore_definition(get_kompiled_definition(kompiled_dir))
+
+    digest = hashlib.sha256((kompiled_dir / 'definition.kore').read_bytes()).hexdigest()
+    cache_file = kompiled_dir / SEMANTICS_CACHE_DIR / f'semantics-v{SEMANTICS_CACHE_VERSION}-{digest}.pickle'
+    if cache_file.exists():
+        try:
+            print(f'Loading the converted definition from {cache_file}')
+            return LanguageSemantics.load(cache_file)
+        except (OSError, ValueError, pickle.UnpicklingError, EOFError) as e:
+            print(f'Ignoring the cached definition: {e}')
+
+    language_semantics = LanguageSemantics.from_kore_definition(get_kompiled_definition(kompiled_dir))
+    try:
+        cache_file.parent.mkdir(exist_ok=True)
+        language_semantics.dump(cache_file)
+    except OSError as e:
+        # The kompiled directory may be read-only, which only costs the conversion next time
+        print(f'Cannot cache the converted definition: {e}')
+    return language_semantics
+
+
 def get_kompiled_dir(output_dir: str) -> Path:
     """Check that the K definition exists and return path to the kompiled directory."""
 
@@ -37,17 +82,70 @@ def get_kompiled_dir(output_dir: str) -> Path:
         raise AssertionError(f'Kompiled directory {path} does not exist.')
 
 
-def generate_proof_file(proof_gen: ProofExp, output_dir: Path, slice_name: str, pretty: bool = False) -> None:
-    """Generate the proof files."""
+def generate_proof_file(
+    proof_gen: ProofExp,
+    output_dir: Path,
+    slice_name: str,
+    pretty: bool = False,
+    encoding: Encoding = Encoding.Byte,
+    shared_gamma: bool = False,
+    trusted: bool = False,
+    optimize: bool = False,
+) -> None:
+    """Generate the proof files. Trusted binary proofs are checked offline once written."""
+    if trusted and pretty:
+        raise ValueError('Pretty-printed proofs cannot be verified, so they cannot be generated trusted.')
     if not output_dir.exists():
         output_dir.mkdir(parents=True)
+    gamma_file = (output_dir / slice_name).with_suffix('.pretty-gamma' if pretty else '.ml-gamma')
+    # Writing through a link would change the gamma shared with other executions
+    if gamma_file.is_symlink():
+        gamma_file.unlink()
     mode = 'pretty' if pretty else 'binary'
-    proof_gen.main(['', mode, str(output_dir), slice_name])
+    options = ['--encoding', encoding.value]
+    if trusted:
+        options.append('--trusted')
+    if optimize:
+        options.append('--optimize')
+    proof_gen.main(['', mode, str(output_dir), slice_name, *options])
+    if shared_gamma:
+        share_gamma_file(gamma_file)
+
+
+def share_gamma_file(gamma_file: Path) -> Path:
+    """Replace the gamma file by a link to the identical one shared by other executions, stored under its hash."""
+    digest = hashlib.sha256(gamma_file.read_bytes()).hexdigest()
+    shared_file = gamma_file.parent / SHARED_GAMMA_DIR / f'{digest}{gamma_file.suffix}'
+    if shared_file.exists():
+        gamma_file.unlink()
+    else:
+        shared_file.parent.mkdir(exist_ok=True)
+        # Concurrent executions can only move identical files there
+        os.replace(gamma_file, shared_file)
+    gamma_file.symlink_to(os.path.relpath(shared_file, gamma_file.parent))
+    return shared_file
 
 
 def read_proof_hint(filepath: str) -> LLVMRewriteTrace:
-    hint_bin = Path(filepath).read_bytes()
-    return LLVMRewriteTrace.parse(hint_bin)
+    return LLVMRewriteTrace.parse_file(Path(filepath))
+
+
+def stream_proof_hint(filepath: str, skip_payloads: bool = False) -> Iterator[RawArgument]:
+    return LLVMRewriteTrace.stream_file(Path(filepath), skip_payloads)
+
+
+def expand_hint_files(patterns: list[str]) -> list[str]:
+    """Expand the glob patterns among the given hint files, keeping the other paths as they are."""
+    files: list[str] = []
+    for pattern in patterns:
+        if not any(c in pattern for c in '*?['):
+            files.append(pattern)
+            continue
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            raise ValueError(f'No hint files match {pattern}')
+        files.extend(matches)
+    return files
 
 
 def get_all_axioms(definition: kore.Definition) -> list[kore.Axiom]:
@@ -65,34 +163,116 @@ def get_axiom_label(attrs: tuple[kore.App, ...]) -> str:
     return 'N/A'
 
 
+def generate_proofs(
+    language_semantics: LanguageSemantics,
+    k_file: str,
+    hints_file: str,
+    proof_dir: Path,
+    pretty: bool = False,
+    encoding: Encoding = Encoding.Byte,
+    shared_gamma: bool = False,
+    trusted: bool = False,
+    optimize: bool = False,
+) -> str:
+    """Generate the proof files of the execution recorded in the hints file."""
+    # print('Intialize hint stream ... ')
+    hints_iterator = get_proof_hints(stream_proof_hint(hints_file, skip_payloads=True), language_semantics)
+
+    print(f'Begin generating proofs for {hints_file} ... ')
+    kore_def = ExecutionProofExp.from_proof_hints(hints_iterator, language_semantics, shared_gamma)
+    slice_name = Path(hints_file).stem + '.' + Path(k_file).stem
+    generate_proof_file(kore_def, proof_dir, slice_name, pretty, encoding, shared_gamma, trusted, optimize)
+    return hints_file
+
+
+def _generate_batch_proofs(task: tuple[str, str, Path, bool, Encoding, bool, bool, bool]) -> str:
+    assert _batch_semantics is not None, 'Expected the semantics to be inherited from the parent process'
+    return generate_proofs(_batch_semantics, *task)
+
+
 def main(
     k_file: str,
     hints_file: str,
     output_dir: str,
     proof_dir: str,
     pretty: bool = False,
+    encoding: Encoding = Encoding.Byte,
+    use_cache: bool = True,
+    shared_gamma: bool = False,
+    trusted: bool = False,
+    optimize: bool = False,
+) -> None:
+    batch_main(
+        k_file,
+        [hints_file],
+        output_dir,
+        proof_dir,
+        pretty,
+        encoding,
+        use_cache,
+        shared_gamma=shared_gamma,
+        trusted=trusted,
+        optimize=optimize,
+    )
+
+
+def batch_main(
+    k_file: str,
+    hints_files: list[str],
+    output_dir: str,
+    proof_dir: str,
+    pretty: bool = False,
+    encoding: Encoding = Encoding.Byte,
+    use_cache: bool = True,
+    jobs: int = 1,
+    shared_gamma: bool = False,
+    trusted: bool = False,
+    optimize: bool = False,
 ) -> None:
+    """Generate the proofs of many executions of the same K definition, which is converted only once.
+    With more than one job, the proofs are generated by forked processes sharing the converted semantics.
+    With a shared gamma, the gamma files of all executions link to a single file holding all rules.
+    Trusted generation skips the checks of the proof steps, and verifies the binary proofs once written.
+    Optimized proofs memoize the patterns shared by the rules, claims and proof steps of each execution,
+    and their gamma files are only shared by the executions memoizing the same patterns there.
+    """
+    global _batch_semantics
+
     # Kompile sources
     kompiled_dir: Path = get_kompiled_dir(output_dir)
-    kore_definition = get_kompiled_definition(kompiled_dir)
 
     print('Begin converting ... ')
-    language_semantics = LanguageSemantics.from_kore_definition(kore_definition)
+    language_semantics = get_language_semantics(kompiled_dir, use_cache)
 
-    # print('Intialize hint stream ... ')
-    hints_iterator = get_proof_hints(read_proof_hint(hints_file), language_semantics)
-
-    print('Begin generating proofs ... ')
-    kore_def = ExecutionProofExp.from_proof_hints(hints_iterator, language_semantics)
-    slice_name = Path(hints_file).stem + '.' + Path(k_file).stem
-    generate_proof_file(kore_def, Path(proof_dir), slice_name, pretty)
+    proof_path = Path(proof_dir)
+    proof_path.mkdir(parents=True, exist_ok=True)
+    tasks = [
+        (k_file, hints_file, proof_path, pretty, encoding, shared_gamma, trusted, optimize)
+        for hints_file in expand_hint_files(hints_files)
+    ]
+    if jobs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            generate_proofs(language_semantics, *task)
+    else:
+        _batch_semantics = language_semantics
+        # The collector of the workers never writes to the frozen objects, so their pages stay shared
+        gc.freeze()
+        try:
+            with multiprocessing.get_context('fork').Pool(jobs) as pool:
+                for hints_file in pool.imap_unordered(_generate_batch_proofs, tasks):
+                    print(f'Generated the proofs for {hints_file}')
+        finally:
+            gc.unfreeze()
+            _batch_semantics = None
     print('Done!')
 
 
 if __name__ == '__main__':
     argparser = ArgumentParser()
     argparser.add_argument('kfile', type=str, help='Path to the K definition file')
-    argparser.add_argument('hints', type=str, help='Path to the binary hints file')
+    argparser.add_argument(
+        'hints', type=str, nargs='+', help='Paths or glob patterns of the binary hints files of the K definition'
+    )
     argparser.add_argument('output_dir', type=str, help='Path to the output directory')
     argparser.add_argument('--proof-dir', type=str, default=str(Path.cwd()), help='Output directory for saving proofs')
     argparser.add_argument(
@@ -101,6 +281,56 @@ if __name__ == '__main__':
         default=False,
         help='Print the pretty-printed version of proofs instead of the binary ones',
     )
+    argparser.add_argument(
+        '--encoding',
+        type=Encoding,
+        default=Encoding.Byte,
+        help='The operand encoding of binary proofs, varint lifts the limit of 256 ids and memory slots',
+    )
+    argparser.add_argument(
+        '--no-semantics-cache',
+        action='store_true',
+        default=False,
+        help='Convert the K definition again instead of loading the conversion cached in the kompiled directory',
+    )
+    argparser.add_argument(
+        '--jobs',
+        type=int,
+        default=1,
+        help='Number of processes generating the proofs of different hints files in parallel',
+    )
+    argparser.add_argument(
+        '--shared-gamma',
+        action='store_true',
+        default=False,
+        help='Publish all rules of the K definition, and store the gamma shared by the executions once by its hash',
+    )
+    argparser.add_argument(
+        '--trusted',
+        action='store_true',
+        default=False,
+        help='Skip the checks of the proof steps while generating, and check the binary proofs offline instead',
+    )
+    argparser.add_argument(
+        '--optimize',
+        action='store_true',
+        default=False,
+        help='Memoize the patterns shared by the rules, claims and proof steps, so they are built only once',
+    )
 
     args = argparser.parse_args()
-    main(args.kfile, args.hints, args.output_dir, args.proof_dir, args.pretty)
+    if args.trusted and args.pretty:
+        argparser.error('Pretty-printed proofs cannot be verified, so --trusted cannot be combined with --pretty')
+    batch_main(
+        args.kfile,
+        args.hints,
+        args.output_dir,
+        args.proof_dir,
+        args.pretty,
+        args.encoding,
+        use_cache=not args.no_semantics_cache,
+        jobs=args.jobs,
+        shared_gamma=args.shared_gamma,
+        trusted=args.trusted,
+        optimize=args.optimize,
+    )
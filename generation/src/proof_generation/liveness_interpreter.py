@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from proof_generation.interpreter import ExecutionPhase
+from proof_generation.optimizing_interpreters import MemoizingInterpreter, ProofCachingInterpreter
+from proof_generation.pattern import App, ESubst, Exists, Implies, Instantiate, Mu, SSubst
+from proof_generation.stateful_interpreter import StatefulInterpreter
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+
+    from proof_generation.claim import Claim
+    from proof_generation.counting_interpreter import CountingInterpreter
+    from proof_generation.pattern import Pattern
+    from proof_generation.proved import Proved
+    from proof_generation.tracing_interpreter import TracingInterpreter
+
+# Rounds of planning after the first one, each giving the slots wasted by the previous plan to other patterns
+ALLOCATION_ROUNDS = 4
+
+
+class LivenessInterpreter(StatefulInterpreter):
+    """Counts the loads of each memory slot, to find the saved terms that are never used again.
+    It replays proofs that were checked already, so it trusts them.
+    The memory of the checkers is append-only, so the slot of a term is never reused after its
+    last load. The counts only decide which terms are worth a slot at all.
+    """
+
+    def __init__(self, phase: ExecutionPhase, claims: list[Claim] | None = None) -> None:
+        super().__init__(phase=phase, claims=claims, trusted=True)
+        self.loads: list[int] = []
+
+    def save(self, id: str, term: Pattern | Proved) -> None:
+        super().save(id, term)
+        self.loads.append(0)
+
+    def load(self, id: str, term: Pattern | Proved) -> None:
+        super().load(id, term)
+        slot = self.memory_slot(term)
+        assert slot is not None
+        self.loads[slot] += 1
+
+    def publish_axiom(self, axiom: Pattern) -> None:
+        super().publish_axiom(axiom)
+        self.loads.append(0)
+
+    def wasted(self, patterns: Iterable[Pattern]) -> set[Pattern]:
+        """The patterns whose memory slots do not pay off. They are never saved, or
+        saving and loading them takes as many instructions as building them again.
+        """
+        sizes: dict[Pattern, int] = {}
+        ret = set()
+        for pattern in patterns:
+            slot = self.memory_slot(pattern)
+            if slot is None or self.loads[slot] * (self._size(pattern, sizes) - 1) <= 1:
+                ret.add(pattern)
+        return ret
+
+    def _size(self, pattern: Pattern, sizes: dict[Pattern, int]) -> int:
+        """The number of instructions building the pattern, where its parts in memory are loaded."""
+        size = sizes.get(pattern)
+        if size is not None:
+            return size
+
+        def part(p: Pattern) -> int:
+            return 1 if self.memory_slot(p) is not None else self._size(p, sizes)
+
+        match pattern:
+            case Implies(left, right) | App(left, right):
+                size = 1 + part(left) + part(right)
+            case Exists(_, subpattern) | Mu(_, subpattern):
+                size = 1 + part(subpattern)
+            case ESubst(subpattern, _, plug) | SSubst(subpattern, _, plug):
+                size = 1 + part(subpattern) + part(plug)
+            case Instantiate(subpattern, plugs):
+                size = 1 + part(subpattern) + sum(part(plug) for plug in plugs.values())
+            case _:
+                size = 1
+        sizes[pattern] = size
+        return size
+
+
+def allocate_memory(
+    tracer: TracingInterpreter,
+    analyzer: CountingInterpreter,
+    claims: list[Claim],
+    rounds: int = ALLOCATION_ROUNDS,
+    cached_proofs: Mapping[Pattern, int] | None = None,
+) -> set[Pattern]:
+    """Suggest the patterns to memoize while replaying the trace of the analyzer.
+    The suggestions are replayed to find the ones whose memory slots are wasted,
+    as the pattern is never built outside of other memoized patterns, or not
+    built again often enough. These are left out, and their slots go to other patterns.
+    Slots are allocated once for the whole proof, never freed and given to another pattern.
+    The trace is replayed with the given conclusions cached, as it is serialized.
+    """
+    suggested = analyzer.finalize()
+    for attempt in range(rounds + 1):
+        liveness = LivenessInterpreter(ExecutionPhase.Gamma, claims)
+        tracer.replay(ProofCachingInterpreter(MemoizingInterpreter(liveness, suggested), cached_proofs or {}))
+        wasted = liveness.wasted(suggested)
+        if not wasted:
+            break
+        if attempt == rounds:
+            # Leaving these out does not change the other saves and loads
+            suggested -= wasted
+        else:
+            suggested = analyzer.exclude(wasted)
+    return suggested
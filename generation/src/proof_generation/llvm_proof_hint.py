@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import struct
 from dataclasses import dataclass
+from functools import cached_property
 from typing import TYPE_CHECKING
 
 import pyk.kllvm.load  # noqa: F401
@@ -9,9 +10,30 @@ import pyk.kore.syntax as kore
 from pyk.kllvm import ast as kllvm_kore
 from pyk.kllvm.convert import llvm_to_pattern
 
+from proof_generation.deserialize import mapped
+
 if TYPE_CHECKING:
+    import mmap
+    from collections.abc import Iterator
+    from pathlib import Path
     from typing import Final
 
+    # Buffers that can be searched in place, unlike a memoryview
+    SearchableBuffer = bytes | bytearray | mmap.mmap
+
+
+@dataclass(frozen=True)
+class KoreTerm:
+    """A binary KORE term of the hints, which is only deserialized once its pattern is needed."""
+
+    raw: bytes
+
+    @cached_property
+    def pattern(self) -> kore.Pattern:
+        llvm_pattern = kllvm_kore.Pattern.deserialize(self.raw)
+        assert llvm_pattern, ('Could not deserialize binary kore.', self.raw)
+        return llvm_to_pattern(llvm_pattern)
+
 
 @dataclass
 class LLVMStepEvent:
@@ -21,7 +43,11 @@ class LLVMStepEvent:
 @dataclass
 class LLVMRewriteEvent(LLVMStepEvent):
     rule_ordinal: int
-    substitution: tuple[tuple[str, kore.Pattern], ...]
+    raw_substitution: tuple[tuple[str, KoreTerm], ...]
+
+    @property
+    def substitution(self) -> tuple[tuple[str, kore.Pattern], ...]:
+        return tuple((name, term.pattern) for name, term in self.raw_substitution)
 
 
 @dataclass
@@ -38,15 +64,27 @@ class LLVMSideCondEvent(LLVMRewriteEvent):
 class LLVMFunctionEvent(LLVMStepEvent):
     name: str
     relative_position: str
-    args: tuple[Argument, ...]
+    raw_args: tuple[RawArgument, ...]
+
+    @property
+    def args(self) -> tuple[Argument, ...]:
+        return tuple(decode(arg) for arg in self.raw_args)
 
 
 @dataclass
 class LLVMHookEvent(LLVMStepEvent):
     name: str
     relative_position: str
-    args: tuple[Argument, ...]
-    result: kore.Pattern
+    raw_args: tuple[RawArgument, ...]
+    raw_result: KoreTerm
+
+    @property
+    def args(self) -> tuple[Argument, ...]:
+        return tuple(decode(arg) for arg in self.raw_args)
+
+    @property
+    def result(self) -> kore.Pattern:
+        return self.raw_result.pattern
 
 
 @dataclass
@@ -56,14 +94,51 @@ class LLVMRewriteTrace:
     trace: tuple[Argument, ...]
 
     @staticmethod
-    def parse(input: bytes) -> LLVMRewriteTrace:
+    def parse(input: SearchableBuffer) -> LLVMRewriteTrace:
         parser = LLVMRewriteTraceParser(input)
-        ret = parser.read_execution_hint()
-        assert parser.eof()
+        try:
+            ret = parser.read_execution_hint()
+            assert parser.eof()
+        finally:
+            parser.release()
         return ret
 
+    @staticmethod
+    def parse_file(path: Path) -> LLVMRewriteTrace:
+        """Parse a hints file, mapping it into memory instead of reading it."""
+        with mapped(path) as input:
+            return LLVMRewriteTrace.parse(input)
+
+    @staticmethod
+    def stream_file(path: Path, skip_payloads: bool = False) -> Iterator[RawArgument]:
+        """Parse the events of a hints file one at a time, in the order of `events`.
+        Only the event being read is kept in memory, along with the mapped file.
+        Configurations are streamed as terms which are deserialized on demand.
+        With `skip_payloads`, the prefix trace and the arguments of function and hook events are skipped.
+        """
+        with mapped(path) as input:
+            parser = LLVMRewriteTraceParser(input, skip_payloads)
+            try:
+                yield from parser.read_events()
+            finally:
+                parser.release()
+
+    def events(self) -> Iterator[Argument]:
+        """The events of the prefix trace, then the initial configuration, which is the first configuration,
+        and the events of the rest of the trace.
+        """
+        yield from self.pre_trace
+        yield self.initial_config
+        yield from self.trace
+
 
 Argument = LLVMStepEvent | kore.Pattern
+RawArgument = LLVMStepEvent | KoreTerm
+
+
+def decode(argument: Argument | RawArgument) -> Argument:
+    return argument.pattern if isinstance(argument, KoreTerm) else argument
+
 
 EXPECTED_HINTS_VERSION: Final = 3
 
@@ -100,33 +175,56 @@ class LLVMRewriteTraceParser:
     hook_res_sentinel: Final = bytes([0xBB] * 8)
     rule_event_sentinel: Final = bytes([0x22] * 8)
     side_cond_event_sentinel: Final = bytes([0xEE] * 8)
-    kore_term_prefix: Final = b'\x7FKORE'
+    kore_term_prefix: Final = b'\x7fKORE'
     null_byte: Final = b'\x00'
 
-    def __init__(self, input: bytes):
+    uint32: Final = struct.Struct('<I')
+    uint64: Final = struct.Struct('<Q')
+
+    def __init__(self, input: SearchableBuffer, skip_payloads: bool = False):
+        # The input is never resliced, tokens are read at an offset so that only the terms are copied out
         self.input = input
+        self.view = memoryview(self.input).cast('B')
+        self.pos = 0
+        self.end = len(self.view)
+        self.skip_payloads = skip_payloads
         self.pre_trace: list[LLVMStepEvent] = []
         self.init_config_pos = 0
         self.trace: list[Argument] = []
 
     def read_execution_hint(self) -> LLVMRewriteTrace:
+        events = self.read_events()
+
+        # read the prefix trace (step events), up to the initial configuration
+        for event in events:
+            if isinstance(event, KoreTerm):
+                self.init_config_pos = len(self.pre_trace)
+                self.initial_config = event.pattern
+                break
+            self.pre_trace.append(event)
+
+        # read the rest of the trace (all events)
+        self.trace.extend(decode(event) for event in events)
+
+        return LLVMRewriteTrace(tuple(self.pre_trace), self.initial_config, tuple(self.trace))
+
+    def read_events(self) -> Iterator[RawArgument]:
         # read the header
         version = self.read_header()
         assert version == EXPECTED_HINTS_VERSION, f'Expected version {EXPECTED_HINTS_VERSION}, found version {version}'
 
         # read the prefix trace (step events)
         while not self.peek(self.config_sentinel):
-            self.pre_trace.append(self.read_step_event())
+            event = self.read_step_event()
+            if not self.skip_payloads:
+                yield event
 
         # read the initial configuration
-        self.init_config_pos = len(self.pre_trace)
-        self.initial_config = self.read_config()
+        yield self.read_config()
 
         # read the rest of the trace (all events)
         while not self.eof():
-            self.trace.append(self.read_event())
-
-        return LLVMRewriteTrace(tuple(self.pre_trace), self.initial_config, tuple(self.trace))
+            yield self.read_event()
 
     def read_header(self) -> int:
         self.skip_constant(b'HINT')
@@ -142,9 +240,9 @@ class LLVMRewriteTraceParser:
         elif self.peek(self.side_cond_event_sentinel):
             return self.read_side_cond()
         else:
-            raise ValueError(f'Unexpected input: {self.input.hex()}')
+            raise ValueError(f'Unexpected input at offset {self.pos}: {self.view[self.pos : self.pos + 16].hex()}')
 
-    def read_event(self) -> Argument:
+    def read_event(self) -> RawArgument:
         if self.peek(self.config_sentinel):
             return self.read_config()
         else:
@@ -155,41 +253,37 @@ class LLVMRewriteTraceParser:
         name = self.read_c_string()
         position = self.read_c_string()
 
-        args = []
-        while not self.end_of_arguments():
-            args.append(self.read_argument())
+        args = self.read_arguments()
 
         self.skip_constant(self.hook_res_sentinel)
         result = self.read_kore()
-        return LLVMHookEvent(name=name, relative_position=position, args=tuple(args), result=result)
+        return LLVMHookEvent(name=name, relative_position=position, raw_args=args, raw_result=result)
 
     def read_function(self) -> LLVMFunctionEvent:
         self.skip_constant(self.func_event_sentinel)
         name = self.read_c_string()
         position = self.read_c_string()
 
-        args = []
-        while not self.end_of_arguments():
-            args.append(self.read_argument())
+        args = self.read_arguments()
 
         self.skip_constant(self.func_end_sentinel)
-        return LLVMFunctionEvent(name=name, relative_position=position, args=tuple(args))
+        return LLVMFunctionEvent(name=name, relative_position=position, raw_args=args)
 
     def read_rule(self) -> LLVMRuleEvent:
         self.skip_constant(self.rule_event_sentinel)
         ordinal, substitution = self.read_match()
-        return LLVMRuleEvent(rule_ordinal=ordinal, substitution=substitution)
+        return LLVMRuleEvent(rule_ordinal=ordinal, raw_substitution=substitution)
 
     def read_side_cond(self) -> LLVMSideCondEvent:
         self.skip_constant(self.side_cond_event_sentinel)
         ordinal, substitution = self.read_match()
-        return LLVMSideCondEvent(rule_ordinal=ordinal, substitution=substitution)
+        return LLVMSideCondEvent(rule_ordinal=ordinal, raw_substitution=substitution)
 
-    def read_match(self) -> tuple[int, tuple[tuple[str, kore.Pattern], ...]]:
+    def read_match(self) -> tuple[int, tuple[tuple[str, KoreTerm], ...]]:
         ordinal = self.read_uint(64)
         arity = self.read_uint(64)
 
-        substitution: tuple[tuple[str, kore.Pattern], ...] = ()
+        substitution: tuple[tuple[str, KoreTerm], ...] = ()
         for _ in range(arity):
             variable_name = self.read_variable_name()
             target = self.read_tailed_term()
@@ -197,34 +291,47 @@ class LLVMRewriteTraceParser:
 
         return ordinal, substitution
 
-    def read_config(self) -> kore.Pattern:
+    def read_config(self) -> KoreTerm:
         self.skip_constant(self.config_sentinel)
         return self.read_tailed_term()
 
-    def read_argument(self) -> Argument:
+    def read_arguments(self) -> tuple[RawArgument, ...]:
+        args = []
+        while not self.end_of_arguments():
+            if self.skip_payloads:
+                self.skip_argument()
+            else:
+                args.append(self.read_argument())
+        return tuple(args)
+
+    def read_argument(self) -> RawArgument:
         if self.peek(self.kore_term_prefix):
             return self.read_kore()
         else:
             return self.read_step_event()
 
-    def read_tailed_term(self) -> kore.Pattern:
+    def skip_argument(self) -> None:
+        if self.peek(self.kore_term_prefix):
+            self.skip(self.kore_length())
+        else:
+            self.read_step_event()
+
+    def read_tailed_term(self) -> KoreTerm:
         raw_term = self.read_until(self.kore_end_sentinel)
         self.skip_constant(self.kore_end_sentinel)
-        return self.to_kore(raw_term)
+        return KoreTerm(bytes(raw_term))
 
-    def read_kore(self) -> kore.Pattern:
+    def read_kore(self) -> KoreTerm:
+        total_length = self.kore_length()
+        raw_term = self.view[self.pos : self.pos + total_length]
+        self.skip(total_length)
+        return KoreTerm(bytes(raw_term))
+
+    def kore_length(self) -> int:
         # Kore term prefix: 5 bytes for b'\x7FKORE' + 6 bytes => 11-byte prefix
         # followed by an 8-byte uint64 => 19 bytes total
         kore_term_length = self.peek_uint64_at(11)
-        total_length = 11 + 8 + kore_term_length
-        raw_term = self.input[:total_length]
-        self.skip(total_length)
-        return self.to_kore(raw_term)
-
-    def to_kore(self, raw_term: bytes) -> kore.Pattern:
-        llvm_pattern = kllvm_kore.Pattern.deserialize(raw_term)
-        assert llvm_pattern, ('Could not deserialize binary kore.', input)
-        return llvm_to_pattern(llvm_pattern)
+        return 11 + 8 + kore_term_length
 
     def read_variable_name(self) -> str:
         return self.read_c_string()
@@ -235,37 +342,39 @@ class LLVMRewriteTraceParser:
         return ret
 
     def skip_constant(self, constant: bytes) -> None:
-        assert self.input[: len(constant)] == constant
-        self.input = self.input[len(constant) :]
+        assert self.peek(constant)
+        self.pos += len(constant)
 
     def read_uint(self, size: int) -> int:
         assert size in {32, 64}
-        little_endian = {32: '<I', 64: '<Q'}
-        index = size // 8
-        raw = self.input[:index]
-        self.input = self.input[index:]
-        return struct.unpack(little_endian[size], raw)[0]
-
-    def read_until(self, constant: bytes) -> bytes:
-        index = self.input.find(constant)
-        ret = self.input[:index]
-        self.input = self.input[index:]
+        unpacker = self.uint32 if size == 32 else self.uint64
+        ret = unpacker.unpack_from(self.view, self.pos)[0]
+        self.pos += unpacker.size
+        return ret
+
+    def read_until(self, constant: bytes) -> memoryview:
+        index = self.input.find(constant, self.pos, self.end)
+        if index < 0:
+            raise ValueError(f'Expected {constant.hex()} after offset {self.pos}')
+        ret = self.view[self.pos : index]
+        self.pos = index
         return ret
 
     def peek_uint64_at(self, idx: int) -> int:
-        length = 8
-        raw = self.input[idx : idx + length]
-        little_endian_long_long = '<Q'
-        return struct.unpack(little_endian_long_long, raw)[0]
+        return self.uint64.unpack_from(self.view, self.pos + idx)[0]
 
     def peek(self, cst: bytes) -> bool:
-        return self.input[: len(cst)] == cst
+        return self.view[self.pos : self.pos + len(cst)] == cst
 
     def skip(self, n: int) -> None:
-        self.input = self.input[n:]
+        self.pos += n
 
     def eof(self) -> bool:
-        return len(self.input) == 0
+        return self.pos >= self.end
+
+    def release(self) -> None:
+        """Release the view of the input, mapped files cannot be closed while it is in use."""
+        self.view.release()
 
     def end_of_arguments(self) -> bool:
         return self.peek(self.func_end_sentinel) or self.peek(self.hook_res_sentinel)
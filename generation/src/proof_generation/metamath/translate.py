@@ -17,6 +17,7 @@ from proof_generation.stateful_interpreter import StatefulInterpreter
 
 if TYPE_CHECKING:
     from proof_generation.interpreter import Interpreter
+    from proof_generation.metamath.ast import Database
 
 
 def exec_proof(converter: MetamathConverter, target: str, proofexp: ProofExp, interp: Interpreter) -> None:
@@ -201,6 +202,32 @@ def convert_to_implication(antecedents: tuple[Pattern, ...], conclusion: Pattern
     return Implies(ant, conclusion)
 
 
+def get_proof_skeleton(input_database: Database, target: str) -> ProofExp:
+    # Prepare the converter
+    converter = MetamathConverter(input_database)
+    assert converter
+
+    extracted_axioms = []
+    for axiom_name in converter.exported_axioms:
+        axiom = converter.get_axiom_by_name(axiom_name)
+        if isinstance(axiom, AxiomWithAntecedents):
+            extracted_axioms.append(convert_to_implication(axiom.antecedents, axiom.pattern))
+            continue
+        extracted_axioms.append(axiom.pattern)
+
+    extracted_claims = [converter.get_lemma_by_name(lemma_name).pattern for lemma_name in converter.lemmas]
+
+    class TranslatedProofSkeleton(ProofExp):
+        def __init__(self) -> None:
+            super().__init__(axioms=extracted_axioms, claims=extracted_claims)
+
+        def execute_proofs_phase(self, interpreter: Interpreter) -> None:
+            assert interpreter.phase == ExecutionPhase.Proof
+            exec_proof(converter, target, self, interpreter)
+
+    return TranslatedProofSkeleton()
+
+
 def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument('input', help='Input Metamath database path')
@@ -226,32 +253,9 @@ def main() -> None:
         print('Creating output directory...')
         output_dir.mkdir()
 
-    # Prepare the converter
-    converter = MetamathConverter(input_database)
-    assert converter
-
-    extracted_axioms = []
-    for axiom_name in converter.exported_axioms:
-        axiom = converter.get_axiom_by_name(axiom_name)
-        if isinstance(axiom, AxiomWithAntecedents):
-            extracted_axioms.append(convert_to_implication(axiom.antecedents, axiom.pattern))
-            continue
-        extracted_axioms.append(axiom.pattern)
-
-    extracted_claims = [converter.get_lemma_by_name(lemma_name).pattern for lemma_name in converter.lemmas]
-
-    class TranslatedProofSkeleton(ProofExp):
-        def __init__(self) -> None:
-            super().__init__(axioms=extracted_axioms, claims=extracted_claims)
-
-        def execute_proofs_phase(self, interpreter: Interpreter) -> None:
-            assert interpreter.phase == ExecutionPhase.Proof
-            exec_proof(converter, args.target, self, interpreter)
-
+    proof_skeleton = get_proof_skeleton(input_database, args.target)
     module = os.path.splitext(os.path.basename(args.input))[0]
 
-    proof_skeleton = TranslatedProofSkeleton()
-
     proof_skeleton.main(['', '--optimize', 'binary', str(output_dir), module])
     proof_skeleton.main(['', '--optimize', 'binary', str(output_dir), module])
     proof_skeleton.main(['', '--optimize', 'binary', str(output_dir), module])
@@ -1,16 +1,17 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, NamedTuple
 
 from .basic_interpreter import BasicInterpreter
 from .interpreter_transformer import InterpreterTransformer
+from .proved import Proved
 from .stateful_interpreter import StatefulInterpreter
 
 if TYPE_CHECKING:
     from collections.abc import Mapping
 
+    from .interpreter import Interpreter
     from .pattern import Pattern
-    from .proved import Proved
 
 
 class InstantiationOptimizer(InterpreterTransformer):
@@ -42,7 +43,7 @@ class MemoizingInterpreter(InterpreterTransformer):
             self._patterns_for_memoization = patterns_for_memoization
 
     def pattern(self, p: Pattern) -> Pattern:
-        if isinstance(self.sub_interpreter, StatefulInterpreter) and p in self.sub_interpreter.memory:
+        if isinstance(self.sub_interpreter, StatefulInterpreter) and self.sub_interpreter.memory_slot(p) is not None:
             self.load(str(p), p)
             return p
         elif p in self._patterns_for_memoization:
@@ -51,3 +52,53 @@ class MemoizingInterpreter(InterpreterTransformer):
             return ret
         else:
             return super().pattern(p)
+
+
+class ProofCacheInfo(NamedTuple):
+    conclusion: Pattern
+    hits: int
+    misses: int
+    # Calls of the proof that were replaced by loads
+    served: int
+
+
+class ProofCachingInterpreter(InterpreterTransformer):
+    """Saves the conclusions of the given proofs once proved, and loads them instead of proving them again.
+    Conclusions are given in normal form, with the number of calls of their proofs, which are
+    counted as served from the cache on each hit. The statistics are kept for each published proof.
+    """
+
+    def __init__(self, sub_interpreter: Interpreter, cached: Mapping[Pattern, int]):
+        super().__init__(sub_interpreter)
+        self._cached = cached
+        self._saved: set[Pattern] = set()
+        self._hits = 0
+        self._misses = 0
+        self._served = 0
+        self.statistics: list[ProofCacheInfo] = []
+
+    def pattern(self, p: Pattern) -> Pattern:
+        # Patterns are built by the sub-interpreter, which may memoize them
+        return self.sub_interpreter.pattern(p)
+
+    def begin_proof(self, conclusion: Pattern) -> bool:
+        key = conclusion.normalize()
+        if key not in self._saved:
+            return super().begin_proof(conclusion)
+        self._hits += 1
+        self._served += self._cached[key]
+        self.load(str(conclusion), Proved(conclusion))
+        return True
+
+    def end_proof(self, proved: Proved) -> None:
+        super().end_proof(proved)
+        key = proved.conclusion.normalize()
+        if key in self._cached and key not in self._saved:
+            self._misses += 1
+            self._saved.add(key)
+            self.save(str(proved), proved)
+
+    def publish_proof(self, term: Proved) -> None:
+        super().publish_proof(term)
+        self.statistics.append(ProofCacheInfo(term.conclusion, self._hits, self._misses, self._served))
+        self._hits = self._misses = self._served = 0
@@ -1,12 +1,17 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import TYPE_CHECKING
+from collections import OrderedDict
+from dataclasses import MISSING, dataclass, fields
+from typing import TYPE_CHECKING, Any
+from weakref import WeakValueDictionary
 
 from frozendict import frozendict
 
+from proof_generation.proved import VerificationError
+
 if TYPE_CHECKING:
     from collections.abc import Mapping
+    from dataclasses import Field
 
 
 def match_single(
@@ -77,11 +82,219 @@ def match(equations: list[tuple[Pattern, Pattern]]) -> dict[int, Pattern] | None
     return ret
 
 
-class Pattern:
+def _intern_key(value: Any) -> Any:
+    # Subpatterns are already interned, so they are identified by their address.
+    # The key never outlives the pattern it maps to, which keeps its subpatterns alive.
+    if isinstance(value, Pattern):
+        return id(value)
+    if isinstance(value, frozendict):
+        return tuple((k, id(v)) for k, v in value.items())
+    return value
+
+
+class Interned(type):
+    """Metaclass that hash-conses pattern constructors.
+    Every distinct pattern is constructed exactly once and shared through a
+    global (weak) unique table, so structurally identical patterns are the
+    same object and comparing notation-free patterns is an identity check.
+    """
+
+    _unique_table: WeakValueDictionary[tuple[Any, ...], Pattern] = WeakValueDictionary()
+
+    def __call__(cls, *args: Any, **kwargs: Any) -> Any:
+        cls_fields: tuple[Field, ...] = cls.__dict__.get('_fields') or cls._init_fields()
+        if kwargs or len(args) != len(cls_fields):
+            values = list(args)
+            for field in cls_fields[len(args) :]:
+                if field.name in kwargs:
+                    values.append(kwargs.pop(field.name))
+                elif field.default is not MISSING:
+                    values.append(field.default)
+                else:
+                    break
+            if kwargs or len(values) != len(cls_fields):
+                # Let the dataclass constructor report the malformed call
+                return super().__call__(*args, **kwargs)
+            args = tuple(values)
+
+        key = (cls, *map(_intern_key, args))
+        ret = Interned._unique_table.get(key)
+        if ret is None:
+            ret = super().__call__(*args)
+            Interned._unique_table[key] = ret
+        return ret
+
+    def _init_fields(cls) -> tuple[Field, ...]:
+        cls_fields = fields(cls)  # type: ignore
+        cls._fields = cls_fields
+        return cls_fields
+
+    @staticmethod
+    def table_size() -> int:
+        return len(Interned._unique_table)
+
+
+@dataclass(frozen=True)
+class FreshVars:
+    """A finite summary of the variables which do not occur free in a pattern.
+    If cofinite, every variable except `names` is fresh, otherwise exactly `names` are.
+    """
+
+    cofinite: bool
+    names: frozenset[int]
+
+    def __contains__(self, name: int) -> bool:
+        return (name in self.names) != self.cofinite
+
+    def __and__(self, o: FreshVars) -> FreshVars:
+        if self is o or (o.cofinite and not o.names):
+            return self
+        if self.cofinite and not self.names:
+            return o
+        if self.cofinite and o.cofinite:
+            return FreshVars(True, self.names | o.names)
+        if self.cofinite:
+            return FreshVars(False, o.names - self.names)
+        if o.cofinite:
+            return FreshVars(False, self.names - o.names)
+        return FreshVars(False, self.names & o.names)
+
+    def __or__(self, o: FreshVars) -> FreshVars:
+        if self is o or (not o.cofinite and not o.names):
+            return self
+        if not self.cofinite and not self.names:
+            return o
+        if self.cofinite and o.cofinite:
+            return FreshVars(True, self.names & o.names)
+        if self.cofinite:
+            return FreshVars(True, self.names - o.names)
+        if o.cofinite:
+            return FreshVars(True, o.names - self.names)
+        return FreshVars(False, self.names | o.names)
+
+    def update(self, name: int, fresh: bool) -> FreshVars:
+        if (name in self) == fresh:
+            return self
+        return FreshVars(self.cofinite, self.names ^ {name})
+
+
+all_fresh = FreshVars(True, frozenset())
+none_fresh = FreshVars(False, frozenset())
+
+
+class Pattern(metaclass=Interned):
+    _fields: tuple[Field, ...] = ()
+    _hash: int
+    _notation_free: bool
+    _metavars: frozenset[int]
+    _instantiable: frozenset[int]
+    _subst_normal: bool
+    _subst_free: bool
+    _fresh_evars: FreshVars
+    _fresh_svars: FreshVars
+
+    def __post_init__(self) -> None:
+        values = self._values()
+        children = [v for v in values if isinstance(v, Pattern)]
+        object.__setattr__(self, '_hash', hash((type(self).__name__, *values)))
+        object.__setattr__(self, '_notation_free', self._collect_notation_free(children))
+        # Summaries are computed once, as every distinct pattern is constructed once
+        object.__setattr__(self, '_metavars', self._collect_metavars())
+        # Notation may carry plugs for metavariables it does not use, which are still instantiated
+        object.__setattr__(
+            self, '_instantiable', self._metavars if self._notation_free else self._collect_instantiable(children)
+        )
+        object.__setattr__(self, '_subst_normal', self._collect_subst_normal(children))
+        object.__setattr__(self, '_subst_free', self._collect_subst_free(children))
+        object.__setattr__(self, '_fresh_evars', self._collect_fresh_evars())
+        object.__setattr__(self, '_fresh_svars', self._collect_fresh_svars())
+
+    def _values(self) -> tuple[Any, ...]:
+        return tuple(getattr(self, field.name) for field in self._fields)
+
+    def __eq__(self, o: object) -> bool:
+        if self is o:
+            return True
+        if not isinstance(o, Pattern):
+            return False
+        if self._notation_free and o._notation_free:
+            # Both are interned and contain no notation, so they differ structurally
+            return False
+        # Equality is modulo notation, and normal forms are interned as well
+        return self.normalize() is o.normalize()
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # Go through the constructor so that unpickled patterns are interned as well
+        return type(self), self._values()
+
     def evar_is_free(self, name: int) -> bool:
+        """Returns whether the element variable does not occur free in the pattern."""
+        return name in self._fresh_evars
+
+    def svar_is_free(self, name: int) -> bool:
+        """Returns whether the set variable does not occur free in the pattern."""
+        return name in self._fresh_svars
+
+    def svar_is_positive(self, name: int) -> bool:
+        """Returns whether the set variable occurs only positively in the pattern."""
+        raise NotImplementedError
+
+    def svar_is_negative(self, name: int) -> bool:
+        """Returns whether the set variable occurs only negatively in the pattern."""
+        raise NotImplementedError
+
+    def metavars(self) -> frozenset[int]:
+        return self._metavars
+
+    def normalize(self) -> Pattern:
+        """Returns the pattern with all notation recursively instantiated.
+        The normal form is computed once and cached on the pattern.
+        """
+        if self._notation_free:
+            return self
+        normal = self.__dict__.get('_normal')
+        if normal is None:
+            normal = self._normalize()
+            object.__setattr__(self, '_normal', normal)
+        return normal
+
+    def _normalize(self) -> Pattern:
+        return type(self)(*(v.normalize() if isinstance(v, Pattern) else v for v in self._values()))
+
+    def _collect_metavars(self) -> frozenset[int]:
         raise NotImplementedError
 
-    def metavars(self) -> set[int]:
+    def _collect_instantiable(self, children: list[Pattern]) -> frozenset[int]:
+        return frozenset().union(*(child._instantiable for child in children))
+
+    def _collect_notation_free(self, children: list[Pattern]) -> bool:
+        return all(child._notation_free for child in children)
+
+    def _collect_subst_normal(self, children: list[Pattern]) -> bool:
+        # Whether no substitution in the pattern would be simplified away by instantiating it
+        return all(child._subst_normal for child in children)
+
+    def _collect_subst_free(self, children: list[Pattern]) -> bool:
+        # Whether the pattern contains no notation or explicit substitution,
+        # which are rewritten by any substitution applied to them
+        return all(child._subst_free for child in children)
+
+    def _unaffected_by(self, delta: Mapping[int, Pattern]) -> bool:
+        return not delta or (self._subst_normal and self._instantiable.isdisjoint(delta))
+
+    def _unaffected_by_esubst(self, evar_id: int) -> bool:
+        return self._subst_free and evar_id in self._fresh_evars
+
+    def _unaffected_by_ssubst(self, svar_id: int) -> bool:
+        return self._subst_free and svar_id in self._fresh_svars
+
+    def _collect_fresh_evars(self) -> FreshVars:
+        raise NotImplementedError
+
+    def _collect_fresh_svars(self) -> FreshVars:
         raise NotImplementedError
 
     def instantiate(self, delta: Mapping[int, Pattern]) -> Pattern:
@@ -104,7 +317,13 @@ class Pattern:
         if isinstance(pattern, Instantiate):
             return cls.unwrap(pattern.simplify())
         if isinstance(pattern, cls):
-            return tuple([v for _, v in sorted(vars(pattern).items()) if isinstance(v, Pattern)])
+            return tuple(
+                [
+                    v
+                    for _, v in sorted((f.name, getattr(pattern, f.name)) for f in pattern._fields)
+                    if isinstance(v, Pattern)
+                ]
+            )
         return None
 
     @classmethod
@@ -114,15 +333,24 @@ class Pattern:
         return ret
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False)
 class EVar(Pattern):
     name: int
 
-    def evar_is_free(self, name: int) -> bool:
-        return name != self.name
+    def _collect_metavars(self) -> frozenset[int]:
+        return frozenset()
 
-    def metavars(self) -> set[int]:
-        return set()
+    def _collect_fresh_evars(self) -> FreshVars:
+        return FreshVars(True, frozenset({self.name}))
+
+    def _collect_fresh_svars(self) -> FreshVars:
+        return all_fresh
+
+    def svar_is_positive(self, name: int) -> bool:
+        return True
+
+    def svar_is_negative(self, name: int) -> bool:
+        return True
 
     def instantiate(self, delta: Mapping[int, Pattern]) -> Pattern:
         return self
@@ -150,15 +378,24 @@ class EVar(Pattern):
         return None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False)
 class SVar(Pattern):
     name: int
 
-    def evar_is_free(self, name: int) -> bool:
+    def _collect_metavars(self) -> frozenset[int]:
+        return frozenset()
+
+    def _collect_fresh_evars(self) -> FreshVars:
+        return all_fresh
+
+    def _collect_fresh_svars(self) -> FreshVars:
+        return FreshVars(True, frozenset({self.name}))
+
+    def svar_is_positive(self, name: int) -> bool:
         return True
 
-    def metavars(self) -> set[int]:
-        return set()
+    def svar_is_negative(self, name: int) -> bool:
+        return self.name != name
 
     def instantiate(self, delta: Mapping[int, Pattern]) -> Pattern:
         return self
@@ -186,15 +423,24 @@ class SVar(Pattern):
         return None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False)
 class Symbol(Pattern):
     name: str
 
-    def evar_is_free(self, name: int) -> bool:
+    def _collect_metavars(self) -> frozenset[int]:
+        return frozenset()
+
+    def _collect_fresh_evars(self) -> FreshVars:
+        return all_fresh
+
+    def _collect_fresh_svars(self) -> FreshVars:
+        return all_fresh
+
+    def svar_is_positive(self, name: int) -> bool:
         return True
 
-    def metavars(self) -> set[int]:
-        return set()
+    def svar_is_negative(self, name: int) -> bool:
+        return True
 
     def instantiate(self, delta: Mapping[int, Pattern]) -> Pattern:
         return self
@@ -220,27 +466,45 @@ class Symbol(Pattern):
         return None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False)
 class Implies(Pattern):
     left: Pattern
     right: Pattern
 
-    def evar_is_free(self, name: int) -> bool:
-        return self.left.evar_is_free(name) and self.right.evar_is_free(name)
+    def _collect_metavars(self) -> frozenset[int]:
+        return self.left._metavars | self.right._metavars
+
+    def _collect_fresh_evars(self) -> FreshVars:
+        return self.left._fresh_evars & self.right._fresh_evars
+
+    def _collect_fresh_svars(self) -> FreshVars:
+        return self.left._fresh_svars & self.right._fresh_svars
 
-    def metavars(self) -> set[int]:
-        return self.left.metavars().union(self.right.metavars())
+    def svar_is_positive(self, name: int) -> bool:
+        return self.left.svar_is_negative(name) and self.right.svar_is_positive(name)
+
+    def svar_is_negative(self, name: int) -> bool:
+        return self.left.svar_is_positive(name) and self.right.svar_is_negative(name)
 
     def instantiate(self, delta: Mapping[int, Pattern]) -> Pattern:
-        if not delta:
+        if self._unaffected_by(delta):
             return self
-        return Implies(self.left.instantiate(delta), self.right.instantiate(delta))
+        return self._rebuild(self.left.instantiate(delta), self.right.instantiate(delta))
 
     def apply_esubst(self, evar_id: int, plug: Pattern) -> Pattern:
-        return Implies(self.left.apply_esubst(evar_id, plug), self.right.apply_esubst(evar_id, plug))
+        if self._unaffected_by_esubst(evar_id):
+            return self
+        return self._rebuild(self.left.apply_esubst(evar_id, plug), self.right.apply_esubst(evar_id, plug))
 
     def apply_ssubst(self, svar_id: int, plug: Pattern) -> Pattern:
-        return Implies(self.left.apply_ssubst(svar_id, plug), self.right.apply_ssubst(svar_id, plug))
+        if self._unaffected_by_ssubst(svar_id):
+            return self
+        return self._rebuild(self.left.apply_ssubst(svar_id, plug), self.right.apply_ssubst(svar_id, plug))
+
+    def _rebuild(self, left: Pattern, right: Pattern) -> Pattern:
+        if left is self.left and right is self.right:
+            return self
+        return Implies(left, right)
 
     def pretty(self, opts: PrettyOptions) -> str:
         return f'({self.left.pretty(opts)} -> {self.right.pretty(opts)})'
@@ -253,27 +517,45 @@ def imp(p1: Pattern, p2: Pattern) -> Pattern:
     return Implies(p1, p2)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False)
 class App(Pattern):
     left: Pattern
     right: Pattern
 
-    def evar_is_free(self, name: int) -> bool:
-        return self.left.evar_is_free(name) and self.right.evar_is_free(name)
+    def _collect_metavars(self) -> frozenset[int]:
+        return self.left._metavars | self.right._metavars
+
+    def _collect_fresh_evars(self) -> FreshVars:
+        return self.left._fresh_evars & self.right._fresh_evars
+
+    def _collect_fresh_svars(self) -> FreshVars:
+        return self.left._fresh_svars & self.right._fresh_svars
+
+    def svar_is_positive(self, name: int) -> bool:
+        return self.left.svar_is_positive(name) and self.right.svar_is_positive(name)
 
-    def metavars(self) -> set[int]:
-        return self.left.metavars().union(self.right.metavars())
+    def svar_is_negative(self, name: int) -> bool:
+        return self.left.svar_is_negative(name) and self.right.svar_is_negative(name)
 
     def instantiate(self, delta: Mapping[int, Pattern]) -> Pattern:
-        if not delta:
+        if self._unaffected_by(delta):
             return self
-        return App(self.left.instantiate(delta), self.right.instantiate(delta))
+        return self._rebuild(self.left.instantiate(delta), self.right.instantiate(delta))
 
     def apply_esubst(self, evar_id: int, plug: Pattern) -> Pattern:
-        return App(self.left.apply_esubst(evar_id, plug), self.right.apply_esubst(evar_id, plug))
+        if self._unaffected_by_esubst(evar_id):
+            return self
+        return self._rebuild(self.left.apply_esubst(evar_id, plug), self.right.apply_esubst(evar_id, plug))
 
     def apply_ssubst(self, svar_id: int, plug: Pattern) -> Pattern:
-        return App(self.left.apply_ssubst(svar_id, plug), self.right.apply_ssubst(svar_id, plug))
+        if self._unaffected_by_ssubst(svar_id):
+            return self
+        return self._rebuild(self.left.apply_ssubst(svar_id, plug), self.right.apply_ssubst(svar_id, plug))
+
+    def _rebuild(self, left: Pattern, right: Pattern) -> Pattern:
+        if left is self.left and right is self.right:
+            return self
+        return App(left, right)
 
     def pretty(self, opts: PrettyOptions) -> str:
         return f'({self.left.pretty(opts)} · {self.right.pretty(opts)})'
@@ -282,29 +564,45 @@ class App(Pattern):
         return self.pretty(PrettyOptions())
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False)
 class Exists(Pattern):
     var: int
     subpattern: Pattern
 
-    def evar_is_free(self, name: int) -> bool:
-        return name == self.var or self.subpattern.evar_is_free(name)
+    def _collect_metavars(self) -> frozenset[int]:
+        return self.subpattern._metavars
+
+    def _collect_fresh_evars(self) -> FreshVars:
+        return self.subpattern._fresh_evars.update(self.var, True)
+
+    def _collect_fresh_svars(self) -> FreshVars:
+        return self.subpattern._fresh_svars
+
+    def svar_is_positive(self, name: int) -> bool:
+        return self.subpattern.svar_is_positive(name)
 
-    def metavars(self) -> set[int]:
-        return self.subpattern.metavars()
+    def svar_is_negative(self, name: int) -> bool:
+        return self.subpattern.svar_is_negative(name)
 
     def instantiate(self, delta: Mapping[int, Pattern]) -> Pattern:
-        if not delta:
+        if self._unaffected_by(delta):
             return self
-        return Exists(self.var, self.subpattern.instantiate(delta))
+        return self._rebuild(self.subpattern.instantiate(delta))
 
     def apply_esubst(self, evar_id: int, plug: Pattern) -> Pattern:
-        if evar_id == self.var:
+        if evar_id == self.var or self._unaffected_by_esubst(evar_id):
             return self
-        return Exists(self.var, self.subpattern.apply_esubst(evar_id, plug))
+        return self._rebuild(self.subpattern.apply_esubst(evar_id, plug))
 
     def apply_ssubst(self, svar_id: int, plug: Pattern) -> Pattern:
-        return Exists(self.var, self.subpattern.apply_ssubst(svar_id, plug))
+        if self._unaffected_by_ssubst(svar_id):
+            return self
+        return self._rebuild(self.subpattern.apply_ssubst(svar_id, plug))
+
+    def _rebuild(self, subpattern: Pattern) -> Pattern:
+        if subpattern is self.subpattern:
+            return self
+        return Exists(self.var, subpattern)
 
     def pretty(self, opts: PrettyOptions) -> str:
         return f'(∃ x{self.var} . {self.subpattern.pretty(opts)})'
@@ -321,29 +619,45 @@ class Exists(Pattern):
         return None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False)
 class Mu(Pattern):
     var: int
     subpattern: Pattern
 
-    def evar_is_free(self, name: int) -> bool:
-        return self.subpattern.evar_is_free(name)
+    def _collect_metavars(self) -> frozenset[int]:
+        return self.subpattern._metavars
+
+    def _collect_fresh_evars(self) -> FreshVars:
+        return self.subpattern._fresh_evars
+
+    def _collect_fresh_svars(self) -> FreshVars:
+        return self.subpattern._fresh_svars.update(self.var, True)
+
+    def svar_is_positive(self, name: int) -> bool:
+        return self.var == name or self.subpattern.svar_is_positive(name)
 
-    def metavars(self) -> set[int]:
-        return self.subpattern.metavars()
+    def svar_is_negative(self, name: int) -> bool:
+        return self.var == name or self.subpattern.svar_is_negative(name)
 
     def instantiate(self, delta: Mapping[int, Pattern]) -> Pattern:
-        if not delta:
+        if self._unaffected_by(delta):
             return self
-        return Mu(self.var, self.subpattern.instantiate(delta))
+        return self._rebuild(self.subpattern.instantiate(delta))
 
     def apply_esubst(self, evar_id: int, plug: Pattern) -> Pattern:
-        return Mu(self.var, self.subpattern.apply_esubst(evar_id, plug))
+        if self._unaffected_by_esubst(evar_id):
+            return self
+        return self._rebuild(self.subpattern.apply_esubst(evar_id, plug))
 
     def apply_ssubst(self, svar_id: int, plug: Pattern) -> Pattern:
-        if svar_id == self.var:
+        if svar_id == self.var or self._unaffected_by_ssubst(svar_id):
+            return self
+        return self._rebuild(self.subpattern.apply_ssubst(svar_id, plug))
+
+    def _rebuild(self, subpattern: Pattern) -> Pattern:
+        if subpattern is self.subpattern:
             return self
-        return Mu(self.var, self.subpattern.apply_ssubst(svar_id, plug))
+        return Mu(self.var, subpattern)
 
     def pretty(self, opts: PrettyOptions) -> str:
         return f'(μ X{self.var} . {self.subpattern.pretty(opts)})'
@@ -360,7 +674,7 @@ class Mu(Pattern):
         return None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False)
 class MetaVar(Pattern):
     name: int
     e_fresh: tuple[EVar, ...] = ()
@@ -369,21 +683,39 @@ class MetaVar(Pattern):
     negative: tuple[SVar, ...] = ()
     app_ctx_holes: tuple[EVar, ...] = ()
 
-    def metavars(self) -> set[int]:
-        return {self.name}
+    def _collect_metavars(self) -> frozenset[int]:
+        return frozenset({self.name})
 
-    def evar_is_free(self, name: int) -> bool:
-        return EVar(name) in self.e_fresh
+    def _collect_fresh_evars(self) -> FreshVars:
+        return FreshVars(False, frozenset(var.name for var in self.e_fresh))
+
+    def _collect_fresh_svars(self) -> FreshVars:
+        return FreshVars(False, frozenset(var.name for var in self.s_fresh))
+
+    def svar_is_positive(self, name: int) -> bool:
+        return SVar(name) in self.positive
+
+    def svar_is_negative(self, name: int) -> bool:
+        return SVar(name) in self.negative
 
     def can_be_replaced_by(self, pat: Pattern) -> bool:
-        # TODO implement this function by checking constraints
-        return True
+        return (
+            all(pat.evar_is_free(var.name) for var in self.e_fresh)
+            and all(pat.svar_is_free(var.name) for var in self.s_fresh)
+            and all(pat.svar_is_positive(var.name) for var in self.positive)
+            and all(pat.svar_is_negative(var.name) for var in self.negative)
+        )
+
+    def is_well_formed(self) -> bool:
+        """Returns whether no application context hole is also required to be fresh."""
+        return all(hole not in self.e_fresh for hole in self.app_ctx_holes)
 
     def instantiate(self, delta: Mapping[int, Pattern]) -> Pattern:
         if self.name in delta:
-            assert self.can_be_replaced_by(
-                delta[self.name]
-            ), f'Invalid instantiation when trying to instantiate {str(self)} with {str(delta[self.name])}\n'
+            if not self.can_be_replaced_by(delta[self.name]):
+                raise VerificationError(
+                    f'Invalid instantiation when trying to instantiate {str(self)} with {str(delta[self.name])}'
+                )
             return delta[self.name]
         return self
 
@@ -409,24 +741,39 @@ phi1 = MetaVar(1)
 phi2 = MetaVar(2)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False)
 class ESubst(Pattern):
     pattern: MetaVar | ESubst | SSubst
     var: EVar
     plug: Pattern
 
-    def evar_is_free(self, name: int) -> bool:
-        if self.var.name == name:
-            return self.plug.evar_is_free(name)
+    def _collect_metavars(self) -> frozenset[int]:
+        return self.pattern._metavars | self.plug._metavars
 
+    def _collect_fresh_evars(self) -> FreshVars:
         # We assume that at least one instance will be replaced
-        return self.pattern.evar_is_free(name) and self.plug.evar_is_free(name)
+        fresh = self.pattern._fresh_evars & self.plug._fresh_evars
+        return fresh.update(self.var.name, self.plug.evar_is_free(self.var.name))
+
+    def _collect_fresh_svars(self) -> FreshVars:
+        return self.pattern._fresh_svars & self.plug._fresh_svars
 
-    def metavars(self) -> set[int]:
-        return self.pattern.metavars().union(self.plug.metavars())
+    def svar_is_positive(self, name: int) -> bool:
+        return self.pattern.svar_is_positive(name) and self.plug.svar_is_free(name)
+
+    def svar_is_negative(self, name: int) -> bool:
+        return self.pattern.svar_is_negative(name) and self.plug.svar_is_free(name)
+
+    def _collect_subst_normal(self, children: list[Pattern]) -> bool:
+        if isinstance(self.pattern, MetaVar) and self.var in self.pattern.e_fresh:
+            return False
+        return super()._collect_subst_normal(children)
+
+    def _collect_subst_free(self, children: list[Pattern]) -> bool:
+        return False
 
     def instantiate(self, delta: Mapping[int, Pattern]) -> Pattern:
-        if not delta:
+        if self._unaffected_by(delta):
             return self
         return self.pattern.instantiate(delta).apply_esubst(self.var.name, self.plug.instantiate(delta))
 
@@ -443,21 +790,54 @@ class ESubst(Pattern):
         return self.pretty(PrettyOptions())
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False)
 class SSubst(Pattern):
     pattern: MetaVar | ESubst | SSubst
     var: SVar
     plug: Pattern
 
-    def evar_is_free(self, name: int) -> bool:
-        # We assume that at least one instance will be replaced
-        return self.pattern.evar_is_free(name) and self.plug.evar_is_free(name)
+    def _collect_metavars(self) -> frozenset[int]:
+        return self.pattern._metavars | self.plug._metavars
 
-    def metavars(self) -> set[int]:
-        return self.pattern.metavars().union(self.plug.metavars())
+    def _collect_fresh_evars(self) -> FreshVars:
+        # We assume that at least one instance will be replaced
+        return self.pattern._fresh_evars & self.plug._fresh_evars
+
+    def _collect_fresh_svars(self) -> FreshVars:
+        fresh = self.pattern._fresh_svars & self.plug._fresh_svars
+        return fresh.update(self.var.name, self.plug.svar_is_free(self.var.name))
+
+    def svar_is_positive(self, name: int) -> bool:
+        # The polarity of the plug flips wherever the substituted variable occurs negatively
+        plug_positive = (
+            self.plug.svar_is_free(name)
+            or (self.pattern.svar_is_positive(self.var.name) and self.plug.svar_is_positive(name))
+            or (self.pattern.svar_is_negative(self.var.name) and self.plug.svar_is_negative(name))
+        )
+        if name == self.var.name:
+            return plug_positive
+        return self.pattern.svar_is_positive(name) and plug_positive
+
+    def svar_is_negative(self, name: int) -> bool:
+        plug_negative = (
+            self.plug.svar_is_free(name)
+            or (self.pattern.svar_is_positive(self.var.name) and self.plug.svar_is_negative(name))
+            or (self.pattern.svar_is_negative(self.var.name) and self.plug.svar_is_positive(name))
+        )
+        if name == self.var.name:
+            return plug_negative
+        return self.pattern.svar_is_negative(name) and plug_negative
+
+    def _collect_subst_normal(self, children: list[Pattern]) -> bool:
+        if isinstance(self.pattern, MetaVar) and self.var in self.pattern.s_fresh:
+            return False
+        return super()._collect_subst_normal(children)
+
+    def _collect_subst_free(self, children: list[Pattern]) -> bool:
+        return False
 
     def instantiate(self, delta: Mapping[int, Pattern]) -> Pattern:
-        if not delta:
+        if self._unaffected_by(delta):
             return self
         return self.pattern.instantiate(delta).apply_ssubst(self.var.name, self.plug.instantiate(delta))
 
@@ -477,7 +857,29 @@ class SSubst(Pattern):
 InstantiationDict = frozendict[int, Pattern]
 
 
-@dataclass(frozen=True)
+_NOTATION_CACHE_SIZE = 2**16
+_notation_expansions: OrderedDict[tuple[int, ...], tuple[Pattern, InstantiationDict, Pattern]] = OrderedDict()
+
+
+def _instantiate_notation(definition: Pattern, args: InstantiationDict) -> Pattern:
+    # Notation is instantiated with the same arguments over and over again, so the
+    # expansions are kept alive even after the Instantiate node itself is collected.
+    # Patterns compare equal modulo notation, so the expansions are keyed by the identity
+    # of the interned definition and arguments instead. Entries keep them alive, so that
+    # their ids are not reused by other patterns while they are cached.
+    key = (id(definition), *(part for name, arg in args.items() for part in (name, id(arg))))
+    entry = _notation_expansions.get(key)
+    if entry is not None:
+        _notation_expansions.move_to_end(key)
+        return entry[2]
+    ret = definition.instantiate(args)
+    _notation_expansions[key] = (definition, args, ret)
+    if len(_notation_expansions) > _NOTATION_CACHE_SIZE:
+        _notation_expansions.popitem(last=False)
+    return ret
+
+
+@dataclass(frozen=True, eq=False)
 class Instantiate(Pattern):
     """Constructor for an unsimplified Instantiated Pattern.
     This is typically used to contain Notation.
@@ -489,26 +891,56 @@ class Instantiate(Pattern):
     def simplify(self) -> Pattern:
         """Instantiate pattern with plug.
         Note that this doesn't fully reduce all notation, just one level.
+        Use `normalize` to remove all notation.
         """
-        return self.pattern.instantiate(self.inst)
-
-    def __eq__(self, o: object) -> bool:
-        # TODO: This should recursively remove all notation.
-        return self.simplify() == o
+        return _instantiate_notation(self.pattern, self.inst)
 
-    def evar_is_free(self, name: int) -> bool:
-        return self.pattern.evar_is_free(name) or any(value.evar_is_free(name) for value in self.inst.values())
+    def _normalize(self) -> Pattern:
+        return self.simplify().normalize()
 
-    def metavars(self) -> set[int]:
+    def _collect_metavars(self) -> frozenset[int]:
         ret: set[int] = set()
-        for v in self.pattern.metavars():
+        for v in self.pattern._metavars:
             if v in self.inst:
-                ret = ret.union(self.inst[v].metavars())
+                ret.update(self.inst[v]._metavars)
             else:
                 ret.add(v)
-        return ret
+        return frozenset(ret)
+
+    def _collect_notation_free(self, children: list[Pattern]) -> bool:
+        return False
+
+    def _collect_subst_normal(self, children: list[Pattern]) -> bool:
+        return self.pattern._subst_normal and all(v._subst_normal for v in self.inst.values())
+
+    def _collect_subst_free(self, children: list[Pattern]) -> bool:
+        return False
+
+    def _collect_instantiable(self, children: list[Pattern]) -> frozenset[int]:
+        ret = self.pattern._instantiable.difference(self.inst)
+        return ret.union(*(v._instantiable for v in self.inst.values()))
+
+    def _collect_fresh_evars(self) -> FreshVars:
+        fresh = self.pattern._fresh_evars
+        for value in self.inst.values():
+            fresh = fresh | value._fresh_evars
+        return fresh
+
+    def _collect_fresh_svars(self) -> FreshVars:
+        fresh = self.pattern._fresh_svars
+        for value in self.inst.values():
+            fresh = fresh | value._fresh_svars
+        return fresh
+
+    def svar_is_positive(self, name: int) -> bool:
+        return self.simplify().svar_is_positive(name)
+
+    def svar_is_negative(self, name: int) -> bool:
+        return self.simplify().svar_is_negative(name)
 
     def instantiate(self, delta: Mapping[int, Pattern]) -> Pattern:
+        if self._unaffected_by(delta):
+            return self
         instantiated_subst = frozendict({k: v.instantiate(delta) for k, v in self.inst.items()})
         unshadowed_delta = {k: v for k, v in delta.items() if k not in self.inst}
         return Instantiate(self.pattern.instantiate(unshadowed_delta), instantiated_subst)
@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from proof_generation.deserialize import DeserializingException
+from proof_generation.instruction import FORMAT_MARKER, VARINT_VERSION, Encoding, Instruction, write_varint
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    # An instruction is its opcode followed by its operands, as written by the serializer
+    Code = tuple[int, ...]
+    # Phase and index of an instruction
+    Location = tuple[int, int]
+
+PHASE_SUFFIXES = ('.ml-gamma', '.ml-claim', '.ml-proof')
+
+_ONE_OPERAND = frozenset(
+    {
+        Instruction.EVar,
+        Instruction.SVar,
+        Instruction.Symbol,
+        Instruction.Mu,
+        Instruction.Exists,
+        Instruction.CleanMetaVar,
+        Instruction.ESubst,
+        Instruction.SSubst,
+        Instruction.Generalization,
+        Instruction.Load,
+    }
+)
+
+# Number of stack entries consumed by the instructions that push their result
+_ARITY = {
+    Instruction.EVar: 0,
+    Instruction.SVar: 0,
+    Instruction.Symbol: 0,
+    Instruction.MetaVar: 0,
+    Instruction.CleanMetaVar: 0,
+    Instruction.Prop1: 0,
+    Instruction.Prop2: 0,
+    Instruction.Prop3: 0,
+    Instruction.Quantifier: 0,
+    Instruction.Load: 0,
+    Instruction.Mu: 1,
+    Instruction.Exists: 1,
+    Instruction.Generalization: 1,
+    Instruction.Implies: 2,
+    Instruction.App: 2,
+    Instruction.ESubst: 2,
+    Instruction.SSubst: 2,
+    Instruction.ModusPonens: 2,
+}
+
+
+def decode(data: bytes) -> tuple[Encoding, list[Code]]:
+    """Split a binary proof file into its instructions."""
+    encoding = Encoding.Byte
+    index = 0
+
+    def operand(what: str) -> int:
+        nonlocal index
+        ret = 0
+        shift = 0
+        while True:
+            try:
+                byte = data[index]
+            except IndexError:
+                raise DeserializingException(f'Expected {what}.') from None
+            index += 1
+            if encoding is Encoding.Byte:
+                return byte
+            ret |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                return ret
+
+    def operands(what: str) -> list[int]:
+        length = operand(f'length of {what}')
+        return [length, *(operand(what) for _ in range(length))]
+
+    if len(data) and data[0] == FORMAT_MARKER:
+        index = 1
+        if (version := operand('format version')) != VARINT_VERSION:
+            raise DeserializingException(f'Unsupported format version: {version}')
+        encoding = Encoding.Varint
+
+    code: list[Code] = []
+    while index < len(data):
+        opcode = data[index]
+        index += 1
+        if opcode in _ONE_OPERAND:
+            code.append((opcode, operand(f'operand of {Instruction(opcode).name}')))
+        elif opcode == Instruction.MetaVar:
+            id = operand('MetaVar id')
+            lists = ('e_fresh', 's_fresh', 'positive', 'negative', 'app_ctxt_holes')
+            code.append((opcode, id, *(value for what in lists for value in operands(what))))
+        elif opcode == Instruction.Instantiate:
+            code.append((opcode, *operands('instantiation indices')))
+        elif opcode in _ARITY or opcode in (Instruction.Pop, Instruction.Save, Instruction.Publish):
+            code.append((opcode,))
+        else:
+            raise DeserializingException(f'Unknown instruction: {opcode}')
+    return encoding, code
+
+
+def encode(encoding: Encoding, code: Iterable[Code]) -> bytes:
+    out = bytearray(encoding.header)
+    for opcode, *operands in code:
+        out.append(opcode)
+        for operand in operands:
+            if encoding is Encoding.Byte:
+                out.append(operand)
+            else:
+                write_varint(out, operand)
+    return bytes(out)
+
+
+class _Analysis:
+    """Executes the three phases of a proof symbolically.
+    Terms are numbered by the instructions building them and the numbers of their
+    parts, so that equal numbers are equal terms for the checker. Each stack entry
+    also records the instruction that pushed it, which gives the instructions used
+    to build each term and the entries that are never used.
+    """
+
+    def __init__(self, phases: list[list[Code]]) -> None:
+        self._terms: dict[tuple[object, ...], int] = {}
+        # Term, and the `Save` storing it unless it is an axiom, of each memory slot
+        self.memory: list[int] = []
+        self.saves: list[Location | None] = []
+        self.loads: dict[Location, int] = {}
+        # Entries consumed by each instruction, and the entry at the top of the stack when saving
+        self.inputs: dict[Location, list[Location]] = {}
+        self.peeks: dict[Location, Location] = {}
+        # Entries that are popped or left on the stack, and the `Pop` removing them
+        self.unused: list[tuple[Location, Location | None]] = []
+        self.pops: dict[Location, int] = {}
+
+        for phase, code in enumerate(phases):
+            self._execute(phase, code)
+
+    def _term(self, key: tuple[object, ...]) -> int:
+        return self._terms.setdefault(key, len(self._terms))
+
+    def _execute(self, phase: int, code: list[Code]) -> None:
+        stack: list[tuple[Location, int]] = []
+        for index, instruction in enumerate(code):
+            location = (phase, index)
+            opcode = instruction[0]
+            try:
+                if opcode == Instruction.Load:
+                    slot = instruction[1]
+                    self.loads[location] = slot
+                    stack.append((location, self.memory[slot]))
+                elif opcode in _ARITY:
+                    arity = _ARITY[Instruction(opcode)]
+                    consumed = stack[len(stack) - arity :] if arity else []
+                    if len(consumed) < arity:
+                        raise IndexError
+                    del stack[len(stack) - arity :]
+                    self.inputs[location] = [entry for entry, _ in consumed]
+                    term = self._term((instruction, *(term for _, term in consumed)))
+                    stack.append((location, term))
+                elif opcode == Instruction.Instantiate:
+                    target_entry, target = stack.pop()
+                    arity = instruction[1]
+                    plugs = stack[len(stack) - arity :] if arity else []
+                    if len(plugs) < arity:
+                        raise IndexError
+                    del stack[len(stack) - arity :]
+                    self.inputs[location] = [target_entry, *(entry for entry, _ in plugs)]
+                    term = target if not arity else self._term((instruction, target, *(term for _, term in plugs)))
+                    stack.append((location, term))
+                elif opcode == Instruction.Pop:
+                    entry, term = stack.pop()
+                    self.unused.append((entry, location))
+                    self.pops[location] = term
+                elif opcode == Instruction.Save:
+                    entry, term = stack[-1]
+                    self.peeks[location] = entry
+                    self.memory.append(term)
+                    self.saves.append(location)
+                elif opcode == Instruction.Publish:
+                    _, term = stack.pop()
+                    if phase == 0:
+                        self.memory.append(self._term(('axiom', term)))
+                        self.saves.append(None)
+            except IndexError:
+                raise DeserializingException(
+                    f'Invalid stack or memory access by {Instruction(opcode).name} at {location}.'
+                ) from None
+        self.unused.extend((entry, None) for entry, _ in stack)
+
+    def built_by(self, entry: Location) -> list[Location]:
+        """The instructions building the term of a stack entry."""
+        ret = []
+        pending = [entry]
+        while pending:
+            location = pending.pop()
+            ret.append(location)
+            pending.extend(self.inputs.get(location, ()))
+        return ret
+
+
+def _optimize_once(phases: list[list[Code]]) -> bool:
+    analysis = _Analysis(phases)
+    removed: set[Location] = set()
+
+    # Saves of terms in memory already are redundant, their loads use the first copy instead
+    first_slot: dict[int, int] = {}
+    canonical = [first_slot.setdefault(term, slot) for slot, term in enumerate(analysis.memory)]
+    loaded = {canonical[slot] for slot in analysis.loads.values()}
+    for slot, save in enumerate(analysis.saves):
+        if save is not None and (canonical[slot] != slot or slot not in loaded):
+            removed.add(save)
+    live_peeks = {entry for save, entry in analysis.peeks.items() if save not in removed}
+
+    # Terms that are never used are not built, unless they are saved
+    for entry, pop in analysis.unused:
+        built_by = analysis.built_by(entry)
+        if not live_peeks.isdisjoint(built_by):
+            continue
+        removed.update(built_by)
+        if pop is not None:
+            removed.add(pop)
+
+    for location, instruction in ((location, phases[location[0]][location[1]]) for location in analysis.inputs):
+        # Instantiating nothing leaves the term as it is
+        if instruction == (Instruction.Instantiate, 0):
+            removed.add(location)
+
+    # Loading the term that was just popped keeps it on the stack
+    for (phase, index), term in analysis.pops.items():
+        load = (phase, index + 1)
+        if (
+            load in analysis.loads
+            and analysis.memory[analysis.loads[load]] == term
+            and (phase, index) not in removed
+            and load not in removed
+        ):
+            removed.update(((phase, index), load))
+
+    if not removed:
+        return False
+
+    new_slot: dict[int, int] = {}
+    for slot, save in enumerate(analysis.saves):
+        if save is None or save not in removed:
+            new_slot[slot] = len(new_slot)
+    for phase, code in enumerate(phases):
+        phases[phase] = [
+            (
+                (Instruction.Load, new_slot[canonical[analysis.loads[(phase, index)]]])
+                if (phase, index) in analysis.loads
+                else instruction
+            )
+            for index, instruction in enumerate(code)
+            if (phase, index) not in removed
+        ]
+    return True
+
+
+def optimize(gamma: bytes, claims: bytes, proof: bytes) -> tuple[bytes, bytes, bytes]:
+    """Shrink a binary proof without changing what it proves. Instructions building terms
+    that are never used are removed, along with redundant saves, pops of terms that are
+    loaded again right away, and instantiations of nothing. The memory is renumbered
+    across the three phases, which share it, so they are optimized together.
+    """
+    decoded = [decode(data) for data in (gamma, claims, proof)]
+    phases = [code for _, code in decoded]
+    while _optimize_once(phases):
+        pass
+    optimized = tuple(encode(encoding, code) for (encoding, _), code in zip(decoded, phases, strict=True))
+    return optimized[0], optimized[1], optimized[2]
+
+
+def optimize_files(gamma: Path, claims: Path, proof: Path, output_dir: Path) -> None:
+    """Write the optimized gamma, claim and proof files into `output_dir`, under the same names."""
+    optimized = optimize(gamma.read_bytes(), claims.read_bytes(), proof.read_bytes())
+    for path, data in zip((gamma, claims, proof), optimized, strict=True):
+        (output_dir / path.name).write_bytes(data)
+
+
+def main(argv: list[str]) -> None:
+    argparser = ArgumentParser(description='Remove redundant instructions from a binary proof')
+    argparser.add_argument('gamma', type=Path, help='The .ml-gamma file')
+    argparser.add_argument('claims', type=Path, help='The .ml-claim file')
+    argparser.add_argument('proof', type=Path, help='The .ml-proof file')
+    argparser.add_argument('output_dir', type=Path, help='The directory of the optimized files')
+    args = argparser.parse_args(argv)
+
+    inputs = (args.gamma, args.claims, args.proof)
+    outputs = tuple(args.output_dir / path.name for path in inputs)
+    if any(output.resolve() == path.resolve() for path, output in zip(inputs, outputs, strict=True)):
+        argparser.error('The output directory must not hold the input files')
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    optimize_files(*inputs, args.output_dir)
+    for path, output in zip(inputs, outputs, strict=True):
+        before, after = (len(decode(file.read_bytes())[1]) for file in (path, output))
+        print(f'{output}: {before} -> {after} instructions, {path.stat().st_size} -> {output.stat().st_size} bytes')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
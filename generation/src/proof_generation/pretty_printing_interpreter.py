@@ -23,8 +23,9 @@ class PrettyPrintingInterpreter(IOInterpreter):
         claim_out: TextIO | None = None,
         proof_out: TextIO | None = None,
         pretty_options: PrettyOptions | None = None,
+        trusted: bool = False,
     ) -> None:
-        super().__init__(phase=phase, out=out, claims=claims, claim_out=claim_out, proof_out=proof_out)
+        super().__init__(phase=phase, out=out, claims=claims, claim_out=claim_out, proof_out=proof_out, trusted=trusted)
         self.pretty_options = pretty_options if pretty_options else PrettyOptions()
 
     @staticmethod
@@ -163,7 +164,7 @@ class PrettyPrintingInterpreter(IOInterpreter):
         self.out.write('Load ')
         self.out.write(id)
         self.out.write('=')
-        self.out.write(str(self.memory.index(term)))
+        self.out.write(str(self.memory_slot(term)))
 
     @pretty(print_stack=False)
     def publish_proof(self, proved: Proved) -> None:
@@ -3,22 +3,28 @@ from __future__ import annotations
 from argparse import ArgumentParser
 from enum import Enum
 from pathlib import Path
-from typing import TYPE_CHECKING, TypeVar
+from typing import TYPE_CHECKING, Generic, TypeVar, overload
 
+from proof_generation.basic_interpreter import BasicInterpreter
 from proof_generation.claim import Claim
 from proof_generation.counting_interpreter import CountingInterpreter
+from proof_generation.deserialize import deserialize_files
+from proof_generation.instruction import Encoding
 from proof_generation.interpreter import ExecutionPhase
-from proof_generation.optimizing_interpreters import MemoizingInterpreter
-from proof_generation.pattern import ESubst, EVar, Exists, Implies, PrettyOptions, bot, phi0, phi1, phi2
+from proof_generation.liveness_interpreter import allocate_memory
+from proof_generation.optimizing_interpreters import MemoizingInterpreter, ProofCachingInterpreter
+from proof_generation.pattern import ESubst, EVar, Exists, Implies, Pattern, PrettyOptions, bot, phi0, phi1, phi2
 from proof_generation.pretty_printing_interpreter import PrettyPrintingInterpreter
 from proof_generation.proved import Proved
-from proof_generation.serializing_interpreter import SerializingInterpreter
+from proof_generation.serializing_interpreter import CHUNK_SIZE, SerializingInterpreter
+from proof_generation.tracing_interpreter import TracingInterpreter
 
 if TYPE_CHECKING:
-    from collections.abc import Callable
+    from collections.abc import Callable, Hashable, Iterable, Iterator
 
     from proof_generation.interpreter import Interpreter
-    from proof_generation.pattern import Notation, Pattern
+    from proof_generation.optimizing_interpreters import ProofCacheInfo
+    from proof_generation.pattern import Notation
     from proof_generation.serializing_interpreter import IOInterpreter
 
 
@@ -27,30 +33,98 @@ class OutputFormat(str, Enum):
     Pretty = 'pretty'
 
 
+T = TypeVar('T')
+
+
+class IndexedList(Generic[T]):
+    """A list that also maps its items to their first index, so that membership tests and
+    lookups of indices are hashed instead of scanning the list.
+    Patterns are indexed by their normal form, to keep list membership modulo notation.
+    """
+
+    def __init__(self, items: Iterable[T] = ()) -> None:
+        self._items: list[T] = []
+        self._indices: dict[Hashable, int] = {}
+        self.extend(items)
+
+    @staticmethod
+    def _key(item: T) -> Hashable:
+        return item.normalize() if isinstance(item, Pattern) else item
+
+    def append(self, item: T) -> None:
+        self._indices.setdefault(self._key(item), len(self._items))
+        self._items.append(item)
+
+    def extend(self, items: Iterable[T]) -> None:
+        for item in items:
+            self.append(item)
+
+    def index(self, item: T) -> int:
+        try:
+            return self._indices[self._key(item)]
+        except KeyError:
+            raise ValueError(f'{item} is not in the list') from None
+
+    def __contains__(self, item: object) -> bool:
+        return self._key(item) in self._indices  # type: ignore
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self._items)
+
+    def __reversed__(self) -> Iterator[T]:
+        return reversed(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @overload
+    def __getitem__(self, i: int) -> T: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> list[T]: ...
+
+    def __getitem__(self, i: int | slice) -> T | list[T]:
+        return self._items[i]
+
+    def __eq__(self, o: object) -> bool:
+        if isinstance(o, IndexedList):
+            return self._items == o._items
+        return self._items == o
+
+    def __repr__(self) -> str:
+        return f'IndexedList({self._items!r})'
+
+
 # Proof Expressions
 # =================
 
 
 class ProofThunk:
+    """A proof expression of the conclusion `conc`. The conclusion of a lemma may be
+    provided by the interpreter instead, for example by loading it once proved already.
+    """
+
     _expr: Callable[[Interpreter], Proved]
     conc: Pattern
+    lemma: bool
 
-    def __init__(self, expr: Callable[[Interpreter], Proved], conc: Pattern):
+    def __init__(self, expr: Callable[[Interpreter], Proved], conc: Pattern, lemma: bool = False):
         self._expr = expr
         self.conc = conc
+        self.lemma = lemma
 
     def __call__(self, interpreter: Interpreter) -> Proved:
-        proved = self._expr(interpreter)
-        # TODO Check is this call to equality is causing performance issues
-        assert proved.conclusion == self.conc
+        proved = interpreter.proof(self.conc, self._expr) if self.lemma else self._expr(interpreter)
+        if not interpreter.trusted:
+            assert proved.conclusion == self.conc
         return proved
 
 
 class ProofExp:
-    _axioms: list[Pattern]
+    _axioms: IndexedList[Pattern]
     _notations: list[Notation]
-    _claims: list[Pattern]
-    _proof_expressions: list[ProofThunk]
+    _claims: IndexedList[Pattern]
+    _proof_expressions: IndexedList[ProofThunk]
 
     _submodules: list[ProofExp]
 
@@ -61,10 +135,10 @@ class ProofExp:
         claims: list[Pattern] | None = None,
         proof_expressions: list[ProofThunk] | None = None,
     ) -> None:
-        self._axioms = [] if axioms is None else axioms
+        self._axioms = IndexedList(axioms or ())
         self._notations = [] if notations is None else notations
-        self._claims = [] if claims is None else claims
-        self._proof_expressions = [] if proof_expressions is None else proof_expressions
+        self._claims = IndexedList(claims or ())
+        self._proof_expressions = IndexedList(proof_expressions or ())
         self._submodules = []
 
     def add_axiom(self, axiom: Pattern) -> None:
@@ -136,7 +210,7 @@ class ProofExp:
                 delta[idn] = interpreter.pattern(p)
             return interpreter.instantiate(pf(interpreter), delta)
 
-        return ProofThunk(proved_exp, pf.conc.instantiate(delta))
+        return ProofThunk(proved_exp, pf.conc.instantiate(delta), lemma=True)
 
     def prop1(self) -> ProofThunk:
         return ProofThunk((lambda interpreter: interpreter.prop1()), Implies(phi0, Implies(phi1, phi0)))
@@ -155,7 +229,9 @@ class ProofExp:
     def modus_ponens(self, left: ProofThunk, right: ProofThunk) -> ProofThunk:
         p, q = Implies.extract(left.conc)
         assert p == right.conc
-        return ProofThunk((lambda interpreter: interpreter.modus_ponens(left(interpreter), right(interpreter))), q)
+        return ProofThunk(
+            (lambda interpreter: interpreter.modus_ponens(left(interpreter), right(interpreter))), q, lemma=True
+        )
 
     def exists_quantifier(self) -> ProofThunk:
         x = EVar(0)
@@ -169,11 +245,14 @@ class ProofExp:
         return ProofThunk(
             (lambda interpreter: interpreter.exists_generalization(proved(interpreter), var)),
             Implies(Exists(var.name, l), r),
+            lemma=True,
         )
 
     def instantiate(self, proved: ProofThunk, delta: dict[int, Pattern]) -> ProofThunk:
         return ProofThunk(
-            (lambda interpreter: interpreter.instantiate(proved(interpreter), delta)), proved.conc.instantiate(delta)
+            (lambda interpreter: interpreter.instantiate(proved(interpreter), delta)),
+            proved.conc.instantiate(delta),
+            lemma=True,
         )
 
     def load_axiom(self, axiom_term: Pattern) -> ProofThunk:
@@ -242,6 +321,8 @@ class ProofExp:
         phase: ExecutionPhase,
         claims: list[Claim],
         file_path: Path,
+        encoding: Encoding = Encoding.Byte,
+        trusted: bool = False,
     ) -> IOInterpreter:
         serializer: IOInterpreter
         match output_format:
@@ -252,6 +333,9 @@ class ProofExp:
                     out=open(file_path.with_suffix('.ml-gamma'), 'wb'),
                     claim_out=open(file_path.with_suffix('.ml-claim'), 'wb'),
                     proof_out=open(file_path.with_suffix('.ml-proof'), 'wb'),
+                    chunk_size=CHUNK_SIZE,
+                    encoding=encoding,
+                    trusted=trusted,
                 )
             case OutputFormat.Pretty:
                 serializer = PrettyPrintingInterpreter(
@@ -261,20 +345,59 @@ class ProofExp:
                     claim_out=open(file_path.with_suffix('.pretty-claim'), 'w'),
                     proof_out=open(file_path.with_suffix('.pretty-proof'), 'w'),
                     pretty_options=self.pretty_options(),
+                    trusted=trusted,
                 )
         return serializer
 
     # TODO: Implement the optimization pipeline specified in Issue #374
     # TODO: add InstantiationOptimizer
-    def serialize(self, file_path: Path, output_format: OutputFormat, optimize: bool) -> None:
+    def serialize(
+        self,
+        file_path: Path,
+        output_format: OutputFormat,
+        optimize: bool,
+        encoding: Encoding = Encoding.Byte,
+        trusted: bool = False,
+    ) -> list[ProofCacheInfo]:
+        """Write out the proof. Trusted serialization skips the checks of the proof steps
+        and of the stack while generating, and relies on `verify` to check the output.
+        Optimized proofs load the conclusions proved already, and the statistics of
+        these loads are returned for each published proof.
+        """
         claims = [Claim(claim) for claim in self._claims]
-        serializer = self.get_serializing_interpreter(output_format, ExecutionPhase.Gamma, claims, file_path)
+        serializer = self.get_serializing_interpreter(
+            output_format, ExecutionPhase.Gamma, claims, file_path, encoding, trusted
+        )
+        statistics: list[ProofCacheInfo] = []
         if optimize:
-            analyzer = CountingInterpreter(ExecutionPhase.Gamma, claims)
-            self.execute_full(analyzer)
-            self.execute_full(MemoizingInterpreter(serializer, analyzer.finalize()))
+            # The proof is executed once, and the recorded calls are replayed on the serializer once planned
+            analyzer = CountingInterpreter(ExecutionPhase.Gamma, claims, encoding.max_memory_slots, trusted)
+            tracer = TracingInterpreter(analyzer)
+            self.execute_full(tracer)
+            # Conclusions proved again are loaded instead, and they get a quarter of the memory at most
+            cached = tracer.repeated_proofs(encoding.max_memory_slots // 4)
+            if cached:
+                # Patterns are only counted where the proofs building them are not loaded instead
+                analyzer = CountingInterpreter(ExecutionPhase.Gamma, claims, encoding.max_memory_slots, True)
+                tracer.replay(ProofCachingInterpreter(analyzer, cached))
+            suggested = allocate_memory(tracer, analyzer, claims, cached_proofs=cached)
+            cache = ProofCachingInterpreter(MemoizingInterpreter(serializer, suggested), cached)
+            tracer.replay(cache)
+            statistics = cache.statistics
         else:
             self.execute_full(serializer)
+        serializer.flush()
+        return statistics
+
+    @staticmethod
+    def verify(file_path: Path) -> None:
+        """Check a binary proof offline by replaying it on the Python interpreter."""
+        deserialize_files(
+            file_path.with_suffix('.ml-gamma'),
+            file_path.with_suffix('.ml-claim'),
+            file_path.with_suffix('.ml-proof'),
+            BasicInterpreter(ExecutionPhase.Gamma),
+        )
 
     def main(self, argv: list[str]) -> None:
         argparser = ArgumentParser(
@@ -296,11 +419,39 @@ class ProofExp:
         argparser.add_argument(
             '--optimize', action='store_true', default=False, help='Optimize the proof before serializing it to output'
         )
+        argparser.add_argument(
+            '--encoding',
+            type=Encoding,
+            default=Encoding.Byte,
+            help='The operand encoding of binary proofs, varint lifts the limit of 256 ids and memory slots',
+        )
+        argparser.add_argument(
+            '--trusted',
+            action='store_true',
+            default=False,
+            help='Skip the checks of the proof while generating it, and check the binary output offline instead',
+        )
+        argparser.add_argument(
+            '--verify',
+            action='store_true',
+            default=False,
+            help='Check the binary proof by replaying it on the Python interpreter once written',
+        )
         args = argparser.parse_args(argv)
+        # Nothing would check the proof otherwise
+        if args.trusted and args.output_format != OutputFormat.Binary:
+            argparser.error('Only binary proofs can be verified, so --trusted requires the binary output format')
 
         output_dir = Path(args.output_dir)
         if not output_dir.exists():
             print('Creating output directory...')
             output_dir.mkdir()
 
-        self.serialize(output_dir / args.slice_name, args.output_format, args.optimize)
+        file_path = output_dir / args.slice_name
+        statistics = self.serialize(file_path, args.output_format, args.optimize, args.encoding, args.trusted)
+        for i, info in enumerate(statistics):
+            if info.hits:
+                print(f'Proof {i}: {info.hits} lemmas loaded from memory, replacing {info.served} proof steps')
+        # Trusted proofs are only checked here
+        if (args.verify or args.trusted) and args.output_format == OutputFormat.Binary:
+            self.verify(file_path)
@@ -1,9 +1,9 @@
 from __future__ import annotations
 
 import sys
-from functools import cache
 from typing import TYPE_CHECKING
 
+from proof_generation.caching import bounded_cache
 from proof_generation.pattern import App, EVar, Exists, Instantiate, MetaVar, Notation, Symbol, _and, _or, bot, neg
 from proof_generation.proof import ProofExp
 from proof_generation.proofs.definedness import Definedness, ceil, subset
@@ -26,7 +26,7 @@ kore_kseq_symbol = Symbol('kore_kseq')
 in_sort = Notation('in-sort', 2, subset(phi0, App(inhabitant_symbol, phi1)), '{0}:{1}')
 
 
-@cache
+@bounded_cache(maxsize=2**10)
 def sorted_exists(var: int) -> Notation:
     """sorted_exists(inner_sort, pattern)"""
     # TODO: It is not included in any KORE.notations
@@ -82,7 +82,7 @@ kore_in = Notation('kore-in', 4, kore_floor(phi0, phi1, kore_implies(phi0, phi2,
 kore_bottom = Notation('kore-bottom', 1, bot(), 'k⊥')
 
 
-@cache
+@bounded_cache(maxsize=2**10)
 def kore_exists(var: int) -> Notation:
     """kore_exists(inner_sort, outer_sort, pattern)"""
     return Notation(
@@ -93,9 +93,9 @@ def kore_exists(var: int) -> Notation:
     )
 
 
-# We can do that without worrying about the memory leaking because all notations are saved in the ProofExp object anyway.
-# Note that @cache is required here as we have to return the same objects for the same arguments for notation comparisons
-@cache
+# The cache returns the same objects for the same arguments, which keeps notation comparisons cheap.
+# A notation rebuilt after its eviction is still equal to the previous one, as its definition is interned.
+@bounded_cache(maxsize=2**12)
 def nary_app(symbol: Symbol, n: int, cell: bool = False) -> Notation:
     """Constructs an nary application."""
     p: Pattern = symbol
@@ -113,7 +113,7 @@ def nary_app(symbol: Symbol, n: int, cell: bool = False) -> Notation:
     return Notation(symbol.name, n, p, fmt)
 
 
-@cache
+@bounded_cache(maxsize=2**16)
 def deconstruct_nary_application(p: Pattern) -> tuple[Pattern, tuple[Pattern, ...]]:
     match p:
         case Instantiate(_, _):
@@ -126,7 +126,7 @@ def deconstruct_nary_application(p: Pattern) -> tuple[Pattern, tuple[Pattern, ..
             return p, ()
 
 
-@cache
+@bounded_cache(maxsize=2**12)
 def deconstruct_equality_rule(pattern: Pattern) -> tuple[Pattern, Pattern, Pattern, Pattern, Pattern]:
     _, requires, imp_right = kore_implies.assert_matches(pattern)
     _, _, eq_left, eq_right_and_ensures = kore_equals.assert_matches(imp_right)
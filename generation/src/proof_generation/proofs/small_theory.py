@@ -18,9 +18,9 @@ class SmallTheory(ProofExp):
         symbol0_implies_symbol1 = Implies(Symbol('s0'), Symbol('s1'))
         symbol1_implies_symbol2 = Implies(Symbol('s1'), Symbol('s2'))
         symbol0_implies_symbol2 = Implies(Symbol('s0'), Symbol('s2'))
-        self._axioms = [symbol0_implies_symbol1, symbol1_implies_symbol2]
-        self._claims = [symbol0_implies_symbol2]
-        self._proof_expressions = [self.sym0_implies_sym2_proof()]
+        self.add_axioms([symbol0_implies_symbol1, symbol1_implies_symbol2])
+        self.add_claim(symbol0_implies_symbol2)
+        self.add_proof_expression(self.sym0_implies_sym2_proof())
 
     def sym0_implies_sym1(self) -> ProofThunk:
         return self.load_axiom_by_index(0)
@@ -7,6 +7,10 @@ if TYPE_CHECKING:
     from proof_generation.pattern import Pattern
 
 
+class VerificationError(Exception):
+    """A proof step whose side conditions do not hold, or whose conclusion is not the expected one."""
+
+
 #  TODO Get rif of this wrapper type
 @dataclass
 class Proved:
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING, Any
 
-from proof_generation.instruction import Instruction
+from proof_generation.instruction import Encoding, Instruction, write_varint
 from proof_generation.io_interpreter import IOInterpreter
 
 if TYPE_CHECKING:
@@ -14,8 +14,18 @@ if TYPE_CHECKING:
     from proof_generation.pattern import ESubst, EVar, MetaVar, Pattern, SSubst, SVar
     from proof_generation.proved import Proved
 
+# Size of the chunks in which buffered proofs are written out
+CHUNK_SIZE = 1 << 20
+
 
 class SerializingInterpreter(IOInterpreter):
+    """Serializes the proof into its binary format.
+    Instructions are accumulated into a buffer, which is written out once it
+    grows over `chunk_size` bytes and whenever the output is flushed.
+    By default every instruction is written out immediately.
+    Each output starts with the header of the operand `encoding`.
+    """
+
     def __init__(
         self,
         phase: ExecutionPhase,
@@ -23,18 +33,58 @@ class SerializingInterpreter(IOInterpreter):
         claims: list[Claim] | None = None,
         claim_out: IO[Any] | None = None,
         proof_out: IO[Any] | None = None,
+        check_stack: bool = True,
+        chunk_size: int = 0,
+        encoding: Encoding = Encoding.Byte,
+        trusted: bool = False,
     ) -> None:
-        super().__init__(phase, out, claims, claim_out, proof_out)
+        self._buffer = bytearray(encoding.header)
+        self._chunk_size = chunk_size
+        self.encoding = encoding
+        super().__init__(phase, out, claims, claim_out, proof_out, check_stack, trusted)
         self._symbol_identifiers: dict[str, int] = {}
 
+    def _write(self, *instruction: int) -> None:
+        if self.encoding is Encoding.Byte:
+            try:
+                self._buffer.extend(instruction)
+            except ValueError:
+                raise ValueError(
+                    f'Operands of {Instruction(instruction[0]).name} do not fit into a byte: {instruction[1:]}. '
+                    'Use the varint encoding instead.'
+                ) from None
+        else:
+            opcode, *operands = instruction
+            self._buffer.append(opcode)
+            for operand in operands:
+                write_varint(self._buffer, operand)
+        if len(self._buffer) >= self._chunk_size:
+            self._write_buffer()
+
+    def _write_buffer(self) -> None:
+        self.out.write(self._buffer)
+        self._buffer.clear()
+
+    def flush(self) -> None:
+        self._write_buffer()
+        super().flush()
+
+    def into_claim_phase(self) -> None:
+        super().into_claim_phase()
+        self._buffer.extend(self.encoding.header)
+
+    def into_proof_phase(self) -> None:
+        super().into_proof_phase()
+        self._buffer.extend(self.encoding.header)
+
     def evar(self, id: int) -> Pattern:
         ret = super().evar(id)
-        self.out.write(bytes([Instruction.EVar, id]))
+        self._write(Instruction.EVar, id)
         return ret
 
     def svar(self, id: int) -> Pattern:
         ret = super().svar(id)
-        self.out.write(bytes([Instruction.SVar, id]))
+        self._write(Instruction.SVar, id)
         return ret
 
     def symbol(self, name: str) -> Pattern:
@@ -43,7 +93,7 @@ class SerializingInterpreter(IOInterpreter):
         if name not in self._symbol_identifiers:
             self._symbol_identifiers[name] = len(self._symbol_identifiers)
         id = self._symbol_identifiers[name]
-        self.out.write(bytes([Instruction.Symbol, id]))
+        self._write(Instruction.Symbol, id)
         return ret
 
     def metavar(
@@ -60,105 +110,108 @@ class SerializingInterpreter(IOInterpreter):
 
         if sum([len(list) for list in lists]) == 0:
             # If all arrays are empty, metavar is "clean", we use a more succint instruction
-            self.out.write(bytes([Instruction.CleanMetaVar, id]))
+            self._write(Instruction.CleanMetaVar, id)
         else:
-            self.out.write(bytes([Instruction.MetaVar, id]))
+            operands: list[int] = []
             for list in lists:
-                self.out.write(bytes([len(list), *[var.name for var in list]]))
+                operands.extend([len(list), *[var.name for var in list]])
+            self._write(Instruction.MetaVar, id, *operands)
         return ret
 
     def implies(self, left: Pattern, right: Pattern) -> Pattern:
         ret = super().implies(left, right)
-        self.out.write(bytes([Instruction.Implies]))
+        self._write(Instruction.Implies)
         return ret
 
     def app(self, left: Pattern, right: Pattern) -> Pattern:
         ret = super().app(left, right)
-        self.out.write(bytes([Instruction.App]))
+        self._write(Instruction.App)
         return ret
 
     def exists(self, var: int, subpattern: Pattern) -> Pattern:
         ret = super().exists(var, subpattern)
-        self.out.write(bytes([Instruction.Exists, var]))
+        self._write(Instruction.Exists, var)
         return ret
 
     def mu(self, var: int, subpattern: Pattern) -> Pattern:
         ret = super().mu(var, subpattern)
-        self.out.write(bytes([Instruction.Mu, var]))
+        self._write(Instruction.Mu, var)
         return ret
 
     def esubst(self, evar_id: int, pattern: MetaVar | ESubst | SSubst, plug: Pattern) -> Pattern:
         ret = super().esubst(evar_id, pattern, plug)
-        self.out.write(bytes([Instruction.ESubst, evar_id]))
+        self._write(Instruction.ESubst, evar_id)
         return ret
 
     def ssubst(self, svar_id: int, pattern: MetaVar | ESubst | SSubst, plug: Pattern) -> Pattern:
         ret = super().ssubst(svar_id, pattern, plug)
-        self.out.write(bytes([Instruction.SSubst, svar_id]))
+        self._write(Instruction.SSubst, svar_id)
         return ret
 
     def prop1(self) -> Proved:
         ret = super().prop1()
-        self.out.write(bytes([Instruction.Prop1]))
+        self._write(Instruction.Prop1)
         return ret
 
     def prop2(self) -> Proved:
         ret = super().prop2()
-        self.out.write(bytes([Instruction.Prop2]))
+        self._write(Instruction.Prop2)
         return ret
 
     def prop3(self) -> Proved:
         ret = super().prop3()
-        self.out.write(bytes([Instruction.Prop3]))
+        self._write(Instruction.Prop3)
         return ret
 
     def modus_ponens(self, left: Proved, right: Proved) -> Proved:
         ret = super().modus_ponens(left, right)
-        self.out.write(bytes([Instruction.ModusPonens]))
+        self._write(Instruction.ModusPonens)
         return ret
 
     def exists_quantifier(self) -> Proved:
         ret = super().exists_quantifier()
-        self.out.write(bytes([Instruction.Quantifier]))
+        self._write(Instruction.Quantifier)
         return ret
 
     def exists_generalization(self, proved: Proved, var: EVar) -> Proved:
         ret = super().exists_generalization(proved, var)
-        self.out.write(bytes([Instruction.Generalization, var.name]))
+        self._write(Instruction.Generalization, var.name)
         return ret
 
     def instantiate(self, proved: Proved, delta: dict[int, Pattern]) -> Proved:
         ret = super().instantiate(proved, delta)
-        self.out.write(bytes([Instruction.Instantiate, len(delta), *reversed(delta.keys())]))
+        self._write(Instruction.Instantiate, len(delta), *reversed(delta.keys()))
         return ret
 
     def instantiate_pattern(self, pattern: Pattern, delta: Mapping[int, Pattern]) -> Pattern:
         ret = super().instantiate_pattern(pattern, delta)
-        self.out.write(bytes([Instruction.Instantiate, len(delta), *reversed(delta.keys())]))
+        self._write(Instruction.Instantiate, len(delta), *reversed(delta.keys()))
         return ret
 
     def pop(self, term: Pattern | Proved) -> None:
         super().pop(term)
-        self.out.write(bytes([Instruction.Pop]))
+        self._write(Instruction.Pop)
 
     def save(self, id: str, term: Pattern | Proved) -> None:
         ret = super().save(id, term)
-        self.out.write(bytes([Instruction.Save]))
+        self._write(Instruction.Save)
         return ret
 
     def load(self, id: str, term: Pattern | Proved) -> None:
         ret = super().load(id, term)
-        self.out.write(bytes([Instruction.Load, self.memory.index(term)]))
+        slot = self.memory_slot(term)
+        assert slot is not None
+        self._write(Instruction.Load, slot)
         return ret
 
     def publish_proof(self, proved: Proved) -> None:
         super().publish_proof(proved)
-        self.out.write(bytes([Instruction.Publish]))
+        self._write(Instruction.Publish)
 
     def publish_axiom(self, axiom: Pattern) -> None:
         super().publish_axiom(axiom)
-        self.out.write(bytes([Instruction.Publish]))
+        self._write(Instruction.Publish)
 
     def publish_claim(self, pattern: Pattern) -> None:
         super().publish_claim(pattern)
-        self.out.write(bytes([Instruction.Publish]))
+        self._write(Instruction.Publish)
@@ -3,7 +3,7 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 from proof_generation.basic_interpreter import BasicInterpreter
-from proof_generation.proved import Proved
+from proof_generation.proved import Proved, VerificationError
 
 if TYPE_CHECKING:
     from collections.abc import Mapping
@@ -16,21 +16,36 @@ if TYPE_CHECKING:
 class StatefulInterpreter(BasicInterpreter):
     """A Proof interpreter that also keeps track of the verifier state,
     such as the memory, stack and claims remaining.
+    With `check_stack` disabled, the terms passed to each instruction are trusted
+    to be the ones on top of the stack and are not compared against it.
+    A trusted interpreter does not check the stack either, nor that the proofs
+    match the claims and that loaded terms are in the memory.
     """
 
-    claims: list[Claim]
     stack: list[Pattern | Proved]
     memory: list[Pattern | Proved]
+    # The first memory slot holding each term, see `_memory_key`
+    _memory_slots: dict[Pattern | tuple[Pattern], int]
 
     def __init__(
         self,
         phase: ExecutionPhase,
         claims: list[Claim] | None = None,
+        check_stack: bool = True,
+        trusted: bool = False,
     ) -> None:
-        super().__init__(phase=phase)
+        super().__init__(phase=phase, trusted=trusted)
         self.stack = []
         self.memory = []
-        self.claims = claims if claims else []
+        self._memory_slots = {}
+        self._claims = claims if claims else []
+        self._proved_claims = 0
+        self.check_stack = check_stack and not trusted
+
+    @property
+    def claims(self) -> list[Claim]:
+        """The claims remaining to be proved."""
+        return self._claims[self._proved_claims :]
 
     def into_claim_phase(self) -> None:
         self.stack = []
@@ -40,6 +55,23 @@ class StatefulInterpreter(BasicInterpreter):
         self.stack = []
         super().into_proof_phase()
 
+    def _drop(self, n: int) -> None:
+        del self.stack[len(self.stack) - n :]
+
+    @staticmethod
+    def _memory_key(term: Pattern | Proved) -> Pattern | tuple[Pattern]:
+        # Terms are equal when their normal forms are. Proofs are not hashable,
+        # and are told apart from patterns by wrapping their conclusion
+        return (term.conclusion.normalize(),) if isinstance(term, Proved) else term.normalize()
+
+    def _remember(self, term: Pattern | Proved) -> None:
+        self._memory_slots.setdefault(self._memory_key(term), len(self.memory))
+        self.memory.append(term)
+
+    def memory_slot(self, term: Pattern | Proved) -> int | None:
+        """The first memory slot holding the term, if any, without scanning the memory."""
+        return self._memory_slots.get(self._memory_key(term))
+
     def print_state(self) -> None:
         for i, item in enumerate(self.stack):
             print(i, item)
@@ -73,47 +105,69 @@ class StatefulInterpreter(BasicInterpreter):
         return ret
 
     def implies(self, left: Pattern, right: Pattern) -> Pattern:
-        *self.stack, expected_left, expected_right = self.stack
-        assert expected_left == left
-        assert expected_right == right
+        if self.check_stack:
+            expected_right = self.stack.pop()
+            expected_left = self.stack.pop()
+            assert expected_left == left
+            assert expected_right == right
+        else:
+            self._drop(2)
         ret = super().implies(left, right)
         self.stack.append(ret)
         return ret
 
     def app(self, left: Pattern, right: Pattern) -> Pattern:
-        *self.stack, expected_left, expected_right = self.stack
-        assert expected_left == left
-        assert expected_right == right
+        if self.check_stack:
+            expected_right = self.stack.pop()
+            expected_left = self.stack.pop()
+            assert expected_left == left
+            assert expected_right == right
+        else:
+            self._drop(2)
         ret = super().app(left, right)
         self.stack.append(ret)
         return ret
 
     def exists(self, var: int, subpattern: Pattern) -> Pattern:
-        *self.stack, expected_subpattern = self.stack
-        assert expected_subpattern == subpattern
+        if self.check_stack:
+            expected_subpattern = self.stack.pop()
+            assert expected_subpattern == subpattern
+        else:
+            self._drop(1)
         ret = super().exists(var, subpattern)
         self.stack.append(ret)
         return ret
 
     def mu(self, var: int, subpattern: Pattern) -> Pattern:
-        *self.stack, expected_subpattern = self.stack
-        assert expected_subpattern == subpattern
+        if self.check_stack:
+            expected_subpattern = self.stack.pop()
+            assert expected_subpattern == subpattern
+        else:
+            self._drop(1)
         ret = super().mu(var, subpattern)
         self.stack.append(ret)
         return ret
 
     def esubst(self, evar_id: int, pattern: MetaVar | ESubst | SSubst, plug: Pattern) -> Pattern:
-        *self.stack, expected_plug, expected_pattern = self.stack
-        assert expected_pattern == pattern
-        assert expected_plug == plug
+        if self.check_stack:
+            expected_pattern = self.stack.pop()
+            expected_plug = self.stack.pop()
+            assert expected_pattern == pattern
+            assert expected_plug == plug
+        else:
+            self._drop(2)
         ret = super().esubst(evar_id, pattern, plug)
         self.stack.append(ret)
         return ret
 
     def ssubst(self, svar_id: int, pattern: MetaVar | ESubst | SSubst, plug: Pattern) -> Pattern:
-        *self.stack, expected_plug, expected_pattern = self.stack
-        assert expected_pattern == pattern
-        assert expected_plug == plug
+        if self.check_stack:
+            expected_pattern = self.stack.pop()
+            expected_plug = self.stack.pop()
+            assert expected_pattern == pattern
+            assert expected_plug == plug
+        else:
+            self._drop(2)
         ret = super().ssubst(svar_id, pattern, plug)
         self.stack.append(ret)
         return ret
@@ -134,9 +188,13 @@ class StatefulInterpreter(BasicInterpreter):
         return ret
 
     def modus_ponens(self, left: Proved, right: Proved) -> Proved:
-        *self.stack, expected_left, expected_right = self.stack
-        assert expected_left == left, f'expected: {expected_left}\ngot: {left}'
-        assert expected_right == right, f'expected: {expected_right}\ngot: {right}'
+        if self.check_stack:
+            expected_right = self.stack.pop()
+            expected_left = self.stack.pop()
+            assert expected_left == left, f'expected: {expected_left}\ngot: {left}'
+            assert expected_right == right, f'expected: {expected_right}\ngot: {right}'
+        else:
+            self._drop(2)
         ret = super().modus_ponens(left, right)
         self.stack.append(ret)
         return ret
@@ -147,64 +205,79 @@ class StatefulInterpreter(BasicInterpreter):
         return ret
 
     def exists_generalization(self, proved: Proved, var: EVar) -> Proved:
-        *self.stack, expected = self.stack
-        assert expected == proved, f'expected: {expected}\ngot: {proved}'
+        if self.check_stack:
+            expected = self.stack.pop()
+            assert expected == proved, f'expected: {expected}\ngot: {proved}'
+        else:
+            self._drop(1)
         ret = super().exists_generalization(proved, var)
         self.stack.append(ret)
         return ret
 
     def instantiate(self, proved: Proved, delta: dict[int, Pattern]) -> Proved:
-        *self.stack, expected_proved = self.stack
-        expected_plugs = self.stack[-len(delta) :]
-        self.stack = self.stack[: -len(delta)]
-
-        assert expected_proved == proved, f'expected: {expected_proved}\ngot: {proved}'
-        assert expected_plugs == list(delta.values()), f'expected: {expected_plugs}\ngot: {list(delta.values())}'
+        if self.check_stack:
+            expected_proved = self.stack.pop()
+            expected_plugs = self.stack[len(self.stack) - len(delta) :]
+            self._drop(len(delta))
+
+            assert expected_proved == proved, f'expected: {expected_proved}\ngot: {proved}'
+            assert expected_plugs == list(delta.values()), f'expected: {expected_plugs}\ngot: {list(delta.values())}'
+        else:
+            self._drop(1 + len(delta))
         ret = super().instantiate(proved, delta)
         self.stack.append(ret)
         return ret
 
     def instantiate_pattern(self, pattern: Pattern, delta: Mapping[int, Pattern]) -> Pattern:
-        *self.stack, expected_pattern = self.stack
-        expected_plugs = []
-        if len(delta):
-            expected_plugs = self.stack[-len(delta) :]
-            self.stack = self.stack[: -len(delta)]
-
-        assert expected_pattern == pattern, f'expected: {expected_pattern}\ngot: {pattern}'
-        assert expected_plugs == list(delta.values()), f'expected: {expected_plugs}\ngot: {list(delta.values())}'
+        if self.check_stack:
+            expected_pattern = self.stack.pop()
+            expected_plugs = self.stack[len(self.stack) - len(delta) :]
+            self._drop(len(delta))
+
+            assert expected_pattern == pattern, f'expected: {expected_pattern}\ngot: {pattern}'
+            assert expected_plugs == list(delta.values()), f'expected: {expected_plugs}\ngot: {list(delta.values())}'
+        else:
+            self._drop(1 + len(delta))
         ret = super().instantiate_pattern(pattern, delta)
         self.stack.append(ret)
         return ret
 
     def pop(self, term: Pattern | Proved) -> None:
-        assert self.stack[-1] == term, f'expected: {self.stack[-1]}\ngot: {term}'
+        if self.check_stack:
+            assert self.stack[-1] == term, f'expected: {self.stack[-1]}\ngot: {term}'
         self.stack.pop()
         super().pop(term)
 
     def save(self, id: str, term: Pattern | Proved) -> None:
-        assert self.stack[-1] == term, f'expected: {self.stack[-1]}\ngot: {term}'
-        self.memory.append(term)
+        if self.check_stack:
+            assert self.stack[-1] == term, f'expected: {self.stack[-1]}\ngot: {term}'
+        self._remember(term)
         super().save(id, term)
 
     def load(self, id: str, term: Pattern | Proved) -> None:
-        assert term in self.memory
+        if not self.trusted:
+            assert self.memory_slot(term) is not None
         self.stack.append(term)
         super().load(id, term)
 
     def publish_proof(self, proved: Proved) -> None:
         super().publish_proof(proved)
-        expected_claim, *self.claims = self.claims
-        assert (
-            proved.conclusion == expected_claim.pattern
-        ), f'{str(proved.conclusion)} != {str(expected_claim.pattern)} \n {str(self.stack)}'
-        assert self.stack[-1] == proved, f'{str(self.stack[-1])} != {str(proved)} \n {str(self.stack)}'
+        expected_claim = self._claims[self._proved_claims]
+        self._proved_claims += 1
+        if not self.trusted and proved.conclusion != expected_claim.pattern:
+            raise VerificationError(
+                f'{str(proved.conclusion)} != {str(expected_claim.pattern)} \n {str(self.stack)}'
+            )
+        if self.check_stack:
+            assert self.stack[-1] == proved, f'{str(self.stack[-1])} != {str(proved)} \n {str(self.stack)}'
 
     def publish_axiom(self, axiom: Pattern) -> None:
-        self.memory.append(Proved(axiom))
+        self._remember(Proved(axiom))
         super().publish_axiom(axiom)
-        assert self.stack[-1] == axiom
+        if self.check_stack:
+            assert self.stack[-1] == axiom
 
     def publish_claim(self, pattern: Pattern) -> None:
         super().publish_claim(pattern)
-        assert self.stack[-1] == pattern
+        if self.check_stack:
+            assert self.stack[-1] == pattern
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+from bisect import bisect
+from typing import TYPE_CHECKING
+
+from proof_generation.interpreter_transformer import InterpreterTransformer
+from proof_generation.pattern import Pattern
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Mapping
+
+    from proof_generation.interpreter import Interpreter
+    from proof_generation.pattern import ESubst, EVar, MetaVar, SSubst, SVar
+    from proof_generation.proved import Proved
+
+    Call = tuple[str, tuple[object, ...]]
+
+
+class TracingInterpreter(InterpreterTransformer):
+    """Records the calls made on the sub-interpreter, so that the same proof can be
+    replayed on other interpreters without executing the proof expressions again.
+    The trace only holds references to the arguments, which are interned patterns.
+    Calls made by the sub-interpreter on itself, like the construction of the parts
+    of a pattern, are not recorded, so the replay calls exactly the same methods.
+    """
+
+    def __init__(self, sub_interpreter: Interpreter):
+        super().__init__(sub_interpreter)
+        self.trace: list[Call] = []
+        # Index of the `end_proof` and number of calls between the markers, for the index of each `begin_proof`
+        self._proofs: dict[int, tuple[int, int]] = {}
+        self._open_proofs: list[tuple[int, int]] = []
+        self._markers = 0
+
+    def replay(self, interpreter: Interpreter) -> None:
+        """Call the recorded methods on the interpreter. The calls proving a conclusion
+        are skipped when the interpreter provides the conclusion in `begin_proof`.
+        """
+        methods: dict[str, Callable[..., object]] = {}
+        trace = self.trace
+        index = 0
+        while index < len(trace):
+            name, args = trace[index]
+            method = methods.get(name)
+            if method is None:
+                method = methods[name] = getattr(interpreter, name)
+            if method(*args) and name == 'begin_proof':
+                index = self._proofs[index][0]
+            index += 1
+
+    def repeated_proofs(self, max_count: int) -> dict[Pattern, int]:
+        """Suggest the conclusions worth saving once proved, so that their later proofs are replaced
+        by loads. They are returned in normal form, with the number of calls of their first proof.
+        Larger proofs are planned first, and the proofs within their skipped copies are not counted.
+        """
+        spans: dict[Pattern, list[tuple[int, int, int]]] = {}
+        for begin, (end, calls) in self._proofs.items():
+            conclusion = self.trace[begin][1][0]
+            assert isinstance(conclusion, Pattern)
+            spans.setdefault(conclusion.normalize(), []).append((begin, end, calls))
+
+        # Disjoint ranges of the trace that are skipped, sorted by their beginning
+        skipped: list[tuple[int, int]] = []
+
+        def executed(begin: int, end: int) -> bool:
+            i = bisect(skipped, (begin, end))
+            return not i or skipped[i - 1][1] < end
+
+        def skip(begin: int, end: int) -> None:
+            # Ranges within the new one are covered by it
+            i = bisect(skipped, (begin, end))
+            while i < len(skipped) and skipped[i][0] < end:
+                del skipped[i]
+            skipped.insert(i, (begin, end))
+
+        savings: dict[Pattern, tuple[int, int]] = {}
+        for conclusion, occurrences in sorted(spans.items(), key=lambda item: -item[1][0][2]):
+            proofs = [(begin, end, calls) for begin, end, calls in occurrences if executed(begin, end)]
+            # Each proof after the first one becomes a single load, and the first one is saved
+            saving = sum(calls - 1 for _, _, calls in proofs[1:]) - 1
+            if saving <= 0:
+                continue
+            savings[conclusion] = (saving, proofs[0][2])
+            for begin, end, _ in proofs[1:]:
+                skip(begin, end)
+
+        best = sorted(savings, key=lambda conclusion: -savings[conclusion][0])[:max_count]
+        return {conclusion: savings[conclusion][1] for conclusion in best}
+
+    def begin_proof(self, conclusion: Pattern) -> bool:
+        self._open_proofs.append((len(self.trace), self._markers))
+        self.trace.append(('begin_proof', (conclusion,)))
+        self._markers += 1
+        skipped = super().begin_proof(conclusion)
+        assert not skipped, 'Proofs cannot be skipped while tracing them'
+        return skipped
+
+    def end_proof(self, proved: Proved) -> None:
+        begin, markers = self._open_proofs.pop()
+        calls = len(self.trace) - begin - 1 - (self._markers - markers - 1)
+        self._proofs[begin] = (len(self.trace), calls)
+        self.trace.append(('end_proof', (proved,)))
+        self._markers += 1
+        super().end_proof(proved)
+
+    def into_claim_phase(self) -> None:
+        self.trace.append(('into_claim_phase', ()))
+        super().into_claim_phase()
+
+    def into_proof_phase(self) -> None:
+        self.trace.append(('into_proof_phase', ()))
+        super().into_proof_phase()
+
+    def pattern(self, p: Pattern) -> Pattern:
+        self.trace.append(('pattern', (p,)))
+        return self.sub_interpreter.pattern(p)
+
+    def evar(self, id: int) -> Pattern:
+        self.trace.append(('evar', (id,)))
+        return super().evar(id)
+
+    def svar(self, id: int) -> Pattern:
+        self.trace.append(('svar', (id,)))
+        return super().svar(id)
+
+    def symbol(self, name: str) -> Pattern:
+        self.trace.append(('symbol', (name,)))
+        return super().symbol(name)
+
+    def metavar(
+        self,
+        id: int,
+        e_fresh: tuple[EVar, ...] = (),
+        s_fresh: tuple[SVar, ...] = (),
+        positive: tuple[SVar, ...] = (),
+        negative: tuple[SVar, ...] = (),
+        application_context: tuple[EVar, ...] = (),
+    ) -> Pattern:
+        self.trace.append(('metavar', (id, e_fresh, s_fresh, positive, negative, application_context)))
+        return super().metavar(id, e_fresh, s_fresh, positive, negative, application_context)
+
+    def implies(self, left: Pattern, right: Pattern) -> Pattern:
+        self.trace.append(('implies', (left, right)))
+        return super().implies(left, right)
+
+    def app(self, left: Pattern, right: Pattern) -> Pattern:
+        self.trace.append(('app', (left, right)))
+        return super().app(left, right)
+
+    def exists(self, var: int, subpattern: Pattern) -> Pattern:
+        self.trace.append(('exists', (var, subpattern)))
+        return super().exists(var, subpattern)
+
+    def esubst(self, evar_id: int, pattern: MetaVar | ESubst | SSubst, plug: Pattern) -> Pattern:
+        self.trace.append(('esubst', (evar_id, pattern, plug)))
+        return super().esubst(evar_id, pattern, plug)
+
+    def ssubst(self, svar_id: int, pattern: MetaVar | ESubst | SSubst, plug: Pattern) -> Pattern:
+        self.trace.append(('ssubst', (svar_id, pattern, plug)))
+        return super().ssubst(svar_id, pattern, plug)
+
+    def mu(self, var: int, subpattern: Pattern) -> Pattern:
+        self.trace.append(('mu', (var, subpattern)))
+        return super().mu(var, subpattern)
+
+    def prop1(self) -> Proved:
+        self.trace.append(('prop1', ()))
+        return super().prop1()
+
+    def prop2(self) -> Proved:
+        self.trace.append(('prop2', ()))
+        return super().prop2()
+
+    def prop3(self) -> Proved:
+        self.trace.append(('prop3', ()))
+        return super().prop3()
+
+    def modus_ponens(self, left: Proved, right: Proved) -> Proved:
+        self.trace.append(('modus_ponens', (left, right)))
+        return super().modus_ponens(left, right)
+
+    def exists_quantifier(self) -> Proved:
+        self.trace.append(('exists_quantifier', ()))
+        return super().exists_quantifier()
+
+    def exists_generalization(self, proved: Proved, var: EVar) -> Proved:
+        self.trace.append(('exists_generalization', (proved, var)))
+        return super().exists_generalization(proved, var)
+
+    def instantiate(self, proved: Proved, delta: dict[int, Pattern]) -> Proved:
+        # Proof expressions may update the substitution in place when executed again
+        self.trace.append(('instantiate', (proved, dict(delta))))
+        return super().instantiate(proved, delta)
+
+    def instantiate_pattern(self, pattern: Pattern, delta: Mapping[int, Pattern]) -> Pattern:
+        self.trace.append(('instantiate_pattern', (pattern, dict(delta))))
+        return super().instantiate_pattern(pattern, delta)
+
+    def pop(self, term: Pattern | Proved) -> None:
+        self.trace.append(('pop', (term,)))
+        super().pop(term)
+
+    def save(self, id: str, term: Pattern | Proved) -> None:
+        self.trace.append(('save', (id, term)))
+        super().save(id, term)
+
+    def load(self, id: str, term: Pattern | Proved) -> None:
+        self.trace.append(('load', (id, term)))
+        super().load(id, term)
+
+    def publish_proof(self, term: Proved) -> None:
+        self.trace.append(('publish_proof', (term,)))
+        super().publish_proof(term)
+
+    def publish_axiom(self, term: Pattern) -> None:
+        self.trace.append(('publish_axiom', (term,)))
+        super().publish_axiom(term)
+
+    def publish_claim(self, term: Pattern) -> None:
+        self.trace.append(('publish_claim', (term,)))
+        super().publish_claim(term)
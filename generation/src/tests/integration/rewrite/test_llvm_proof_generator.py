@@ -8,8 +8,10 @@ import pyk.kllvm.load  # noqa: F401
 
 from proof_generation.k.kore_convertion.language_semantics import LanguageSemantics
 from proof_generation.k.kore_convertion.rewrite_steps import get_proof_hints
-from proof_generation.k.proof_gen import get_kompiled_definition, read_proof_hint
+from proof_generation.k.proof_gen import batch_main, get_kompiled_definition, read_proof_hint
 from proof_generation.pattern import App, Instantiate, Symbol
+from proof_generation.peephole import PHASE_SUFFIXES
+from proof_generation.proof import ProofExp
 
 if TYPE_CHECKING:
     from collections.abc import Iterator
@@ -145,3 +147,51 @@ def test_proof_trace_double_rewrite() -> None:
 
     # No more rewrites rewrite
     assert next(iterator, None) == None
+
+
+def test_batch_proof_generation(tmp_path: Path) -> None:
+    k_file = K_BENCHMARKS_DIR + '/trivial/trivial.k'
+    hints_files = HINTS_DIR + '/trivial/*.trivial.hints'
+    kompiled_dir = KOMPILED_DIR + '/trivial-kompiled/'
+
+    batch_main(k_file, [hints_files], kompiled_dir, str(tmp_path / 'sequential'), use_cache=False)
+    batch_main(k_file, [hints_files], kompiled_dir, str(tmp_path / 'parallel'), jobs=2)
+
+    sequential = sorted(path.name for path in (tmp_path / 'sequential').iterdir())
+    assert sequential == sorted(path.name for path in (tmp_path / 'parallel').iterdir())
+    assert '1_rewrite.trivial.ml-proof' in sequential
+    for name in sequential:
+        assert (tmp_path / 'sequential' / name).read_bytes() == (tmp_path / 'parallel' / name).read_bytes()
+
+
+def test_shared_gamma_generation(tmp_path: Path) -> None:
+    k_file = K_BENCHMARKS_DIR + '/trivial/trivial.k'
+    hints_files = [HINTS_DIR + '/trivial/1_rewrite.trivial.hints', HINTS_DIR + '/trivial/2_rewrites.trivial.hints']
+    kompiled_dir = KOMPILED_DIR + '/trivial-kompiled/'
+
+    batch_main(k_file, hints_files, kompiled_dir, str(tmp_path), shared_gamma=True)
+
+    # Both executions link to the same gamma, which is stored once
+    gamma_files = [tmp_path / '1_rewrite.trivial.ml-gamma', tmp_path / '2_rewrites.trivial.ml-gamma']
+    assert all(gamma_file.is_symlink() for gamma_file in gamma_files)
+    assert gamma_files[0].resolve() == gamma_files[1].resolve()
+    assert len(list((tmp_path / 'gamma').iterdir())) == 1
+
+
+def test_optimized_proof_generation(tmp_path: Path) -> None:
+    k_file = K_BENCHMARKS_DIR + '/trivial/trivial.k'
+    hints_file = HINTS_DIR + '/trivial/2_rewrites.trivial.hints'
+    kompiled_dir = KOMPILED_DIR + '/trivial-kompiled/'
+
+    batch_main(k_file, [hints_file], kompiled_dir, str(tmp_path / 'plain'))
+    batch_main(k_file, [hints_file], kompiled_dir, str(tmp_path / 'optimized'), optimize=True)
+
+    # The configurations shared by the claims and proof steps are built once, and loaded afterwards.
+    # Proof files are named after the slice, whose last suffix is the name of the K definition
+    slice_name = '2_rewrites.trivial.trivial'
+    ProofExp.verify(tmp_path / 'optimized' / slice_name)
+    sizes = [
+        sum((tmp_path / kind / slice_name).with_suffix(suffix).stat().st_size for suffix in PHASE_SUFFIXES)
+        for kind in ('plain', 'optimized')
+    ]
+    assert sizes[1] <= sizes[0]
@@ -4,7 +4,7 @@ from pathlib import Path
 import pyk.kllvm.load  # noqa: F401
 import pyk.kore.syntax as kore
 
-from proof_generation.llvm_proof_hint import LLVMRewriteTrace, LLVMRuleEvent
+from proof_generation.llvm_proof_hint import LLVMRewriteTrace, LLVMRuleEvent, decode
 
 HINTS_DIR_PATH = '.build/proof-hints'
 
@@ -84,3 +84,17 @@ def test_parse_proof_hint_reverse() -> None:
 
     # 10 post-initial-configuration events
     assert len(hint.trace) == 10
+
+
+def test_stream_proof_hint_peano() -> None:
+    path = Path(os.path.join(HINTS_DIR_PATH, 'peano/mul_3_5.peano.hints'))
+    hint = LLVMRewriteTrace.parse_file(path)
+
+    # Streaming the events yields the same ones, with the initial configuration after the prefix trace
+    events = [decode(event) for event in LLVMRewriteTrace.stream_file(path)]
+    assert events == list(hint.events())
+    assert len(events) == 11 + 1 + 361
+    assert events[11] == hint.initial_config
+
+    # Without the payloads, only the prefix trace is missing
+    assert len(list(LLVMRewriteTrace.stream_file(path, skip_payloads=True))) == 1 + 361
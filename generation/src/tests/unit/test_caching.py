@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from proof_generation.caching import BoundedCache, CacheInfo, WindowCache, bounded_cache, cache_stats
+from proof_generation.pattern import App, Symbol
+from proof_generation.proofs.kore import deconstruct_nary_application
+
+
+def test_bounded_cache() -> None:
+    calls: list[int] = []
+
+    @bounded_cache(maxsize=2)
+    def square(n: int) -> int:
+        calls.append(n)
+        return n * n
+
+    assert [square(1), square(2), square(1), square(3)] == [1, 4, 1, 9]
+    assert square.cache_info() == CacheInfo(hits=1, misses=3, maxsize=2, currsize=2)
+    # 2 was the least recently used entry
+    assert square(1) == 1
+    assert square(2) == 4
+    assert calls == [1, 2, 3, 2]
+
+    square.resize(1)
+    assert square.cache_info().currsize == 1
+    square.cache_clear()
+    assert square.cache_info() == CacheInfo(hits=0, misses=0, maxsize=1, currsize=0)
+
+
+def test_window_cache() -> None:
+    cache: WindowCache[int, str] = WindowCache(window=2)
+    # A round keeps all of its entries, however many there are
+    for n in range(100):
+        cache.put(n, str(n))
+    assert len(cache) == 100
+
+    cache.next_round()
+    assert cache.get(1) == '1'
+    cache.put(100, '100')
+    cache.next_round()
+    cache.put(101, '101')
+    # Only the entries used in the last two rounds are left
+    cache.next_round()
+    assert sorted(key for key in range(102) if key in cache) == [1, 100, 101]
+    assert cache.get(0) is None
+
+    cache.next_round()
+    cache.next_round()
+    assert len(cache) == 0
+
+
+def test_deconstruct_nary_application_stats() -> None:
+    assert isinstance(deconstruct_nary_application, BoundedCache)
+    deconstruct_nary_application.cache_clear()
+    foo = Symbol('foo')
+    app = App(App(foo, foo), foo)
+    assert deconstruct_nary_application(app) == (foo, (foo, foo))
+    assert deconstruct_nary_application(App(App(foo, foo), foo)) == (foo, (foo, foo))
+    name = f'{deconstruct_nary_application.__module__}.deconstruct_nary_application'
+    # The outer application misses and recurses once, then hits as it is interned
+    assert cache_stats()[name] == CacheInfo(hits=1, misses=3, maxsize=2**16, currsize=3)
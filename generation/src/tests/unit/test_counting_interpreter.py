@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+from proof_generation.counting_interpreter import CountingInterpreter
+from proof_generation.interpreter import ExecutionPhase
+from proof_generation.pattern import Implies, phi0, phi1, phi2
+
+if TYPE_CHECKING:
+    from proof_generation.pattern import Pattern
+
+p = Implies(phi0, phi1)
+q = Implies(p, p)
+r = Implies(phi2, phi2)
+
+
+@pytest.mark.parametrize(
+    'slots, expected',
+    [
+        (0, set()),
+        (1, {p}),
+        (2, {p, q}),
+        (3, {p, q, r}),
+        # Loading phi2 instead of building it again saves no instruction
+        (10, {p, q, r}),
+    ],
+)
+def test_finalize(slots: int, expected: set[Pattern]) -> None:
+    counting = CountingInterpreter(ExecutionPhase.Proof, max_memory_slots=slots)
+    for pattern in (q, q, r, r):
+        counting.pattern(pattern)
+    assert counting.finalize() == expected
+    assert counting.suggested_for_memoization == expected
+
+
+def test_finalize_saved_first() -> None:
+    counting = CountingInterpreter(ExecutionPhase.Proof, max_memory_slots=2)
+    counting.pattern(r)
+    counting.save('r', r)
+    counting.pattern(q)
+    counting.pattern(q)
+    # The saved pattern takes one slot, and is suggested before more complex ones
+    assert counting.finalize() == {r}
+
+
+def test_exclude() -> None:
+    counting = CountingInterpreter(ExecutionPhase.Proof, max_memory_slots=2)
+    for pattern in (q, q, r, r):
+        counting.pattern(pattern)
+    assert counting.finalize() == {p, q}
+    # Excluded patterns give their slots to the next best ones, and stay excluded
+    assert counting.exclude({q}) == {p, r}
+    # Without p and q, memoizing their parts saves nothing
+    assert counting.exclude({p}) == {r}
+    assert counting.suggested_for_memoization == {r}
+
+
+def test_uses_of_parts() -> None:
+    counting = CountingInterpreter(ExecutionPhase.Proof)
+    counting.pattern(q)
+    # Building the parts of q counts them once for each occurrence, and q itself once
+    assert counting._uses[counting._ids[p]] == 2
+    assert counting._uses[counting._ids[phi0]] == 2
+    assert counting._uses[counting._ids[q]] == 1
+    # Patterns built by instructions of their own cannot be loaded instead, and are not counted
+    counting.implies(counting.pattern(p), counting.pattern(p))
+    assert counting._uses[counting._ids[p]] == 4
+    assert counting._uses[counting._ids[q]] == 1
@@ -237,3 +237,16 @@ def test_simple_rules_pretty_printing() -> None:
         equation_rule2.pattern.pretty(pretty_opt)
         == '(k⊤:ksort_srt2 k-> (ksym_sym4():ksort_srt2 k= (ksym_sym2(ksym_sym1) k⋀ k⊤:ksort_srt2):ksort_srt2):ksort_srt2):ksort_srt2'
     )
+
+
+def test_shared_gamma() -> None:
+    semantics = double_rewrite()
+    hints = rewrite_hints()
+    rules = [rule.pattern for rule in semantics.rewrite_rules]
+    assert rules == [semantics.get_axiom(0).pattern, semantics.get_axiom(1).pattern]
+
+    # Executions taking different rules publish the same axioms, in the same order
+    first_step = ExecutionProofExp.from_proof_hints(iter(hints[:1]), semantics, shared_gamma=True)
+    second_step = ExecutionProofExp.from_proof_hints(iter(hints[1:]), semantics, shared_gamma=True)
+    assert first_step._axioms == second_step._axioms == rules
+    assert len(second_step._claims) == len(second_step._proof_expressions) == 1
@@ -1,12 +1,17 @@
 from __future__ import annotations
 
+import pickle
 from itertools import count
+from typing import TYPE_CHECKING
 
+import pyk.kore.syntax as kore
 from pytest import mark, raises
 
 from proof_generation.k.execution_proof_generation import ExecutionProofExp
+from proof_generation.k.kore_convertion import language_semantics
 from proof_generation.k.kore_convertion.language_semantics import (
     AxiomType,
+    ConvertionScope,
     KModule,
     KSort,
     KSortVar,
@@ -28,6 +33,11 @@ from proof_generation.proofs.kore import (
     nary_app,
 )
 
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from pytest import MonkeyPatch
+
 
 def double_rewrite() -> LanguageSemantics:
     # Constructs a language semantics for the double rewrite module.
@@ -490,6 +500,120 @@ def test_rules() -> None:
     assert mod.get_axiom(equation_rule2.ordinal) == equation_rule2
 
 
+def test_semantics_index() -> None:
+    semantics = simple_semantics()
+    index = semantics.index
+    assert index is not None
+    assert index.sorts['srt1'] is semantics.main_module.get_sort('srt1')
+    assert index.symbols['sym2'] is semantics.main_module.get_symbol('sym2')
+    assert semantics.index is index, 'Expect the index to be built once'
+    with raises(ValueError):
+        semantics.get_symbol('unknown_symbol')
+
+    # Changing a module drops the index
+    with semantics.main_module as mod:
+        sym5 = mod.symbol('sym5', semantics.get_sort('srt1'))
+        rule = mod.rewrite_rule(kore_rewrites(sym5.aml_symbol, sym5.aml_symbol, sym5.aml_symbol))
+    assert semantics.index is not index
+    assert semantics.get_symbol('sym5') == sym5
+    assert semantics.get_axiom(rule.ordinal) == rule
+
+    # Lookups are not indexed while parsing
+    with semantics as sem:
+        assert sem.index is None
+        assert sem.get_symbol('sym5') == sym5
+
+
+def test_dump_and_load(tmp_path: Path) -> None:
+    semantics = simple_semantics()
+    sym1 = semantics.get_symbol('sym1')
+    with semantics.main_module as mod:
+        rule = mod.rewrite_rule(kore_rewrites(sym1.aml_symbol, sym1.aml_symbol, sym1.aml_symbol))
+    semantics._cached_axiom_scopes[rule.ordinal] = ConvertionScope()
+    semantics._cached_axiom_scopes[rule.ordinal].resolve_metavar('X')
+
+    semantics.dump(tmp_path / 'semantics.pickle')
+    loaded = LanguageSemantics.load(tmp_path / 'semantics.pickle')
+    assert loaded.symbols == semantics.symbols
+    assert loaded.sorts == semantics.sorts
+    assert loaded.notations == semantics.notations
+    # Patterns are interned again, so they are shared with the patterns built afterwards
+    assert loaded.get_axiom(rule.ordinal).pattern is rule.pattern
+    assert loaded._cached_axiom_scopes[rule.ordinal].lookup_metavar('X') == MetaVar(0)
+
+    (tmp_path / 'other.pickle').write_bytes(pickle.dumps(sym1))
+    with raises(ValueError):
+        LanguageSemantics.load(tmp_path / 'other.pickle')
+
+
+def test_convert_pattern_cache() -> None:
+    semantics = simple_semantics()
+    sym1 = semantics.get_symbol('sym1')
+    sym2 = semantics.get_symbol('sym2')
+
+    converted = semantics.convert_pattern(kore.App('sym2', (), (kore.App('sym1', (), ()),)))
+    assert converted == sym2.app(sym1.app())
+    # Subterms without variables are converted once, and reused for the following configurations
+    assert semantics.convert_pattern(kore.App('sym2', (), (kore.App('sym1', (), ()),))) is converted
+
+    # Subterms with variables depend on the scope, so they are converted each time
+    with_variable = kore.App('sym2', (), (kore.EVar('X', kore.SortApp('srt1')),))
+    assert semantics.convert_pattern(with_variable) == sym2.app(MetaVar(0))
+    assert id(semantics.intern(with_variable)) not in semantics._cached_conversions
+
+
+def test_convert_pattern_window() -> None:
+    semantics = simple_semantics()
+    # Equal terms built separately are interned to the same one
+    nested = semantics.intern(kore.App('sym2', (), (kore.App('sym1', (), ()),)))
+    assert semantics.intern(kore.App('sym2', (), (kore.App('sym1', (), ()),))) is nested
+    semantics.convert_pattern(nested)
+    assert id(nested) in semantics._cached_conversions
+
+    # The subterms of configurations older than the window are dropped
+    for _ in range(language_semantics.CONVERSION_WINDOW + 1):
+        semantics.convert_pattern(kore.App('sym3', (), ()))
+    assert id(nested) not in semantics._cached_conversions
+    assert len(semantics._cached_conversions) == len(semantics._interned_terms) == 1
+
+
+def test_convert_pattern_delta(monkeypatch: MonkeyPatch) -> None:
+    semantics = LanguageSemantics()
+    with semantics as sem:
+        mod = sem.module('list_module')
+        with mod as mod:
+            srt = mod.sort('srt')
+            mod.symbol('nil', srt)
+            mod.symbol('elem1', srt)
+            mod.symbol('elem2', srt)
+            mod.symbol('cons', srt, input_sorts=(srt, srt))
+
+    def configuration(head: str, length: int) -> kore.Pattern:
+        # Each configuration is built from scratch, as hints are decoded separately
+        ret: kore.Pattern = kore.App('nil', (), ())
+        for _ in range(length):
+            ret = kore.App('cons', (), (kore.App('elem1', (), ()), ret))
+        return kore.App('cons', (), (kore.App(head, (), ()), ret))
+
+    converted: list[kore.Pattern] = []
+    convert_subterms = semantics._convert_subterms
+
+    def counting_convert_subterms(scope: ConvertionScope, pattern: kore.Pattern) -> Pattern:
+        converted.append(pattern)
+        return convert_subterms(scope, pattern)
+
+    monkeypatch.setattr(semantics, '_convert_subterms', counting_convert_subterms)
+    semantics.convert_pattern(configuration('elem1', 100))
+    # Equal subterms are converted once: the conses, a single elem1 and nil
+    assert len(converted) == 103
+
+    # Only the changed head of the list is converted, however long the list is
+    for head in ('elem2', 'elem1', 'elem2'):
+        converted.clear()
+        semantics.convert_pattern(configuration(head, 100))
+        assert len(converted) <= 2
+
+
 def test_module_import() -> None:
     semantics = simple_semantics()
     ever_created_sorts = set(semantics.main_module.sorts)
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+from proof_generation.claim import Claim
+from proof_generation.counting_interpreter import CountingInterpreter
+from proof_generation.interpreter import ExecutionPhase
+from proof_generation.liveness_interpreter import LivenessInterpreter, allocate_memory
+from proof_generation.optimizing_interpreters import MemoizingInterpreter
+from proof_generation.pattern import Implies, phi0, phi1
+from proof_generation.peephole import PHASE_SUFFIXES
+from proof_generation.proof import OutputFormat
+from proof_generation.proofs.propositional import Propositional
+from proof_generation.proofs.substitution import Substitution
+from proof_generation.tracing_interpreter import TracingInterpreter
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+    from proof_generation.pattern import Pattern
+    from proof_generation.proof import ProofExp
+
+p = Implies(phi0, phi1)
+q = Implies(p, p)
+
+
+def test_liveness_interpreter() -> None:
+    liveness = LivenessInterpreter(ExecutionPhase.Proof)
+    memoizer = MemoizingInterpreter(liveness, {p, q, phi1})
+    memoizer.pattern(q)
+    memoizer.pattern(q)
+    memoizer.pattern(Implies(phi1, phi1))
+
+    # p is only loaded while building q, which is loaded as a whole afterwards
+    assert liveness.memory == [phi1, p, q]
+    assert liveness.loads == [2, 1, 1]
+    # Loading phi1 takes as many instructions as building it again, and phi0 is never saved
+    assert liveness.wasted({p, q, phi1, phi0}) == {phi1, phi0}
+
+
+def serialized_size(proof_exp: ProofExp, allocate: bool, file_path: Path) -> tuple[set[Pattern], int]:
+    """The suggested patterns, and the size of the binary proof memoizing them."""
+    claims = [Claim(claim) for claim in proof_exp._claims]
+    analyzer = CountingInterpreter(ExecutionPhase.Gamma, claims)
+    tracer = TracingInterpreter(analyzer)
+    proof_exp.execute_full(tracer)
+    suggested = allocate_memory(tracer, analyzer, claims) if allocate else analyzer.finalize()
+
+    serializer = proof_exp.get_serializing_interpreter(OutputFormat.Binary, ExecutionPhase.Gamma, claims, file_path)
+    tracer.replay(MemoizingInterpreter(serializer, suggested))
+    serializer.flush()
+    return suggested, sum(file_path.with_suffix(suffix).stat().st_size for suffix in PHASE_SUFFIXES)
+
+
+@pytest.mark.parametrize('proof_exp', [Propositional, Substitution])
+def test_allocate_memory(proof_exp: Callable[[], ProofExp], tmp_path: Path) -> None:
+    suggested, size = serialized_size(proof_exp(), True, tmp_path / 'allocated')
+    _, planned_size = serialized_size(proof_exp(), False, tmp_path / 'planned')
+    assert size <= planned_size
+
+    # Every suggestion pays off once the slots wasted by the first plan are given to other patterns
+    claims = [Claim(claim) for claim in proof_exp()._claims]
+    liveness = LivenessInterpreter(ExecutionPhase.Gamma, claims)
+    proof_exp().execute_full(MemoizingInterpreter(liveness, suggested))
+    assert not liveness.wasted(suggested)
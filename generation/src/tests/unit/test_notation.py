@@ -4,7 +4,7 @@ from typing import TYPE_CHECKING
 
 import pytest
 
-from proof_generation.pattern import bot, imp
+from proof_generation.pattern import Implies, Instantiate, Mu, SVar, bot, imp
 from proof_generation.proofs.propositional import _or, neg, phi0, phi1, phi2
 
 if TYPE_CHECKING:
@@ -34,3 +34,24 @@ def test_eq(pat_pair: tuple[Pattern, Pattern, bool]) -> None:
         assert pat_pair[0] == pat_pair[1], f'{str(pat_pair[0])}\n!=\n{str(pat_pair[1])}\n'
     else:
         assert not (pat_pair[0] == pat_pair[1]), f'{str(pat_pair[0])}\n==\n{str(pat_pair[1])}\n'
+
+
+def test_normalize() -> None:
+    pattern = _or(neg(phi0), phi1)
+    bot_normal = Mu(0, SVar(0))
+    normal = Implies(Implies(Implies(phi0, bot_normal), bot_normal), phi1)
+    assert pattern.normalize() is normal
+    assert pattern.normalize() is pattern.normalize()
+    assert normal.normalize() is normal
+
+    # Simplification only instantiates the outermost notation
+    assert isinstance(pattern, Instantiate)
+    assert pattern.simplify() is imp(neg(neg(phi0)), phi1)
+    assert pattern.simplify() is not normal
+    assert pattern.simplify() == normal
+
+    # Arguments equal modulo notation are expanded as they are
+    unfolded = _or(Implies(phi0, bot()), phi1)
+    assert unfolded == pattern
+    assert isinstance(unfolded, Instantiate)
+    assert unfolded.simplify() is imp(neg(Implies(phi0, bot())), phi1)
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+import pickle
 from typing import TYPE_CHECKING
 
 import pytest
 from frozendict import frozendict
 
 from proof_generation.pattern import App, ESubst, EVar, Exists, Implies, Instantiate, MetaVar, Mu, SSubst, SVar, Symbol
+from proof_generation.proved import VerificationError
 
 if TYPE_CHECKING:
     from proof_generation.pattern import Pattern
@@ -181,3 +183,121 @@ stack_mixed1 = lambda term: ESubst(SSubst(pattern=term, var=SVar(1), plug=EVar(1
 )
 def test_instantiate_subst(pattern: Pattern, plugs: dict[int, Pattern], expected: Pattern) -> None:
     assert pattern.instantiate(plugs) == expected
+
+
+def test_interning() -> None:
+    assert Implies(phi0, EVar(0)) is Implies(phi0, EVar(0))
+    assert MetaVar(0, e_fresh=(EVar(0),)) is MetaVar(0, (EVar(0),))
+    assert ESubst(phi0, EVar(0), sigma1) is ESubst(pattern=phi0, var=EVar(0), plug=sigma1)
+    assert MetaVar(0) is not MetaVar(0, e_fresh=(EVar(0),))
+    assert Implies(phi0, phi1) != Implies(phi1, phi0)
+    assert hash(App(sigma0, sigma1)) == hash(App(Symbol('s0'), Symbol('s1')))
+
+    # Instantiations are interned respecting the order of their plugs
+    inst = Instantiate(App(phi0, phi1), frozendict({0: sigma0, 1: sigma1}))
+    assert inst is Instantiate(App(phi0, phi1), frozendict({0: sigma0, 1: sigma1}))
+    assert inst is not Instantiate(App(phi0, phi1), frozendict({1: sigma1, 0: sigma0}))
+
+    # Equality is still modulo notation
+    assert Implies(inst, phi0) is not Implies(App(sigma0, sigma1), phi0)
+    assert Implies(inst, phi0) == Implies(App(sigma0, sigma1), phi0)
+    assert Implies(App(sigma0, sigma1), phi0) == Implies(inst, phi0)
+    assert Implies(inst, phi0) != Implies(App(sigma1, sigma0), phi0)
+
+
+def test_interning_pickle() -> None:
+    pattern = Exists(0, Implies(MetaVar(1, s_fresh=(SVar(0),)), Instantiate(phi0, frozendict({0: sigma2}))))
+    assert pickle.loads(pickle.dumps(pattern)) is pattern
+
+
+@pytest.mark.parametrize(
+    'pattern, fresh_evars, bound_evars, fresh_svars, bound_svars',
+    [
+        [EVar(0), [1, 2], [0], [0, 1], []],
+        [SVar(0), [0, 1], [], [1, 2], [0]],
+        [sigma0, [0, 1], [], [0, 1], []],
+        [Exists(0, App(EVar(0), EVar(1))), [0, 2], [1], [0], []],
+        [Mu(0, Implies(SVar(0), SVar(1))), [0], [], [0, 2], [1]],
+        [MetaVar(0, e_fresh=(EVar(1),), s_fresh=(SVar(2),)), [1], [0, 2], [2], [0, 1]],
+        [Exists(0, phi0), [0], [1], [], [0]],
+        [ESubst(MetaVar(0), EVar(0), EVar(1)), [0], [1], [], [0]],
+        [ESubst(MetaVar(0), EVar(0), sigma0), [0], [1], [], [0]],
+        [SSubst(MetaVar(0, e_fresh=(EVar(2),)), SVar(0), SVar(1)), [2], [0], [0], [1]],
+        [Instantiate(phi0, frozendict({0: EVar(0)})), [1], [0], [0, 1], []],
+    ],
+)
+def test_free_vars(
+    pattern: Pattern, fresh_evars: list[int], bound_evars: list[int], fresh_svars: list[int], bound_svars: list[int]
+) -> None:
+    for name in fresh_evars:
+        assert pattern.evar_is_free(name)
+    for name in bound_evars:
+        assert not pattern.evar_is_free(name)
+    for name in fresh_svars:
+        assert pattern.svar_is_free(name)
+    for name in bound_svars:
+        assert not pattern.svar_is_free(name)
+
+
+@pytest.mark.parametrize(
+    'pattern, positive, negative',
+    [
+        [SVar(0), [0, 1, 2], [1, 2]],
+        [Implies(SVar(0), SVar(1)), [1, 2], [0, 2]],
+        [App(SVar(0), Implies(SVar(0), sigma0)), [1, 2], [1, 2]],
+        [Mu(0, Implies(SVar(1), SVar(0))), [0, 2], [0, 1, 2]],
+        [MetaVar(0, positive=(SVar(0),), negative=(SVar(1),)), [0], [1]],
+        [ESubst(MetaVar(0, positive=(SVar(0),)), EVar(0), SVar(0)), [], []],
+        [SSubst(MetaVar(0, positive=(SVar(2),), negative=(SVar(0),)), SVar(0), Implies(SVar(1), sigma0)), [0, 2], [0]],
+        [SSubst(MetaVar(0, positive=(SVar(0),), negative=(SVar(2),)), SVar(0), Implies(SVar(1), sigma0)), [0], [0, 2]],
+        [Instantiate(Implies(phi0, sigma0), frozendict({0: SVar(0)})), [1, 2], [0, 1, 2]],
+    ],
+)
+def test_polarity(pattern: Pattern, positive: list[int], negative: list[int]) -> None:
+    for name in range(3):
+        assert pattern.svar_is_positive(name) == (name in positive)
+        assert pattern.svar_is_negative(name) == (name in negative)
+
+
+def test_instantiate_constraints() -> None:
+    constrained = MetaVar(0, e_fresh=(EVar(0),), s_fresh=(SVar(0),), positive=(SVar(1),), negative=(SVar(2),))
+    assert constrained.instantiate({0: App(SVar(1), Implies(SVar(2), EVar(1)))}) is App(
+        SVar(1), Implies(SVar(2), EVar(1))
+    )
+    for plug in (EVar(0), SVar(0), Implies(SVar(1), sigma0), SVar(2), Exists(1, EVar(0))):
+        with pytest.raises(VerificationError):
+            constrained.instantiate({0: plug})
+
+
+def test_instantiate_unaffected() -> None:
+    pattern = Exists(0, Implies(App(phi0, sigma0), Mu(1, phi1)))
+    assert pattern.instantiate({2: sigma1}) is pattern
+    assert pattern.instantiate({}) is pattern
+    assert pattern.instantiate({0: sigma1}) == Exists(0, Implies(App(sigma1, sigma0), Mu(1, phi1)))
+
+    # Unused plugs of notation are instantiated as well
+    inst = Instantiate(phi0, frozendict({0: sigma0, 1: phi2}))
+    assert Implies(inst, sigma0).instantiate({2: sigma1}) is Implies(
+        Instantiate(phi0, frozendict({0: sigma0, 1: sigma1})), sigma0
+    )
+
+    # Substitutions that instantiation simplifies away are not skipped
+    subst = ESubst(MetaVar(0, e_fresh=(EVar(0),)), EVar(0), sigma0)
+    assert Implies(subst, phi1).instantiate({1: sigma1}) == Implies(MetaVar(0, e_fresh=(EVar(0),)), sigma1)
+
+
+def test_subst_unaffected() -> None:
+    pattern = Exists(0, Implies(App(EVar(0), sigma0), Mu(1, App(SVar(1), EVar(2)))))
+    assert pattern.apply_esubst(0, sigma1) is pattern
+    assert pattern.apply_esubst(1, sigma1) is pattern
+    assert pattern.apply_ssubst(1, sigma1) is pattern
+    assert pattern.apply_esubst(2, sigma1) == Exists(0, Implies(App(EVar(0), sigma0), Mu(1, App(SVar(1), sigma1))))
+
+    # Only the path to the substituted variable is rebuilt
+    substituted = Implies(pattern, EVar(3)).apply_esubst(3, sigma1)
+    assert Implies.extract(substituted)[0] is pattern
+
+    # Metavariables and explicit substitutions are still substituted into
+    assert Implies(phi0, sigma0).apply_esubst(0, sigma1) == Implies(ESubst(phi0, EVar(0), sigma1), sigma0)
+    subst = SSubst(MetaVar(0, s_fresh=(SVar(0),)), SVar(1), sigma0)
+    assert App(subst, sigma0).apply_ssubst(0, sigma1) == App(SSubst(subst, SVar(0), sigma1), sigma0)
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+
+from proof_generation.basic_interpreter import BasicInterpreter
+from proof_generation.deserialize import Deserializer
+from proof_generation.instruction import Encoding, Instruction
+from proof_generation.interpreter import ExecutionPhase
+from proof_generation.peephole import PHASE_SUFFIXES, decode, encode, optimize, optimize_files
+from proof_generation.proof import OutputFormat
+from proof_generation.proofs.propositional import Propositional
+from proof_generation.proofs.small_theory import SmallTheory
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from proof_generation.pattern import Pattern
+    from proof_generation.peephole import Code
+    from proof_generation.proof import ProofExp
+
+PROOFS_LOCATION = 'proofs/translated'
+
+# Axiom 0 and claim 1 are both the symbol 0
+AXIOM: list[Code] = [(Instruction.Symbol, 0), (Instruction.Publish,)]
+
+
+def check(gamma: bytes, claims: bytes, proof: bytes) -> list[Pattern]:
+    """Check the proof on the Python side, and return the claims it proves."""
+    deserializer = Deserializer(BasicInterpreter(ExecutionPhase.Gamma))
+    deserializer.deserialize(gamma)
+    deserializer.into_claim_phase()
+    deserializer.deserialize(claims)
+    proved = list(deserializer.claims)
+    deserializer.into_proof_phase()
+    deserializer.deserialize(proof)
+    assert not deserializer.claims
+    return proved
+
+
+@pytest.mark.parametrize(
+    'gamma, proof, expected_gamma, expected_proof',
+    [
+        # Unused terms, instantiations of nothing, and saves of terms in memory already
+        (
+            AXIOM,
+            [
+                (Instruction.EVar, 0),
+                (Instruction.Pop,),
+                (Instruction.Load, 0),
+                (Instruction.Instantiate, 0),
+                (Instruction.Save,),
+                (Instruction.Pop,),
+                (Instruction.Load, 1),
+                (Instruction.Publish,),
+            ],
+            AXIOM,
+            [(Instruction.Load, 0), (Instruction.Publish,)],
+        ),
+        # Popping a term that is loaded right away
+        (
+            AXIOM,
+            [
+                (Instruction.Symbol, 1),
+                (Instruction.Save,),
+                (Instruction.Pop,),
+                (Instruction.Load, 1),
+                (Instruction.Load, 1),
+                (Instruction.App,),
+                (Instruction.Load, 0),
+                (Instruction.Instantiate, 1, 0),
+                (Instruction.Publish,),
+            ],
+            AXIOM,
+            [
+                (Instruction.Symbol, 1),
+                (Instruction.Save,),
+                (Instruction.Load, 1),
+                (Instruction.App,),
+                (Instruction.Load, 0),
+                (Instruction.Instantiate, 1, 0),
+                (Instruction.Publish,),
+            ],
+        ),
+        # Memory slots are renumbered across phases once unused saves are removed
+        (
+            [(Instruction.Symbol, 0), (Instruction.Save,), (Instruction.Publish,)],
+            [(Instruction.Load, 1), (Instruction.Publish,)],
+            AXIOM,
+            [(Instruction.Load, 0), (Instruction.Publish,)],
+        ),
+    ],
+)
+@pytest.mark.parametrize('encoding', list(Encoding))
+def test_peephole_rules(
+    gamma: list[Code],
+    proof: list[Code],
+    expected_gamma: list[Code],
+    expected_proof: list[Code],
+    encoding: Encoding,
+) -> None:
+    original = (encode(encoding, gamma), encode(encoding, AXIOM), encode(encoding, proof))
+    optimized = optimize(*original)
+    assert [decode(data) for data in optimized] == [
+        (encoding, expected_gamma),
+        (encoding, AXIOM),
+        (encoding, expected_proof),
+    ]
+    assert check(*optimized) == check(*original)
+
+
+@pytest.mark.parametrize('proof_exp', [Propositional, SmallTheory])
+@pytest.mark.parametrize('optimize_memory', [False, True])
+@pytest.mark.parametrize('encoding', list(Encoding))
+def test_peephole_proofs(
+    proof_exp: Callable[[], ProofExp], optimize_memory: bool, encoding: Encoding, tmp_path: Path
+) -> None:
+    proof_exp().serialize(tmp_path / 'original', OutputFormat.Binary, optimize_memory, encoding)
+    files = [(tmp_path / 'original').with_suffix(suffix) for suffix in PHASE_SUFFIXES]
+    original = tuple(file.read_bytes() for file in files)
+    optimized = optimize(*original)
+
+    assert check(*optimized) == check(*original)
+    assert sum(map(len, optimized)) <= sum(map(len, original))
+    # The pass reaches a fixpoint
+    assert optimize(*optimized) == optimized
+
+
+@pytest.mark.parametrize('name', ['impreflex-compressed-goal', 'perceptron-goal', 'transfer-simple-compressed-goal'])
+def test_peephole_translated(name: str, tmp_path: Path) -> None:
+    files = gamma, claims, proof = [Path(os.path.join(PROOFS_LOCATION, name + suffix)) for suffix in PHASE_SUFFIXES]
+    optimize_files(gamma, claims, proof, tmp_path)
+    optimized = [(tmp_path / file.name).read_bytes() for file in files]
+
+    assert check(*optimized) == check(*(file.read_bytes() for file in files))
+    assert len(optimized[2]) < files[2].stat().st_size
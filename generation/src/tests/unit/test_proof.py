@@ -5,18 +5,46 @@ from typing import TYPE_CHECKING
 
 import pytest
 
+from proof_generation.basic_interpreter import BasicInterpreter
 from proof_generation.claim import Claim
-from proof_generation.deserialize import deserialize_instructions
-from proof_generation.instruction import Instruction
+from proof_generation.counting_interpreter import CountingInterpreter
+from proof_generation.deserialize import (
+    Deserializer,
+    DeserializingException,
+    deserialize_files,
+    deserialize_instructions,
+)
+from proof_generation.instruction import Encoding, Instruction
 from proof_generation.interpreter import ExecutionPhase
-from proof_generation.pattern import App, ESubst, EVar, Exists, Implies, MetaVar, Mu, PrettyOptions, SVar, Symbol, phi0
+from proof_generation.optimizing_interpreters import MemoizingInterpreter, ProofCacheInfo, ProofCachingInterpreter
+from proof_generation.pattern import (
+    App,
+    ESubst,
+    EVar,
+    Exists,
+    Implies,
+    MetaVar,
+    Mu,
+    Notation,
+    PrettyOptions,
+    SVar,
+    Symbol,
+    phi0,
+    phi1,
+)
 from proof_generation.pretty_printing_interpreter import PrettyPrintingInterpreter
-from proof_generation.proof import ProofExp, ProofThunk, Proved
+from proof_generation.proof import IndexedList, OutputFormat, ProofExp, ProofThunk, Proved
 from proof_generation.proofs.propositional import Propositional
+from proof_generation.proofs.small_theory import SmallTheory
+from proof_generation.proved import VerificationError
 from proof_generation.serializing_interpreter import SerializingInterpreter
 from proof_generation.stateful_interpreter import StatefulInterpreter
+from proof_generation.tracing_interpreter import TracingInterpreter
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
     from proof_generation.proof import Pattern
 
 
@@ -27,6 +55,24 @@ def test_pop() -> None:
     assert len(interpreter.stack) == 0
 
 
+def test_indexed_list() -> None:
+    p = Implies(phi0, phi0)
+    items = IndexedList([p, phi0, p])
+    # Duplicates are kept, and indices refer to their first occurrence
+    assert items == [p, phi0, p]
+    assert len(items) == 3
+    assert items.index(p) == 0
+    assert list(reversed(items)) == [p, phi0, p]
+
+    # Membership is modulo notation, like for lists
+    p_notation = Notation('p', 1, Implies(phi0, phi0), '{0} -> {0}')(phi0)
+    assert p_notation in items
+    assert p_notation in list(items)
+    assert Implies(phi0, phi1) not in items
+    with pytest.raises(ValueError):
+        items.index(phi1)
+
+
 def test_instantiate() -> None:
     phi0 = MetaVar(0)
     phi0_ef0 = MetaVar(0, e_fresh=(EVar(0),))
@@ -179,7 +225,7 @@ def test_interpreter_proof_state(pats: list[Pattern]) -> None:
         proof_out=BytesIO(),
     )
     proof_exp = ProofExp(axioms=pats, claims=pats)
-    proof_exp._proof_expressions = [proof_exp.load_axiom(pat) for pat in pats]
+    proof_exp._proof_expressions = IndexedList(proof_exp.load_axiom(pat) for pat in pats)
     assert interpreter_ser.memory == []
     assert [claim.pattern for claim in interpreter_ser.claims] == pats
     assert interpreter_ser.stack == []
@@ -197,3 +243,232 @@ def test_interpreter_proof_state(pats: list[Pattern]) -> None:
     assert [proved.conclusion for proved in interpreter_ser.memory if isinstance(proved, Proved)] == pats
     assert interpreter_ser.claims == []
     assert [proved.conclusion for proved in interpreter_ser.stack if isinstance(proved, Proved)] == pats
+
+
+@pytest.mark.parametrize('target', range(len(Propositional()._proof_expressions)))
+@pytest.mark.parametrize('check_stack', [True, False])
+def test_buffered_serialization(target: int, check_stack: bool) -> None:
+    out = BytesIO()
+    interpreter = SerializingInterpreter(phase=ExecutionPhase.Proof, out=out)
+    proved = Propositional()._proof_expressions[target](interpreter)
+
+    out_buffered = BytesIO()
+    interpreter_buffered = SerializingInterpreter(
+        phase=ExecutionPhase.Proof, out=out_buffered, check_stack=check_stack, chunk_size=16
+    )
+    assert Propositional()._proof_expressions[target](interpreter_buffered) == proved
+    # Only full chunks are written out before flushing
+    assert out.getvalue().startswith(out_buffered.getvalue())
+    interpreter_buffered.flush()
+
+    assert out_buffered.getvalue() == out.getvalue()
+    assert interpreter_buffered.stack == interpreter.stack
+
+
+@pytest.mark.parametrize('proof_exp', [Propositional, SmallTheory])
+def test_traced_serialization(proof_exp: Callable[[], ProofExp], tmp_path: Path) -> None:
+    claims = [Claim(claim) for claim in proof_exp()._claims]
+
+    # Executing the proof once more on the memoizing serializer gives the same output as replaying the trace
+    analyzer = CountingInterpreter(ExecutionPhase.Gamma, claims)
+    tracer = TracingInterpreter(analyzer)
+    proof_exp().execute_full(tracer)
+    suggested = analyzer.finalize()
+    assert suggested
+
+    replayed = proof_exp().get_serializing_interpreter(
+        OutputFormat.Binary, ExecutionPhase.Gamma, claims, tmp_path / 'a'
+    )
+    tracer.replay(MemoizingInterpreter(replayed, suggested))
+    replayed.flush()
+    executed = proof_exp().get_serializing_interpreter(
+        OutputFormat.Binary, ExecutionPhase.Gamma, claims, tmp_path / 'b'
+    )
+    proof_exp().execute_full(MemoizingInterpreter(executed, suggested))
+    executed.flush()
+
+    for suffix in ('.ml-gamma', '.ml-claim', '.ml-proof'):
+        assert (tmp_path / 'a').with_suffix(suffix).read_bytes() == (tmp_path / 'b').with_suffix(suffix).read_bytes()
+    assert replayed.stack == executed.stack
+
+
+def test_proof_cache(tmp_path: Path) -> None:
+    reflexivity = Implies(phi0, phi0)
+    proof_exp = ProofExp(claims=[reflexivity, reflexivity], proof_expressions=[Propositional().imp_refl()] * 2)
+    claims = [Claim(claim) for claim in proof_exp._claims]
+    tracer = TracingInterpreter(StatefulInterpreter(ExecutionPhase.Gamma, claims))
+    proof_exp.execute_full(tracer)
+
+    # Only the lemma proved twice is worth caching, the lemmas in its second proof are skipped with it
+    cached = tracer.repeated_proofs(8)
+    assert list(cached) == [reflexivity]
+    assert tracer.repeated_proofs(0) == {}
+
+    serializer = proof_exp.get_serializing_interpreter(
+        OutputFormat.Binary, ExecutionPhase.Gamma, claims, tmp_path / 'cached'
+    )
+    cache = ProofCachingInterpreter(serializer, cached)
+    tracer.replay(cache)
+    serializer.flush()
+    ProofExp.verify(tmp_path / 'cached')
+
+    # The first proof is saved, and the second one is loaded
+    assert cache.statistics == [
+        ProofCacheInfo(reflexivity, hits=0, misses=1, served=0),
+        ProofCacheInfo(reflexivity, hits=1, misses=0, served=cached[reflexivity]),
+    ]
+    assert (
+        (tmp_path / 'cached')
+        .with_suffix('.ml-proof')
+        .read_bytes()
+        .endswith(bytes([Instruction.Save, Instruction.Publish, Instruction.Load, 0, Instruction.Publish]))
+    )
+
+    # Optimized serialization caches the lemmas proved again
+    statistics = Propositional().serialize(tmp_path / 'optimized', OutputFormat.Binary, True)
+    assert len(statistics) == len(Propositional()._claims)
+    assert any(info.hits for info in statistics)
+
+
+@pytest.mark.parametrize('proof_exp', [Propositional, SmallTheory])
+@pytest.mark.parametrize('optimize', [False, True])
+@pytest.mark.parametrize('encoding', list(Encoding))
+def test_deserialize_files(
+    proof_exp: Callable[[], ProofExp], optimize: bool, encoding: Encoding, tmp_path: Path
+) -> None:
+    proof_exp().serialize(tmp_path / 'original', OutputFormat.Binary, optimize, encoding)
+    gamma, claim, proof = (
+        (tmp_path / 'original').with_suffix(suffix) for suffix in ('.ml-gamma', '.ml-claim', '.ml-proof')
+    )
+
+    # Check the proof on the Python side
+    deserializer = deserialize_files(gamma, claim, proof, BasicInterpreter(ExecutionPhase.Gamma))
+    assert deserializer.instructions > 0
+
+    # Replaying the proof on the serializer reproduces it, symbols are only known by their ids there
+    claims_deserializer = Deserializer(BasicInterpreter(ExecutionPhase.Claim))
+    claims_deserializer.deserialize(claim.read_bytes())
+    claims = [Claim(pattern) for pattern in reversed(claims_deserializer.claims)]
+    serializer = proof_exp().get_serializing_interpreter(
+        OutputFormat.Binary, ExecutionPhase.Gamma, claims, tmp_path / 'copy', encoding
+    )
+    deserialize_files(gamma, claim, proof, serializer)
+    serializer.flush()
+    for file in (gamma, claim, proof):
+        assert file.with_stem('copy').read_bytes() == file.read_bytes()
+
+
+@pytest.mark.parametrize('proof_exp', [Propositional, SmallTheory])
+@pytest.mark.parametrize('optimize', [False, True])
+def test_trusted_serialization(proof_exp: Callable[[], ProofExp], optimize: bool, tmp_path: Path) -> None:
+    proof_exp().serialize(tmp_path / 'checked', OutputFormat.Binary, optimize)
+    proof_exp().serialize(tmp_path / 'trusted', OutputFormat.Binary, optimize, trusted=True)
+    for suffix in ('.ml-gamma', '.ml-claim', '.ml-proof'):
+        assert (tmp_path / 'trusted').with_suffix(suffix).read_bytes() == (tmp_path / 'checked').with_suffix(
+            suffix
+        ).read_bytes()
+    ProofExp.verify(tmp_path / 'trusted')
+
+    # A trusted interpreter publishes wrong proofs, which the offline verification rejects
+    interpreter = StatefulInterpreter(ExecutionPhase.Proof, [Claim(phi0)], trusted=True)
+    interpreter.publish_proof(interpreter.prop1())
+    assert interpreter.claims == []
+    with pytest.raises(VerificationError):
+        StatefulInterpreter(ExecutionPhase.Proof, [Claim(phi0)]).publish_proof(interpreter.prop1())
+
+
+def test_verify_instantiation_constraints(tmp_path: Path) -> None:
+    # The axiom phi0 with x0 fresh, instantiated with x0
+    (tmp_path / 'broken.ml-gamma').write_bytes(bytes([Instruction.MetaVar, 0, 1, 0, 0, 0, 0, 0, Instruction.Publish]))
+    (tmp_path / 'broken.ml-claim').write_bytes(bytes([Instruction.EVar, 0, Instruction.Publish]))
+    (tmp_path / 'broken.ml-proof').write_bytes(
+        bytes([Instruction.EVar, 0, Instruction.Load, 0, Instruction.Instantiate, 1, 0, Instruction.Publish])
+    )
+    with pytest.raises(VerificationError):
+        ProofExp.verify(tmp_path / 'broken')
+
+
+def test_trusted_main(tmp_path: Path) -> None:
+    # Trusted generation publishes the wrong proof, which is still checked before returning
+    proof_exp = ProofExp()
+    proof_exp.add_claim(phi0)
+    proof_exp.add_proof_expression(proof_exp.prop1())
+    with pytest.raises(DeserializingException):
+        proof_exp.main(['', 'binary', str(tmp_path), 'broken', '--trusted'])
+
+
+def test_trusted_pretty_printing(tmp_path: Path) -> None:
+    # Pretty-printed proofs cannot be verified, so they are never generated trusted
+    with pytest.raises(SystemExit):
+        Propositional().main(['', 'pretty', str(tmp_path), 'propositional', '--trusted'])
+    assert not any(tmp_path.iterdir())
+
+
+def test_deserialize_wrong_claim() -> None:
+    deserializer = Deserializer(BasicInterpreter(ExecutionPhase.Claim))
+    deserializer.deserialize(bytes([Instruction.CleanMetaVar, 0, Instruction.Publish]))
+    deserializer.into_proof_phase()
+    with pytest.raises(DeserializingException):
+        deserializer.deserialize(bytes([Instruction.Prop1, Instruction.Publish]))
+
+
+def test_deserialize_insufficient_claims() -> None:
+    deserializer = Deserializer(BasicInterpreter(ExecutionPhase.Claim))
+    deserializer.deserialize(b'')
+    deserializer.into_proof_phase()
+    with pytest.raises(DeserializingException):
+        deserializer.deserialize(bytes([Instruction.Prop1, Instruction.Publish]))
+
+
+@pytest.mark.parametrize(
+    'claim',
+    [
+        # Mu X0 . X0 -> X1
+        [Instruction.SVar, 0, Instruction.SVar, 1, Instruction.Implies, Instruction.Mu, 0],
+        # A metavariable with x0 as both a fresh variable and an application context hole
+        [Instruction.MetaVar, 0, 1, 0, 0, 0, 0, 1, 0],
+        # phi0[x0/x0]
+        [Instruction.EVar, 0, Instruction.CleanMetaVar, 0, Instruction.ESubst, 0],
+    ],
+)
+def test_deserialize_ill_formed(claim: list[int]) -> None:
+    with pytest.raises(VerificationError):
+        Deserializer(BasicInterpreter(ExecutionPhase.Claim)).deserialize(bytes(claim))
+    # Trusted interpreters skip the side conditions
+    Deserializer(BasicInterpreter(ExecutionPhase.Claim, trusted=True)).deserialize(bytes(claim))
+
+
+def test_deserialize_instantiation_constraints() -> None:
+    deserializer = Deserializer(BasicInterpreter(ExecutionPhase.Gamma))
+    # The axiom phi0 with x0 fresh
+    deserializer.deserialize(bytes([Instruction.MetaVar, 0, 1, 0, 0, 0, 0, 0, Instruction.Publish]))
+    deserializer.into_claim_phase()
+    deserializer.deserialize(bytes([Instruction.EVar, 0, Instruction.Publish]))
+    deserializer.into_proof_phase()
+    with pytest.raises(VerificationError):
+        deserializer.deserialize(
+            bytes([Instruction.EVar, 0, Instruction.Load, 0, Instruction.Instantiate, 1, 0, Instruction.Publish])
+        )
+
+
+def test_wide_ids() -> None:
+    pattern = App(EVar(300), Exists(128, SVar(127)))
+    out = BytesIO()
+    interpreter = SerializingInterpreter(phase=ExecutionPhase.Claim, out=out, encoding=Encoding.Varint)
+    interpreter.pattern(pattern)
+    # fmt: off
+    assert out.getvalue() == bytes([
+        0x00, 0x01,                      # Header of the varint encoding
+        Instruction.EVar, 0xAC, 0x02,    # Stack: x300
+        Instruction.SVar, 0x7F,          # Stack: x300; X127
+        Instruction.Exists, 0x80, 0x01,  # Stack: x300; ∃ x128 . X127
+        Instruction.App,                 # Stack: x300 X127 (∃ x128 . X127)
+    ])
+    # fmt: on
+
+    deserializer = Deserializer(StatefulInterpreter(phase=ExecutionPhase.Claim))
+    deserializer.deserialize(out.getvalue())
+    assert deserializer.stack == [pattern]
+
+    with pytest.raises(ValueError):
+        SerializingInterpreter(phase=ExecutionPhase.Claim, out=BytesIO()).pattern(pattern)
@@ -40,6 +40,13 @@ pub enum Instruction {
 type InstByte = u8;
 type InstrIterator<'a> = core::slice::Iter<'a, InstByte>;
 
+/// Operands are single bytes in the original format. Files starting with
+/// `FORMAT_MARKER`, which is not a valid instruction, carry a format version
+/// in the next byte. Version `VARINT_VERSION` encodes operands as unsigned
+/// LEB128 varints, lifting the limit of 256 symbols, variables and memory slots.
+const FORMAT_MARKER: InstByte = 0;
+const VARINT_VERSION: InstByte = 1;
+
 impl Instruction {
     fn from(value: InstByte) -> Instruction {
         match value {
@@ -88,7 +95,7 @@ impl Instruction {
 /// We only need to store the conclusion of things that are proved so far.
 /// We use the `Proved` variant for this.
 
-type Id = u8;
+type Id = u32;
 type IdList = Vec<Id>;
 
 #[derive(Debug, Eq, PartialEq, Clone)]
@@ -712,18 +719,61 @@ pub enum ExecutionPhase {
     Proof,
 }
 
-fn read_u8_vec<'a>(iterator: &mut InstrIterator) -> Vec<u8> {
-    let len = (*iterator.next().expect("Expected length for array")) as usize;
+struct InstrReader<'a> {
+    iterator: InstrIterator<'a>,
+    varint: bool,
+}
 
-    let mut vec: Vec<u8> = Vec::with_capacity(len);
-    for _ in 0..len {
-        vec.push(
-            *iterator
-                .next()
-                .expect("Expected another constraint of given type"),
-        );
+impl<'a> InstrReader<'a> {
+    fn new(buffer: &'a Vec<InstByte>) -> InstrReader<'a> {
+        let mut iterator = buffer.iter();
+        let mut varint = false;
+        if buffer.first() == Some(&FORMAT_MARKER) {
+            iterator.next();
+            match iterator.next() {
+                Some(&VARINT_VERSION) => varint = true,
+                version => panic!("Unsupported format version: {:?}", version),
+            }
+        }
+        InstrReader { iterator, varint }
+    }
+
+    fn next_instruction(&mut self) -> Option<InstByte> {
+        self.iterator.next().copied()
+    }
+
+    fn operand(&mut self, err_msg: &str) -> Id {
+        if !self.varint {
+            return *self.iterator.next().expect(err_msg) as Id;
+        }
+
+        let mut value: Id = 0;
+        let mut shift = 0;
+        loop {
+            let byte = *self.iterator.next().expect(err_msg);
+            let bits = (byte & 0x7F) as Id;
+            // The last byte may only use the bits left in an id
+            assert!(
+                shift < Id::BITS && (bits << shift) >> shift == bits,
+                "Operand does not fit into an id"
+            );
+            value |= bits << shift;
+            if byte & 0x80 == 0 {
+                return value;
+            }
+            shift += 7;
+        }
+    }
+
+    fn operand_list(&mut self) -> IdList {
+        let len = self.operand("Expected length for array") as usize;
+
+        let mut vec: IdList = Vec::with_capacity(len);
+        for _ in 0..len {
+            vec.push(self.operand("Expected another constraint of given type"));
+        }
+        return vec;
     }
-    return vec;
 }
 
 fn execute_instructions<'a>(
@@ -733,8 +783,8 @@ fn execute_instructions<'a>(
     claims: &mut Claims,
     phase: ExecutionPhase,
 ) {
-    // Get an iterator for the input buffer
-    let iterator: &mut InstrIterator = &mut buffer.iter();
+    // Get a reader for the input buffer, which detects the operand encoding
+    let reader = &mut InstrReader::new(buffer);
 
     // Metavars
     let phi0 = metavar_unconstrained(0);
@@ -761,42 +811,31 @@ fn execute_instructions<'a>(
 
     let existence = exists(0, evar(0));
 
-    while let Some(instr_u32) = iterator.next() {
-        match Instruction::from(*instr_u32) {
+    while let Some(instr_u32) = reader.next_instruction() {
+        match Instruction::from(instr_u32) {
             // TODO: Add an abstraction for pushing these one-argument terms on stack?
             Instruction::EVar => {
-                let id = *iterator
-                    .next()
-                    .expect("Expected id for the EVar to be put on stack")
-                    as Id;
+                let id = reader.operand("Expected id for the EVar to be put on stack");
 
                 stack.push(Term::Pattern(evar(id)));
             }
             Instruction::SVar => {
-                let id = *iterator
-                    .next()
-                    .expect("Expected id for the SVar to be put on stack")
-                    as Id;
+                let id = reader.operand("Expected id for the SVar to be put on stack");
 
                 stack.push(Term::Pattern(svar(id)));
             }
             Instruction::Symbol => {
-                let id = *iterator
-                    .next()
-                    .expect("Expected id for the Symbol to be put on stack")
-                    as Id;
+                let id = reader.operand("Expected id for the Symbol to be put on stack");
 
                 stack.push(Term::Pattern(symbol(id)));
             }
             Instruction::MetaVar => {
-                let id = *iterator
-                    .next()
-                    .expect("Expected id for MetaVar instruction") as Id;
-                let e_fresh = read_u8_vec(iterator);
-                let s_fresh = read_u8_vec(iterator);
-                let positive = read_u8_vec(iterator);
-                let negative = read_u8_vec(iterator);
-                let app_ctx_holes = read_u8_vec(iterator);
+                let id = reader.operand("Expected id for MetaVar instruction");
+                let e_fresh = reader.operand_list();
+                let s_fresh = reader.operand_list();
+                let positive = reader.operand_list();
+                let negative = reader.operand_list();
+                let app_ctx_holes = reader.operand_list();
 
                 let metavar_pat = Rc::new(Pattern::MetaVar {
                     id,
@@ -814,9 +853,7 @@ fn execute_instructions<'a>(
                 stack.push(Term::Pattern(metavar_pat));
             }
             Instruction::CleanMetaVar => {
-                let id = *iterator
-                    .next()
-                    .expect("Expected id for MetaVar instruction") as Id;
+                let id = reader.operand("Expected id for MetaVar instruction");
 
                 let metavar_pat = Rc::new(Pattern::MetaVar {
                     id,
@@ -841,16 +878,12 @@ fn execute_instructions<'a>(
                 stack.push(Term::Pattern(app(left, right)))
             }
             Instruction::Exists => {
-                let id = *iterator
-                    .next()
-                    .expect("Expected var_id for the exists binder") as Id;
+                let id = reader.operand("Expected var_id for the exists binder");
                 let subpattern = pop_stack_pattern(stack);
                 stack.push(Term::Pattern(exists(id, subpattern)))
             }
             Instruction::Mu => {
-                let id = *iterator
-                    .next()
-                    .expect("Expected var_id for the exists binder") as Id;
+                let id = reader.operand("Expected var_id for the exists binder");
                 let subpattern = pop_stack_pattern(stack);
 
                 let mu_pat = mu(id, subpattern);
@@ -861,10 +894,7 @@ fn execute_instructions<'a>(
                 stack.push(Term::Pattern(mu_pat))
             }
             Instruction::ESubst => {
-                let evar_id = *iterator
-                    .next()
-                    .expect("Insufficient parameters for ESubst instruction")
-                    as Id;
+                let evar_id = reader.operand("Insufficient parameters for ESubst instruction");
                 let pattern = pop_stack_pattern(stack);
                 let plug = pop_stack_pattern(stack);
 
@@ -879,10 +909,7 @@ fn execute_instructions<'a>(
             }
 
             Instruction::SSubst => {
-                let svar_id = *iterator
-                    .next()
-                    .expect("Insufficient parameters for SSubst instruction.")
-                    as Id;
+                let svar_id = reader.operand("Insufficient parameters for SSubst instruction.");
                 let pattern = pop_stack_pattern(stack);
                 let plug = pop_stack_pattern(stack);
 
@@ -925,10 +952,8 @@ fn execute_instructions<'a>(
             }
             Instruction::Generalization => match pop_stack_proved(stack).as_ref() {
                 Pattern::Implies { left, right } => {
-                    let evar_id = *iterator
-                        .next()
-                        .expect("Insufficient parameters for Generalization instruction")
-                        as Id;
+                    let evar_id =
+                        reader.operand("Insufficient parameters for Generalization instruction");
 
                     if !right.e_fresh(evar_id) {
                         panic!("The binding variable has to be fresh in the conclusion.");
@@ -947,28 +972,25 @@ fn execute_instructions<'a>(
                 stack.push(Term::Proved(Rc::clone(&existence)));
             }
             Instruction::Substitution => {
-                let svar_id = *iterator
-                    .next()
-                    .expect("Insufficient parameters for Substitution instruction.");
+                let svar_id =
+                    reader.operand("Insufficient parameters for Substitution instruction.");
                 let pattern = pop_stack_proved(stack);
                 let plug = pop_stack_pattern(stack);
 
                 stack.push(Term::Proved(apply_ssubst(&pattern, svar_id, &plug)));
             }
             Instruction::Instantiate => {
-                let n = *iterator
-                    .next()
-                    .expect("Insufficient parameters for Instantiate instruction")
-                    as usize;
+                let n =
+                    reader.operand("Insufficient parameters for Instantiate instruction") as usize;
                 let mut ids: IdList = Vec::with_capacity(n);
                 let mut plugs: Vec<Rc<Pattern>> = Vec::with_capacity(n);
 
                 let metaterm = pop_stack(stack);
 
-                iterator.take(n).for_each(|arg| {
-                    ids.push(*arg as Id);
+                for _ in 0..n {
+                    ids.push(reader.operand("Insufficient instantiation indices"));
                     plugs.push(pop_stack_pattern(stack))
-                });
+                }
 
                 match metaterm {
                     Term::Pattern(mut p) => {
@@ -989,9 +1011,7 @@ fn execute_instructions<'a>(
                 Term::Proved(p) => memory.push(Entry::Proved(p.clone())),
             },
             Instruction::Load => {
-                let index = *iterator
-                    .next()
-                    .expect("Insufficient parameters for Load instruction");
+                let index = reader.operand("Insufficient parameters for Load instruction");
                 match &memory[index as usize] {
                     Entry::Pattern(p) => stack.push(Term::Pattern(p.clone())),
                     Entry::Proved(p) => stack.push(Term::Proved(p.clone())),
@@ -1700,6 +1720,88 @@ mod tests {
         return execute_instructions(instrs, stack, memory, claims, phase);
     }
 
+    #[test]
+    fn test_varint_operands() {
+        #[rustfmt::skip]
+        let instructions = vec![
+            FORMAT_MARKER, VARINT_VERSION,
+            Instruction::Symbol as InstByte, 0xAC, 0x02, // Stack: symbol(300)
+            Instruction::Save as InstByte,               // @ 0
+            Instruction::EVar as InstByte, 0x7F,         // Stack: symbol(300); evar(127)
+            Instruction::App as InstByte,                // Stack: app(symbol(300), evar(127))
+            Instruction::Load as InstByte, 0x00,         // Stack: app(symbol(300), evar(127)); symbol(300)
+        ];
+        let mut stack = vec![];
+        let mut memory = vec![];
+        execute_vector(
+            &instructions,
+            &mut stack,
+            &mut memory,
+            &mut vec![],
+            ExecutionPhase::Gamma,
+        );
+        assert_eq!(
+            stack,
+            vec![
+                Term::Pattern(app(symbol(300), evar(127))),
+                Term::Pattern(symbol(300))
+            ]
+        );
+        assert_eq!(memory, vec![Entry::Pattern(symbol(300))]);
+    }
+
+    #[test]
+    fn test_varint_max_operand() {
+        #[rustfmt::skip]
+        let instructions = vec![
+            FORMAT_MARKER, VARINT_VERSION,
+            Instruction::EVar as InstByte, 0xFF, 0xFF, 0xFF, 0xFF, 0x0F, // Stack: evar(u32::MAX)
+        ];
+        let mut stack = vec![];
+        execute_vector(
+            &instructions,
+            &mut stack,
+            &mut vec![],
+            &mut vec![],
+            ExecutionPhase::Gamma,
+        );
+        assert_eq!(stack, vec![Term::Pattern(evar(Id::MAX))]);
+    }
+
+    #[test]
+    #[should_panic(expected = "Operand does not fit into an id")]
+    fn test_varint_operand_overflow() {
+        // The last byte sets bit 32
+        execute_vector(
+            &vec![
+                FORMAT_MARKER,
+                VARINT_VERSION,
+                Instruction::EVar as InstByte,
+                0x80,
+                0x80,
+                0x80,
+                0x80,
+                0x10,
+            ],
+            &mut vec![],
+            &mut vec![],
+            &mut vec![],
+            ExecutionPhase::Gamma,
+        );
+    }
+
+    #[test]
+    #[should_panic]
+    fn test_unsupported_format_version() {
+        execute_vector(
+            &vec![FORMAT_MARKER, VARINT_VERSION + 1],
+            &mut vec![],
+            &mut vec![],
+            &mut vec![],
+            ExecutionPhase::Gamma,
+        );
+    }
+
     #[test]
     fn test_publish() {
         let proof = vec![Instruction::Publish as InstByte];
@@ -1776,12 +1878,12 @@ mod tests {
     }
 
     #[cfg(test)]
-    fn serialize_metavar(id: u8, all_cons: &Vec<Vec<u8>>) -> Vec<u8> {
+    fn serialize_metavar(id: InstByte, all_cons: &Vec<IdList>) -> Vec<InstByte> {
         let mut res = vec![Instruction::MetaVar as InstByte, id];
 
         for cons in all_cons {
-            res.push(cons.len() as u8);
-            res.append(&mut (*cons).clone());
+            res.push(cons.len() as InstByte);
+            res.extend(cons.iter().map(|&id| id as InstByte));
         }
 
         return res;
@@ -1789,7 +1891,7 @@ mod tests {
 
     #[test]
     fn test_construct_phi_implies_phi_with_constraints() {
-        let mut cons = vec![vec![1u8], vec![], vec![], vec![], vec![]];
+        let mut cons = vec![vec![1], vec![], vec![], vec![], vec![]];
 
         for _ in 0..5 {
             let mut proof: Vec<InstByte> = serialize_metavar(1, &cons);
@@ -1905,7 +2007,7 @@ mod tests {
     #[test]
     fn test_apply_esubst() {
         // Define test cases as tuples of input pattern, evar_id, plug, and expected pattern
-        let test_cases: Vec<(Rc<Pattern>, u8, Rc<Pattern>, Rc<Pattern>)> = vec![
+        let test_cases: Vec<(Rc<Pattern>, Id, Rc<Pattern>, Rc<Pattern>)> = vec![
             // Atomic cases
             (evar(0), 0, symbol(1), symbol(1)),
             (evar(0), 0, evar(2), evar(2)),
@@ -1991,7 +2093,7 @@ mod tests {
 
     #[test]
     fn test_apply_ssubst() {
-        let test_cases: Vec<(Rc<Pattern>, u8, Rc<Pattern>, Rc<Pattern>)> = vec![
+        let test_cases: Vec<(Rc<Pattern>, Id, Rc<Pattern>, Rc<Pattern>)> = vec![
             // Atomic cases
             (evar(0), 0, symbol(1), evar(0)),
             (evar(0), 1, evar(2), evar(0)),